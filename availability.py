@@ -0,0 +1,113 @@
+import asyncio
+import json
+import time
+from types import MappingProxyType
+
+# Double-buffered, copy-on-write availability state for the real-time feeds (data.gov.sg for
+# HDB, URA). Each poll is diffed against the current snapshot; the changed rows are applied to
+# a copy off the request path (in a worker thread) and the finished snapshot is swapped in
+# with a single reference assignment. Request handlers read `availability_store.snapshot`
+# once and always see one consistent, immutable view without taking a lock.
+
+class AvailabilitySnapshot:
+    """
+    Immutable view of the lot counts at one version.
+
+    Attributes:
+        version (int): Monotonically increasing; bumped once per poll that changed anything.
+        lots (Mapping): carpark_number -> (total_lots, available_lots). total_lots is None for
+            feeds that only report availability (URA), meaning "use the static capacity".
+        last_changed (Mapping): carpark_number -> unix time its counts last changed.
+        published_at (float): Unix time this snapshot was published.
+    """
+
+    __slots__ = ('version', 'lots', 'last_changed', 'published_at')
+
+    def __init__(self, version: int, lots: dict, last_changed: dict, published_at: float):
+        self.version = version
+        self.lots = MappingProxyType(lots)
+        self.last_changed = MappingProxyType(last_changed)
+        self.published_at = published_at
+
+    def diff(self, rows: dict) -> dict:
+        """Returns the subset of rows (carpark_number -> (total, available)) that differ from this snapshot."""
+        lots = self.lots
+        return {carpark_number: row for carpark_number, row in rows.items() if lots.get(carpark_number) != row}
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'version': self.version,
+            'published_at': self.published_at,
+            'lots': self.lots.copy(),
+            'last_changed': self.last_changed.copy(),
+        }, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, payload) -> 'AvailabilitySnapshot':
+        data = json.loads(payload)
+        lots = {carpark_number: tuple(row) for carpark_number, row in data['lots'].items()}
+        return cls(data['version'], lots, data['last_changed'], data['published_at'])
+
+    def with_changes(self, changes: dict, timestamp: float) -> 'AvailabilitySnapshot':
+        """Copy-on-write: a new snapshot with changes applied, leaving this one untouched."""
+        lots = dict(self.lots)
+        lots.update(changes)
+        last_changed = dict(self.last_changed)
+        last_changed.update(dict.fromkeys(changes, timestamp))
+        return AvailabilitySnapshot(self.version + 1, lots, last_changed, timestamp)
+
+class AvailabilityStore:
+    """
+    Holds the current AvailabilitySnapshot and publishes new ones atomically.
+
+    If a shared backend (see availability_backends.py) is attached, every snapshot this
+    process publishes is also pushed to it, so workers that are not polling can pick it up.
+    """
+
+    def __init__(self, backend=None):
+        self._snapshot = AvailabilitySnapshot(0, {}, {}, time.time())
+        self._write_lock = None # Created lazily so it binds to the running event loop
+        self._listeners = []
+        self.backend = backend
+
+    @property
+    def snapshot(self) -> AvailabilitySnapshot:
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def add_listener(self, callback):
+        """Calls callback(snapshot) after every publish, e.g. to invalidate derived caches."""
+        self._listeners.append(callback)
+
+    def publish(self, snapshot: AvailabilitySnapshot):
+        self._snapshot = snapshot
+        for callback in self._listeners:
+            callback(snapshot)
+
+    async def apply(self, rows: dict, timestamp: float = None) -> int:
+        """
+        Diffs a poll's rows against the current snapshot and publishes a new snapshot if
+        anything changed. Writers are serialised so concurrent pollers never lose updates.
+
+        Returns:
+            int: The current version after the poll.
+        """
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        async with self._write_lock:
+            current = self._snapshot
+            changes = current.diff(rows)
+            if not changes:
+                return current.version
+            timestamp = time.time() if timestamp is None else timestamp
+            snapshot = await asyncio.to_thread(current.with_changes, changes, timestamp)
+            self.publish(snapshot)
+            if self.backend is not None:
+                await self.backend.publish(snapshot)
+            return snapshot.version
+
+# Shared by the HDB and URA pollers so there is one version across both feeds
+availability_store = AvailabilityStore()
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import os
+import uuid
+from availability import AvailabilitySnapshot
+
+# Shared availability state across uvicorn workers and nodes.
+#
+# Exactly one process (the leader) runs the data.gov.sg and URA pollers and pushes every
+# snapshot it publishes to a backend; all other processes follow by loading newer snapshots
+# from that backend. Leadership is a lock (an flock()ed file, or a Redis key with a TTL), so
+# if the leader dies another process takes over and starts polling.
+#
+# Choose a backend with AVAILABILITY_BACKEND:
+#   local (default) - no sharing; every process polls on its own, as before
+#   file            - snapshot file + lock file on a shared disk (AVAILABILITY_FILE)
+#   redis           - any Redis-compatible store (REDIS_URL); needs the optional redis package
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYNC_INTERVAL_SECONDS = 5.0
+LEADER_TTL_SECONDS = 30
+
+class LocalBackend:
+    """In-process only: this process is always the leader and nothing is shared."""
+
+    async def acquire_leadership(self) -> bool:
+        return True
+
+    async def publish(self, snapshot: AvailabilitySnapshot):
+        pass
+
+    async def load(self, known_version: int):
+        return None
+
+class FileBackend:
+    """
+    Publishes snapshots to a JSON file (written atomically with os.replace) and elects the
+    leader with an exclusive flock() on a sibling lock file, which the OS releases if the
+    leader dies. Followers only re-read the file when its mtime or size changes.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.lock_path = file_path + '.lock'
+        self._lock_file = None
+        self._seen_stat = None
+
+    def _try_lock(self) -> bool:
+        if self._lock_file is not None:
+            return True
+        if fcntl is None:
+            logger.warning("fcntl is unavailable; every process will poll availability itself.")
+            return True
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def acquire_leadership(self) -> bool:
+        return await asyncio.to_thread(self._try_lock)
+
+    def _write(self, payload: str):
+        tmp_path = f"{self.file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, self.file_path)
+
+    async def publish(self, snapshot: AvailabilitySnapshot):
+        await asyncio.to_thread(self._write, snapshot.to_json())
+
+    def _read(self, known_version: int):
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        if (stat.st_mtime_ns, stat.st_size) == self._seen_stat:
+            return None
+        with open(self.file_path, 'r', encoding='utf-8') as f:
+            snapshot = AvailabilitySnapshot.from_json(f.read())
+        self._seen_stat = (stat.st_mtime_ns, stat.st_size)
+        return snapshot if snapshot.version > known_version else None
+
+    async def load(self, known_version: int):
+        return await asyncio.to_thread(self._read, known_version)
+
+# Renews the leader lease only if this process still holds it, in one atomic step
+RENEW_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Writes a snapshot only while this process holds the lease and only if its version is newer,
+# so a leader that stalled past its lease can never overwrite its successor's snapshots
+PUBLISH_SNAPSHOT_SCRIPT = """
+if redis.call('get', KEYS[3]) ~= ARGV[1] then
+    return 0
+end
+if tonumber(ARGV[2]) <= tonumber(redis.call('get', KEYS[2]) or '-1') then
+    return 0
+end
+redis.call('set', KEYS[1], ARGV[3])
+redis.call('set', KEYS[2], ARGV[2])
+return 1
+"""
+
+class RedisBackend:
+    """
+    Publishes snapshots to a Redis-compatible store. The version is kept under its own key so
+    followers only fetch the payload when it has moved; the leader holds a key set with NX and
+    a TTL that it renews on every sync. Renewals and publishes are Lua scripts that check the
+    lease owner atomically.
+    """
+
+    def __init__(self, url: str, prefix: str = 'carpark:availability'):
+        if redis_asyncio is None:
+            raise RuntimeError("AVAILABILITY_BACKEND=redis requires the redis package (pip install redis).")
+        self.client = redis_asyncio.from_url(url)
+        self.snapshot_key = f"{prefix}:snapshot"
+        self.version_key = f"{prefix}:version"
+        self.leader_key = f"{prefix}:leader"
+        self.owner = f"{os.uname().nodename if hasattr(os, 'uname') else 'host'}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._renew_lease = self.client.register_script(RENEW_LEASE_SCRIPT)
+        self._publish_snapshot = self.client.register_script(PUBLISH_SNAPSHOT_SCRIPT)
+
+    async def acquire_leadership(self) -> bool:
+        if await self.client.set(self.leader_key, self.owner, nx=True, ex=LEADER_TTL_SECONDS):
+            return True
+        return bool(await self._renew_lease(keys=[self.leader_key], args=[self.owner, LEADER_TTL_SECONDS]))
+
+    async def publish(self, snapshot: AvailabilitySnapshot):
+        published = await self._publish_snapshot(keys=[self.snapshot_key, self.version_key, self.leader_key],
+                                                 args=[self.owner, snapshot.version, snapshot.to_json()])
+        if not published:
+            logger.warning(f"Snapshot version {snapshot.version} not published: this process no longer holds the lease.")
+
+    async def load(self, known_version: int):
+        version = await self.client.get(self.version_key)
+        if version is None or int(version) <= known_version:
+            return None
+        payload = await self.client.get(self.snapshot_key)
+        return AvailabilitySnapshot.from_json(payload) if payload else None
+
+def backend_from_env():
+    """Builds the backend selected by AVAILABILITY_BACKEND (local, file or redis)."""
+    kind = os.getenv('AVAILABILITY_BACKEND', 'local').lower()
+    if kind == 'file':
+        return FileBackend(os.getenv('AVAILABILITY_FILE', './availability_snapshot.json'))
+    if kind == 'redis':
+        return RedisBackend(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+    if kind != 'local':
+        logger.warning(f"Unknown AVAILABILITY_BACKEND '{kind}', using local.")
+    return LocalBackend()
+
+async def sync_availability(store, start_pollers, interval: float = DEFAULT_SYNC_INTERVAL_SECONDS):
+    """
+    Keeps this process's availability store in step with the shared backend.
+
+    Whoever holds leadership calls start_pollers() once and keeps renewing its lease;
+    everyone else loads newer snapshots from the backend every interval seconds and keeps
+    trying to take over in case the leader goes away. start_pollers() returns the poller
+    tasks, which are cancelled if the lease is lost so only one process ever polls.
+    """
+    backend = store.backend
+    if isinstance(backend, LocalBackend):
+        start_pollers()
+        return
+    is_leader, poller_tasks = False, []
+    while True:
+        try:
+            if await backend.acquire_leadership():
+                if not is_leader:
+                    # Continue from the last published version so followers accept our snapshots
+                    snapshot = await backend.load(store.version)
+                    if snapshot is not None:
+                        store.publish(snapshot)
+                    is_leader = True
+                    logger.info("This process is the availability leader; starting pollers.")
+                    poller_tasks = start_pollers() or []
+            elif is_leader:
+                # Lost the lease (e.g. after a long stall): stop polling so the new leader is
+                # the only writer, and follow its snapshots from now on
+                logger.warning("Lost availability leadership; stopping pollers.")
+                for task in poller_tasks:
+                    task.cancel()
+                is_leader, poller_tasks = False, []
+            if not is_leader:
+                snapshot = await backend.load(store.version)
+                if snapshot is not None:
+                    store.publish(snapshot)
+        except Exception as e:
+            logger.error(f"Error syncing availability with backend: {e}")
+        await asyncio.sleep(interval)
@@ -1,5 +1,14 @@
 from datetime import datetime, time, date, timedelta # Ensure these are imported
+import itertools
+import json
+import logging
 import math
+import threading
+from bisect import bisect_left, bisect_right
+import numpy as np
+from public_holidays import is_public_holiday, public_holidays_between
+
+logger = logging.getLogger(__name__)
 
 # Use datetime for parsing and manipulating time strings, currently using time which cannot be subtracted
 
@@ -11,10 +20,10 @@ import math
 
 # 1. Helper to parse time strings (e.g., "07.00 AM" to datetime.time object)
 def parse_time_str_to_obj(time_str: str) -> time:
-    """Converts 'HH:MM AM/PM' string to datetime.time object. Assume the start day is today."""
+    """Converts 'HH.MM AM/PM' (as in the URA data) or 'HH:MM AM/PM' string to datetime.time object. Assume the start day is today."""
     try:
-        return datetime.strptime(time_str, "%I:%M %p").time()
-    except ValueError as e:
+        return datetime.strptime(time_str.replace('.', ':'), "%I:%M %p").time()
+    except (ValueError, AttributeError) as e:
         print(f"Error parsing time string '{time_str}': {e}")
 
 # print(parse_time_str_to_obj(end_time))  # Example usage
@@ -24,7 +33,7 @@ def parse_duration_str_to_minutes(duration_str: str) -> int:
     """Converts 'X mins' string to integer minutes."""
     try:
         return int(duration_str.replace(' mins', '').strip())
-    except ValueError:
+    except (ValueError, AttributeError):
         logger.warning(f"Could not parse duration string: {duration_str}. Defaulting to 0.")
         return 0
     
@@ -33,23 +42,41 @@ def parse_rate_str_to_float(rate_str: str) -> float:
     """Converts '$X.YY' string to float."""
     try:
         return float(rate_str.replace('$', '').strip())
-    except ValueError:
+    except (ValueError, AttributeError):
         logger.warning(f"Could not parse rate string: {rate_str}. Defaulting to 0.0.")
         return 0.0
 
 # 4. Helper to determine day type from a datetime object
 def get_day_type(dt_obj: datetime) -> str:
-    """Returns 'weekday', 'saturday', or 'sunday_ph' based on datetime."""
+    """Returns 'weekday', 'saturday', or 'sunday_ph' based on datetime. Public holidays count as 'sunday_ph'."""
+    if is_public_holiday(dt_obj):
+        return "sunday_ph"
     if dt_obj.weekday() < 5: # Monday is 0, Friday is 4
-        # Need to check for Public Holidays too. This would require a list of PH.
-        # For simplicity now, just check weekday.
         return "weekday"
     elif dt_obj.weekday() == 5: # Saturday is 5
         return "saturday"
     else: # Sunday is 6
-        # Need to check for Public Holidays.
         return "sunday_ph"
 
+# Helper to count the day types in a range of dates without walking every day
+def count_day_types(first_date: date, last_date: date) -> dict:
+    """Returns {'weekday': n, 'saturday': n, 'sunday_ph': n} for the dates first_date..last_date inclusive."""
+    counts = {"weekday": 0, "saturday": 0, "sunday_ph": 0}
+    days = (last_date - first_date).days + 1
+    if days <= 0:
+        return counts
+    weeks, remainder = divmod(days, 7)
+    counts["weekday"], counts["saturday"], counts["sunday_ph"] = 5 * weeks, weeks, weeks
+    for offset in range(remainder): # at most 6 leftover days
+        day = first_date + timedelta(days=days - 1 - offset)
+        counts["weekday" if day.weekday() < 5 else "saturday" if day.weekday() == 5 else "sunday_ph"] += 1
+    # Move the public holidays in the range over to 'sunday_ph'
+    for holiday in public_holidays_between(first_date, last_date):
+        if holiday.weekday() < 6:
+            counts["weekday" if holiday.weekday() < 5 else "saturday"] -= 1
+            counts["sunday_ph"] += 1
+    return counts
+
 # 5. Helper to get the correct rate from a rule based on day type
 def get_rate_for_day(rate_rule: dict, day_type: str) -> dict:
     """
@@ -58,8 +85,8 @@ def get_rate_for_day(rate_rule: dict, day_type: str) -> dict:
     """
     day_specific_rates = rate_rule.get(day_type)
     if day_specific_rates:
-        min_duration = parse_duration_str_to_minutes(day_specific_rates.get('min_duration', '0 mins'))
-        rate_val = parse_rate_str_to_float(day_specific_rates.get('rate', '$0.00'))
+        min_duration = parse_duration_str_to_minutes(day_specific_rates.get('min_duration') or '0 mins')
+        rate_val = parse_rate_str_to_float(day_specific_rates.get('rate') or '$0.00')
         return {"min_duration": min_duration, "rate": rate_val}
     return {"min_duration": 0, "rate": 0.0}
 
@@ -70,19 +97,21 @@ def calc_cost(carpark, start_time, end_time):
         if end_date > start_date: # overnight parking
             # Calculate cost for the first day, set end_time to 23:59:59
             first_day_end_time = datetime.combine(start_date, time(23, 59, 59))
-            second_day_start_time = datetime.combine(end_date, time(0, 0, 0))
-            return calc_hdb_cost(carpark['carpark_number'], start_time, first_day_end_time) + calc_hdb_cost(carpark['carpark_number'], second_day_start_time, end_time)
+            last_day_start_time = datetime.combine(end_date, time(0, 0, 0))
+            total_cost = calc_hdb_cost(carpark['carpark_number'], start_time, first_day_end_time) + calc_hdb_cost(carpark['carpark_number'], last_day_start_time, end_time)
+            # Whole days in between are priced once per day type, however long the stay
+            whole_days = count_day_types(start_date + timedelta(days=1), end_date - timedelta(days=1))
+            for day_type, count in whole_days.items():
+                if count:
+                    total_cost += count * calc_hdb_full_day_cost(carpark['carpark_number'], day_type)
+            return round(total_cost, 2)
         else:
             return calc_hdb_cost(carpark['carpark_number'], start_time, end_time)
     elif carpark['type'] == 'URA':
-        return calc_ura_cost(carpark['carpark_number'], start_time, end_time)
+        return calc_ura_cost(carpark, start_time, end_time)
     else:
         raise ValueError("Unknown carpark type")
 
-# def calc_ura_cost(carpark, start_time, end_time):
-    # narrow down to rate rules based on day type
-    # if spanning multiple days, calculate for each day separately then sum up
-    # if not, calculate for the single day
 special_rates_HDB = {
     "ACB": {
         "weekdays": [
@@ -410,55 +439,352 @@ special_rates_HDB = {
     }
 }
 
+# 7. Precompiled HDB tariffs
+# Each day's bands are compiled once at import into integer-second boundaries with the
+# cumulative cost at the start of every band, so pricing an interval is two binary searches
+# and a subtraction instead of re-parsing and walking the band list on every call.
+DEFAULT_HDB_RATE_PER_HALF_HOUR = 0.60
+SECONDS_PER_DAY = 24 * 3600
+HDB_DAY_KEYS = ("weekdays", "saturdays", "sundays")
+HDB_DAY_KEY_OF_DAY_TYPE = {"weekday": "weekdays", "saturday": "saturdays", "sunday_ph": "sundays"}
+
+def parse_clock_to_seconds(clock_str: str) -> int:
+    """Converts 'HH:MM:SS' to seconds since midnight."""
+    hours, minutes, seconds = map(int, clock_str.split(':'))
+    return hours * 3600 + minutes * 60 + seconds
+
+class CompiledTariff:
+    """
+    One day of per-minute charging, compiled for O(log n) interval pricing.
+
+    Attributes:
+        boundaries (list): Start second of each band, ascending, starting at 0; the last
+            band runs to the end of the day.
+        rates_per_minute (list): Charge per minute in each band.
+        cumulative (list): Cost of parking from midnight to the start of each band.
+    """
+
+    __slots__ = ('boundaries', 'rates_per_minute', 'cumulative')
+
+    def __init__(self, boundaries: list, rates_per_minute: list):
+        self.boundaries = boundaries
+        self.rates_per_minute = rates_per_minute
+        self.cumulative = [0.0]
+        for i in range(1, len(boundaries)):
+            self.cumulative.append(self.cumulative[-1] + (boundaries[i] - boundaries[i - 1]) / 60 * rates_per_minute[i - 1])
+
+    def _cost_to(self, second: int, band: int) -> float:
+        return self.cumulative[band] + (second - self.boundaries[band]) / 60 * self.rates_per_minute[band]
+
+    def cost(self, start_second: float, end_second: float) -> float:
+        """
+        Cost of parking from start_second to end_second (seconds since midnight).
+
+        Every minute started is charged at the rate of the band it falls in. Band
+        boundaries fall on whole minutes, so only the first and last minute can be partial.
+        """
+        first_band = bisect_right(self.boundaries, start_second) - 1
+        last_band = bisect_left(self.boundaries, end_second) - 1 # band of the last second parked
+        if first_band == last_band:
+            return math.ceil((end_second - start_second) / 60) * self.rates_per_minute[first_band]
+        start_minute = start_second - start_second % 60
+        end_minute = -(-end_second // 60) * 60
+        return self._cost_to(end_minute, last_band) - self._cost_to(start_minute, first_band)
+
+def compile_hdb_bands(bands: list) -> CompiledTariff:
+    """
+    Compiles a list of {"start", "end", "rate_per_half_hour"} bands (inclusive 'HH:MM:SS' ends).
+    Any part of the day the bands do not cover is charged at the default HDB rate.
+    """
+    default_rate = DEFAULT_HDB_RATE_PER_HALF_HOUR / 30.0
+    boundaries, rates = [], []
+    cursor = 0
+    for band in sorted(bands, key=lambda band: band["start"]):
+        band_start = parse_clock_to_seconds(band["start"])
+        band_end = parse_clock_to_seconds(band["end"]) + 1 # exclusive
+        if band_start > cursor: # gap, e.g. 17:00-19:00 in BBB
+            boundaries.append(cursor)
+            rates.append(default_rate)
+        boundaries.append(band_start)
+        rates.append(band["rate_per_half_hour"] / 30.0)
+        cursor = band_end
+    if cursor < SECONDS_PER_DAY:
+        boundaries.append(cursor)
+        rates.append(default_rate)
+    return CompiledTariff(boundaries, rates)
+
+def compile_hdb_tariffs(rates_table: dict) -> dict:
+    """Compiles special_rates_HDB-style tables into {carpark: {day_key: CompiledTariff}}."""
+    return {
+        carpark: {day: compile_hdb_bands(day_rates[day]) for day in HDB_DAY_KEYS}
+        for carpark, day_rates in rates_table.items()
+    }
+
+DEFAULT_HDB_TARIFF = compile_hdb_bands([])
+compiled_HDB_tariffs = compile_hdb_tariffs(special_rates_HDB)
+
 def calc_hdb_cost(carpark, start_time, end_time, overnight=False): # call separately for each day if overnight, then pass overnight=True for the next day
-    total_cost = 0.0
-    
     # Grace period of 15 minutes
     if end_time - start_time <= timedelta(minutes=15):
         return 0.0
-    
+
     # assume end time is always after start time (ie no overnight parking)
-    # get the day type for the start time
-    day_of_week_int = start_time.weekday()
-    day = "weekdays" if day_of_week_int < 5 else "saturdays" if day_of_week_int == 5 else "sundays"
-    rate_per_half_hour = 0.60
-    rate_per_minute = rate_per_half_hour / 30.0
-    
-    if carpark not in special_rates_HDB:
-        # divide the time (18:46:09) into half-hour slots (or part thereof)
-        duration_in_minutes = math.ceil((end_time - start_time).total_seconds() / 60)
-        total_cost = duration_in_minutes * rate_per_minute
-        return round(total_cost, 2)
-    
-    # if special carpark, get the rates for the day
-    rates = special_rates_HDB[carpark][day]
-    
-    for rate in rates:
-        # convert rate start and end times to datetime.time objects
-        # to compare with start_time and end_time
-        rate_start = datetime.strptime(rate["start"], "%H:%M:%S").time()
-        rate_end = datetime.strptime(rate["end"], "%H:%M:%S").time()
-        rate_start = datetime.combine(start_time.date(), rate_start)
-        rate_end = datetime.combine(start_time.date(), rate_end)
-        
-        # Case 1: period is within a single rate period
-        if start_time >= rate_start and end_time <= rate_end:
-            duration_in_minutes = math.ceil((end_time - start_time).total_seconds() / 60)
-            total_cost += duration_in_minutes * rate["rate_per_half_hour"] / 30.0
-            return round(total_cost, 2)
-        
-        # Case 2: period is later than this rate period
-        if start_time > rate_end:
-            continue
-        
-        # Case 3: overlaps occur
-        if start_time >= rate_start and end_time > rate_end:
-            duration_in_minutes = math.ceil((rate_end - start_time).total_seconds() / 60)
-            total_cost += duration_in_minutes * rate["rate_per_half_hour"] /30
-            start_time = rate_end + timedelta(seconds=1) # 19:59:59 + 1 second = 20:00:00
-            continue
+    # get the day type for the start time; public holidays are charged as Sundays
+    day = HDB_DAY_KEY_OF_DAY_TYPE[get_day_type(start_time)]
+
+    # Standard carparks are charged the default rate all day
+    tariff = compiled_HDB_tariffs[carpark][day] if carpark in compiled_HDB_tariffs else DEFAULT_HDB_TARIFF
+
+    start_second = start_time.hour * 3600 + start_time.minute * 60 + start_time.second
+    end_second = start_second + (end_time - start_time).total_seconds()
+    return round(tariff.cost(start_second, end_second), 2)
+
+def calc_hdb_full_day_cost(carpark, day_type: str) -> float:
+    """Cost of parking a whole day of the given day type ('weekday', 'saturday', 'sunday_ph')."""
+    day = HDB_DAY_KEY_OF_DAY_TYPE[day_type]
+    tariff = compiled_HDB_tariffs[carpark][day] if carpark in compiled_HDB_tariffs else DEFAULT_HDB_TARIFF
+    return round(tariff.cost(0, SECONDS_PER_DAY), 2)
+
+# 8. Compiled URA rate schedules
+# URA carparks carry their own 'rates' blocks of raw strings ("07.00 AM", "30 mins", "$0.60").
+# They are compiled once per distinct schedule into numeric blocks per day type: start and end
+# second (the end may pass midnight, e.g. 10.00 PM-07.00 AM ends at 31:00), the charge unit in
+# seconds and the rate per unit. Identical schedules share one compiled copy and tariff id.
+URA_DAY_TYPES = ("weekday", "saturday", "sunday_ph")
+
+class URABlock:
+    """
+    One rate block of a day: [start, end) in seconds from that day's midnight. A block may
+    carry several (unit seconds, rate) charges when URA lists alternatives for the same hours,
+    e.g. "$0.70 per 30 mins" and "$5.60 per 510 mins" overnight; the cheaper one applies.
+    """
+
+    __slots__ = ('start', 'end', 'charges')
+
+    def __init__(self, start: int, end: int, charges: list):
+        self.start = start
+        self.end = end
+        self.charges = charges
+
+    def charge(self, seconds: float) -> float:
+        """Charge for parking the given number of seconds inside this block."""
+        if seconds <= 0:
+            return 0.0
+        # A unit of 0 with a rate is a flat charge per entry; a rate of 0 is free parking
+        return min(math.ceil(seconds / unit) * rate if unit > 0 else rate for unit, rate in self.charges)
+
+def parse_ura_clock_to_seconds(time_str: str):
+    parsed = parse_time_str_to_obj(time_str) if time_str else None
+    if parsed is None:
+        return None
+    return parsed.hour * 3600 + parsed.minute * 60
+
+def compile_ura_rates(rates: list) -> dict:
+    """
+    Compiles a URA carpark's 'rates' list into {day_type: [URABlock, ...]} sorted by start.
+    Overnight blocks run past midnight; rules for the same hours become one block with
+    alternative charges, and where blocks overlap otherwise the later-starting one wins.
+    """
+    compiled = {}
+    for day_type in URA_DAY_TYPES:
+        blocks = {}
+        for rate_rule in rates or []:
+            start = parse_ura_clock_to_seconds(rate_rule.get('start_time'))
+            end = parse_ura_clock_to_seconds(rate_rule.get('end_time'))
+            if start is None or end is None:
+                continue
+            if end <= start: # overnight block, e.g. 10.00 PM - 07.00 AM (or a full day if equal)
+                end += SECONDS_PER_DAY
+            day_rate = get_rate_for_day(rate_rule, day_type)
+            charge = (day_rate["min_duration"] * 60, day_rate["rate"])
+            if (start, end) in blocks:
+                blocks[(start, end)].charges.append(charge)
+            else:
+                blocks[(start, end)] = URABlock(start, end, [charge])
+        blocks = sorted(blocks.values(), key=lambda block: block.start)
+        for block, next_block in zip(blocks, blocks[1:] + blocks[:1]):
+            next_start = next_block.start if next_block is not block and next_block.start > block.start else next_block.start + SECONDS_PER_DAY
+            block.end = min(block.end, next_start)
+        compiled[day_type] = blocks
+    return compiled
+
+ura_tariffs = {} # tariff id -> compiled schedule
+ura_full_day_costs = {} # tariff id -> {day_type: cost of every block of such a day, parked in full}
+_ura_tariff_ids = {} # JSON signature of a 'rates' list -> tariff id
+_ura_tariff_of_rates = {} # id() of a 'rates' list -> (rates, tariff id), avoids re-serialising known lists
+_ura_tariff_lock = threading.Lock()
+_ura_tariff_numbers = itertools.count() # Ids are never reused, even after retain_ura_tariffs
+
+def ura_tariff_id(rates: list) -> str:
+    """Returns the tariff id of a URA 'rates' list, compiling it the first time it is seen."""
+    known = _ura_tariff_of_rates.get(id(rates))
+    if known is not None and known[0] is rates:
+        return known[1]
+    signature = json.dumps(rates, sort_keys=True)
+    tariff_id = _ura_tariff_ids.get(signature)
+    if tariff_id is None:
+        # Stores are also prepared in a background thread on reload (see main.py), so new
+        # tariffs are registered under a lock and their id is published last
+        with _ura_tariff_lock:
+            tariff_id = _ura_tariff_ids.get(signature)
+            if tariff_id is None:
+                tariff_id = f"URA-{next(_ura_tariff_numbers)}"
+                ura_tariffs[tariff_id] = compile_ura_rates(rates)
+                ura_full_day_costs[tariff_id] = {
+                    day_type: sum(block.charge(block.end - block.start) for block in blocks)
+                    for day_type, blocks in ura_tariffs[tariff_id].items()
+                }
+                _ura_tariff_ids[signature] = tariff_id
+    _ura_tariff_of_rates[id(rates)] = (rates, tariff_id)
+    return tariff_id
+
+def retain_ura_tariffs(rates_lists: list):
+    """
+    Forgets the compiled tariffs and cached ids of every URA 'rates' list not in rates_lists,
+    e.g. the previous catalogue's after a reload, so they can be garbage collected. The lists
+    to keep must already have tariff ids (see main.prepare_store).
+    """
+    live = {id(rates): rates for rates in rates_lists if rates is not None}
+    with _ura_tariff_lock:
+        for key in [key for key, (rates, _) in _ura_tariff_of_rates.items() if live.get(key) is not rates]:
+            del _ura_tariff_of_rates[key]
+        keep = {tariff_id for _, tariff_id in _ura_tariff_of_rates.values()}
+        for signature in [signature for signature, tariff_id in _ura_tariff_ids.items() if tariff_id not in keep]:
+            del _ura_tariff_ids[signature]
+        for tariff_id in [tariff_id for tariff_id in ura_tariffs if tariff_id not in keep]:
+            del ura_tariffs[tariff_id]
+            del ura_full_day_costs[tariff_id]
+
+def calc_ura_cost(carpark, start_time, end_time):
+    """
+    Cost of parking at a URA carpark between two datetimes, which may span any number of days.
+    Each block occurrence is charged per started unit of its own duration, at the rates of the
+    day it starts on, so an overnight block is charged once even though it crosses midnight.
+
+    Only the days at either end of the stay are priced block by block. Every occurrence that
+    starts on a day in between lies wholly inside the stay, so those days cost their full-day
+    cost times the number of such days of each type.
+    """
+    if end_time <= start_time:
+        return 0.0
+    tariff_id = ura_tariff_id(carpark.get('rates'))
+    schedule = ura_tariffs[tariff_id]
+    total_cost = 0.0
+    # Blocks of the previous day can run past midnight into the start of the stay, and a
+    # block can end up to two days after the midnight of the day it starts on
+    first_day, last_day = start_time.date() - timedelta(days=1), end_time.date()
+    whole_first, whole_last = start_time.date() + timedelta(days=1), end_time.date() - timedelta(days=2)
+    if whole_first <= whole_last:
+        for day_type, count in count_day_types(whole_first, whole_last).items():
+            total_cost += count * ura_full_day_costs[tariff_id][day_type]
+        partial_days = [first_day, start_time.date(), last_day - timedelta(days=1), last_day]
+    else:
+        partial_days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+    for day_date in partial_days:
+        day = datetime.combine(day_date, time(0, 0, 0))
+        start_second = (start_time - day).total_seconds()
+        end_second = (end_time - day).total_seconds()
+        for block in schedule[get_day_type(day)]:
+            total_cost += block.charge(min(end_second, block.end) - max(start_second, block.start))
     return round(total_cost, 2)
 
+# 9. Tariff ids and memoized pricing
+DEFAULT_HDB_TARIFF_ID = "HDB"
+
+def get_tariff_id(carpark) -> str:
+    """
+    Carparks with the same tariff id are always charged the same. Most HDB carparks share the
+    default 0.60/half-hour tariff; URA carparks share ids with identical rate schedules.
+    """
+    if carpark['type'] == 'HDB':
+        return carpark['carpark_number'] if carpark['carpark_number'] in compiled_HDB_tariffs else DEFAULT_HDB_TARIFF_ID
+    return ura_tariff_id(carpark.get('rates'))
+
+def calc_cost_memoized(carpark, start_time, end_time, memo: dict):
+    """calc_cost, computed once per (tariff id, day type, interval) for the lifetime of memo."""
+    key = (get_tariff_id(carpark), get_day_type(start_time), start_time, end_time)
+    cost = memo.get(key)
+    if cost is None:
+        cost = memo[key] = calc_cost(carpark, start_time, end_time)
+    return cost
+
+# 10. Vectorized pricing over many carparks
+# Every HDB tariff is also laid out as per-minute cost prefix arrays, one row per tariff and
+# day: HDB_MINUTE_PREFIX[t, d, m] is the cost of parking from midnight to minute m. A
+# whole-minute interval is then priced for all HDB tariffs at once with two gathers.
+HDB_TARIFF_ROWS = {tariff_id: row for row, tariff_id in enumerate([DEFAULT_HDB_TARIFF_ID, *compiled_HDB_tariffs])}
+
+def minute_prefix(tariff: CompiledTariff) -> np.ndarray:
+    """Cost from midnight to each minute of the day (1441 entries) under one compiled tariff."""
+    bands = np.searchsorted(tariff.boundaries, np.arange(SECONDS_PER_DAY // 60) * 60, side='right') - 1
+    return np.concatenate(([0.0], np.cumsum(np.asarray(tariff.rates_per_minute)[bands])))
+
+HDB_MINUTE_PREFIX = np.stack([
+    np.stack([minute_prefix(DEFAULT_HDB_TARIFF if tariff_id == DEFAULT_HDB_TARIFF_ID else compiled_HDB_tariffs[tariff_id][day])
+              for day in HDB_DAY_KEYS])
+    for tariff_id in HDB_TARIFF_ROWS
+])
+
+def hdb_day_index(dt_obj: datetime) -> int:
+    """Index into HDB_DAY_KEYS, matching calc_hdb_cost."""
+    return HDB_DAY_KEYS.index(HDB_DAY_KEY_OF_DAY_TYPE[get_day_type(dt_obj)])
+
+def calc_hdb_cost_vectorized(tariff_rows: np.ndarray, start_time, end_time) -> np.ndarray:
+    """
+    calc_cost for HDB tariffs (rows of HDB_MINUTE_PREFIX) over a whole-minute interval,
+    split at midnight and with the grace period applied per day exactly as calc_cost does.
+    """
+    segments = [(start_time, end_time)]
+    costs = np.zeros(len(tariff_rows))
+    if end_time.date() > start_time.date():
+        segments = [(start_time, datetime.combine(start_time.date() + timedelta(days=1), time(0, 0, 0))),
+                    (datetime.combine(end_time.date(), time(0, 0, 0)), end_time)]
+        whole_days = count_day_types(start_time.date() + timedelta(days=1), end_time.date() - timedelta(days=1))
+        for day_type, count in whole_days.items():
+            if count:
+                day_index = HDB_DAY_KEYS.index(HDB_DAY_KEY_OF_DAY_TYPE[day_type])
+                costs += count * np.round(HDB_MINUTE_PREFIX[tariff_rows, day_index, -1], 2)
+    for segment_start, segment_end in segments:
+        start_minute = segment_start.hour * 60 + segment_start.minute
+        minutes = int((segment_end - segment_start).total_seconds() // 60)
+        if minutes <= 15: # grace period
+            continue
+        prefix = HDB_MINUTE_PREFIX[tariff_rows, hdb_day_index(segment_start)]
+        costs += np.round(prefix[:, start_minute + minutes] - prefix[:, start_minute], 2)
+    # The segments add up in floating point; round the total as calc_cost does
+    return np.round(costs, 2)
+
+def calc_cost_many(carparks: list, start_time, end_time) -> np.ndarray:
+    """
+    Prices one parking interval for many carparks.
+
+    Carparks are grouped by tariff id so each distinct tariff is priced once. When the interval
+    falls on whole minutes, all HDB tariffs are priced in one vectorized pass over the minute
+    prefix arrays; URA tariffs (and HDB ones for sub-minute intervals) go through calc_cost.
+
+    Returns:
+        np.ndarray: Cost per carpark, in the order given.
+    """
+    if not carparks:
+        return np.zeros(0)
+    tariff_ids = [get_tariff_id(carpark) for carpark in carparks]
+    unique_ids, inverse = np.unique(tariff_ids, return_inverse=True)
+    unique_ids = unique_ids.tolist()
+    representative = dict(zip(tariff_ids, carparks))
+    tariff_costs = np.zeros(len(unique_ids))
+
+    whole_minutes = start_time.second == end_time.second == 0 and start_time.microsecond == end_time.microsecond == 0
+    if whole_minutes and end_time > start_time:
+        hdb = [i for i, tariff_id in enumerate(unique_ids) if tariff_id in HDB_TARIFF_ROWS]
+        rows = np.array([HDB_TARIFF_ROWS[unique_ids[i]] for i in hdb], dtype=np.int64)
+        tariff_costs[hdb] = calc_hdb_cost_vectorized(rows, start_time, end_time)
+        remaining = [i for i, tariff_id in enumerate(unique_ids) if tariff_id not in HDB_TARIFF_ROWS]
+    else:
+        remaining = range(len(unique_ids))
+    for i in remaining:
+        tariff_costs[i] = calc_cost(representative[unique_ids[i]], start_time, end_time)
+    return tariff_costs[inverse]
+
 # create datetime objects for start and end times
 # end_time = datetime.strptime("23:59:59", "%H:%M:%S").time()
 # start_time = datetime.strptime("00:00:00", "%H:%M:%S").time()
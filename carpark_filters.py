@@ -0,0 +1,116 @@
+import re
+from datetime import datetime, timedelta
+import numpy as np
+from calc_rates import calc_ura_cost, get_day_type, ura_tariff_id, ura_tariffs, SECONDS_PER_DAY
+from carpark_store import CarparkStore, TYPE_CODES, HAS_ATTRIBUTES, NIGHT_PARKING, NO_AVAILABILITY, NO_CATEGORY
+
+# Search filters, evaluated as one boolean mask over the rows of the carpark store. The mask
+# is handed to the spatial index, which drops non-matching carparks before computing any
+# distances, so a filtered search does less work than an unfiltered one.
+#
+# HDB carparks are filtered on the facility attributes from HDBCarparkInformation.csv. URA
+# carparks have no such attributes: they never match a gantry height filter, and night
+# parking and free parking are read off their rate schedules.
+
+FREE_PARKING_WINDOW = re.compile(r'FR (\d{1,2})(?:\.(\d{2}))?(AM|PM)-(\d{1,2})(?:\.(\d{2}))?(AM|PM)')
+NIGHT_CHECK_SECOND = 3 * 3600 # A URA schedule allows night parking if it has a block at 3 AM
+
+_row_cache = {'store': None} # Per-store lookups, rebuilt when the store is replaced
+_availability_cache = {'store': None, 'version': None, 'lots': None}
+
+def parse_free_parking_window(free_parking: str):
+    """
+    (start_second, end_second) of the free window in an HDB free_parking value such as
+    'SUN & PH FR 7AM-10.30PM', or None if the carpark has no free parking.
+    """
+    match = FREE_PARKING_WINDOW.search(free_parking or '')
+    if not match:
+        return None
+    seconds = []
+    for hour, minute, meridiem in (match.group(1, 2, 3), match.group(4, 5, 6)):
+        seconds.append((int(hour) % 12 + (12 if meridiem == 'PM' else 0)) * 3600 + int(minute or 0) * 60)
+    return tuple(seconds)
+
+def _store_rows(store: CarparkStore) -> dict:
+    """URA rows grouped by tariff id, computed once per store."""
+    if _row_cache['store'] is not store:
+        ura_rows = {}
+        for row in np.flatnonzero(store.type_codes == TYPE_CODES['URA']).tolist():
+            ura_rows.setdefault(ura_tariff_id(store.rates[row]), []).append(row)
+        _row_cache.update(store=store, ura_rows={tariff_id: np.array(rows) for tariff_id, rows in ura_rows.items()})
+    return _row_cache
+
+def available_lots_for(store: CarparkStore, availability) -> np.ndarray:
+    """
+    Live available lots per row from an availability snapshot (NO_AVAILABILITY where unknown).
+    Built once per store and snapshot version, then shared by every filtered request.
+    """
+    cache = _availability_cache
+    if cache['store'] is not store or cache['version'] != availability.version:
+        lots = store.available_lots.copy()
+        for carpark_number, (_, available_lots) in availability.lots.items():
+            row = store.row_of.get(carpark_number)
+            if row is not None and isinstance(available_lots, int):
+                lots[row] = available_lots
+        cache.update(store=store, version=availability.version, lots=lots)
+    return cache['lots']
+
+def _night_parking_mask(store: CarparkStore) -> np.ndarray:
+    mask = (store.flags & NIGHT_PARKING) != 0
+    for tariff_id, rows in _store_rows(store)['ura_rows'].items():
+        blocks = ura_tariffs[tariff_id]['weekday']
+        mask[rows] = any(block.start <= second < block.end for block in blocks
+                         for second in (NIGHT_CHECK_SECOND, NIGHT_CHECK_SECOND + SECONDS_PER_DAY))
+    return mask
+
+def _free_now_mask(store: CarparkStore, moment: datetime) -> np.ndarray:
+    mask = np.zeros(len(store), dtype=bool)
+    # HDB: free parking only applies on Sundays and public holidays, within the window
+    if get_day_type(moment) == 'sunday_ph':
+        second = moment.hour * 3600 + moment.minute * 60 + moment.second
+        free_codes = []
+        for free_parking in store.categories['free_parking']:
+            window = parse_free_parking_window(free_parking)
+            free_codes.append(window is not None and window[0] <= second < window[1])
+        codes = store.category_codes['free_parking']
+        has_code = codes != NO_CATEGORY
+        mask[has_code] = np.array(free_codes, dtype=bool)[codes[has_code]]
+    # URA: free if parking the next minute costs nothing
+    for tariff_id, rows in _store_rows(store)['ura_rows'].items():
+        mask[rows] = calc_ura_cost({'rates': store.rates[rows[0]]}, moment, moment + timedelta(minutes=1)) == 0
+    return mask
+
+def build_filter_mask(store: CarparkStore, availability=None, min_available: int = None,
+                      min_gantry_height: float = None, night_parking: bool = False, free_at: datetime = None):
+    """
+    Combines the requested filters into a boolean mask over the store's rows.
+
+    Args:
+        store (CarparkStore): The carparks being searched.
+        availability: Availability snapshot, needed for min_available.
+        min_available (int): Only carparks reporting at least this many free lots.
+        min_gantry_height (float): Only carparks whose gantry is at least this high (in metres),
+            or that have no gantry.
+        night_parking (bool): Only carparks that allow night parking.
+        free_at (datetime): Only carparks where parking is free at that time.
+
+    Returns:
+        np.ndarray or None: The mask, or None when no filter was requested.
+    """
+    mask = None
+
+    def narrow(condition):
+        nonlocal mask
+        mask = condition if mask is None else mask & condition
+
+    if min_available is not None:
+        narrow(available_lots_for(store, availability) >= min_available)
+    if min_gantry_height is not None:
+        has_attributes = (store.flags & HAS_ATTRIBUTES) != 0
+        # Compared in float32, the precision the heights are stored in
+        narrow(has_attributes & ((store.gantry_height == 0) | (store.gantry_height >= np.float32(min_gantry_height))))
+    if night_parking:
+        narrow(_night_parking_mask(store))
+    if free_at is not None:
+        narrow(_free_now_mask(store, free_at))
+    return mask
@@ -0,0 +1,100 @@
+import json
+import mmap
+import os
+import struct
+import numpy as np
+from carpark_store import CarparkStore, CATEGORY_COLUMNS
+
+# Compiled, memory-mappable snapshot of the carpark store.
+#
+# Layout: an 8-byte magic, a little-endian uint64 header length, a compact JSON header, then
+# each column of the store as a raw, 64-byte aligned array. The header describes the columns
+# (dtype, shape, offset) and holds the interned address and rate tables; every row refers to
+# them by index, as the attribute columns do with their category tables. Loading maps the file read-only and wraps the columns with np.frombuffer,
+# so cold start does no parsing per carpark and all workers share the same page-cache pages.
+
+MAGIC = b'CPSNAP2\n' # Bumped whenever the set of columns changes; older files are rebuilt
+ALIGNMENT = 64
+ARRAY_COLUMNS = ('ids', 'lat', 'lng', 'type_codes', 'total_lots', 'available_lots')
+ATTRIBUTE_COLUMNS = ('flags', 'gantry_height')
+
+def _intern(values: list) -> tuple:
+    """Replaces repeated values by indices into a table of distinct values (compared as JSON)."""
+    table, index_of, ids = [], {}, []
+    for value in values:
+        key = json.dumps(value, sort_keys=True)
+        if key not in index_of:
+            index_of[key] = len(table)
+            table.append(value)
+        ids.append(index_of[key])
+    return table, np.array(ids, dtype=np.int32)
+
+def write_snapshot(store: CarparkStore, file_path: str):
+    """Writes a store to file_path atomically (readers never see a partial file)."""
+    address_table, address_ids = _intern(store.addresses)
+    rate_table, rate_ids = _intern(store.rates)
+    columns = {name: np.ascontiguousarray(getattr(store, name)) for name in ARRAY_COLUMNS}
+    columns['address_ids'] = address_ids
+    columns['rate_ids'] = rate_ids
+    for name in ATTRIBUTE_COLUMNS:
+        columns[name] = np.ascontiguousarray(getattr(store, name))
+    for column in CATEGORY_COLUMNS:
+        columns[f'{column}_codes'] = np.ascontiguousarray(store.category_codes[column])
+
+    # Lay the columns out after the header; offsets are relative to the start of the data area
+    layout, offset = {}, 0
+    for name, array in columns.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes
+
+    header = json.dumps({
+        'columns': layout,
+        'addresses': address_table,
+        'rates': rate_table,
+        'categories': store.categories,
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    prefix = MAGIC + struct.pack('<Q', len(header)) + header
+    data_start = -(-len(prefix) // ALIGNMENT) * ALIGNMENT
+
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(prefix)
+        for name, array in columns.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, file_path)
+
+def load_snapshot(file_path: str) -> CarparkStore:
+    """
+    Maps a snapshot file into memory and returns a CarparkStore over it.
+
+    Raises:
+        ValueError: If the file is not a carpark snapshot.
+    """
+    with open(file_path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{file_path} is not a carpark snapshot")
+    (header_length,) = struct.unpack_from('<Q', buffer, len(MAGIC))
+    header_start = len(MAGIC) + 8
+    header = json.loads(buffer[header_start:header_start + header_length].decode('utf-8'))
+    data_start = -(-(header_start + header_length) // ALIGNMENT) * ALIGNMENT
+
+    columns = {}
+    for name, column in header['columns'].items():
+        dtype = np.dtype(column['dtype'])
+        count = int(np.prod(column['shape']))
+        columns[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + column['offset']).reshape(column['shape'])
+
+    address_table, rate_table = header['addresses'], header['rates']
+    addresses = [address_table[i] for i in columns['address_ids'].tolist()]
+    rates = [rate_table[i] for i in columns['rate_ids'].tolist()]
+    return CarparkStore(
+        *(columns[name] for name in ARRAY_COLUMNS), addresses, rates,
+        category_codes={column: columns[f'{column}_codes'] for column in CATEGORY_COLUMNS},
+        categories=header['categories'],
+        flags=columns['flags'],
+        gantry_height=columns['gantry_height'],
+    )
@@ -0,0 +1,216 @@
+import json
+import sys
+import numpy as np
+from json_encoding import dumps, splice, encode_list
+from spatial_index import SpatialIndex, haversine
+
+# Columnar carpark store: one contiguous array per field instead of one dict per carpark.
+# Row i of every array describes the same carpark; row_of maps a carpark number back to its row.
+
+TYPE_CODES = {'HDB': 0, 'URA': 1}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+NO_AVAILABILITY = -1 # Stored in available_lots where the feed reports 'N/A'
+
+# HDB facility attributes from HDBCarparkInformation.csv. Free-text columns are stored as
+# int8 codes into a small table of distinct values (-1 where a carpark has no such attribute),
+# yes/no columns as bits of the flags array.
+CATEGORY_COLUMNS = ('car_park_type', 'type_of_parking_system', 'short_term_parking', 'free_parking')
+HAS_ATTRIBUTES = 1 # The record carries the HDB attribute columns
+NIGHT_PARKING = 2
+BASEMENT = 4
+FLAG_COLUMNS = {'night_parking': (NIGHT_PARKING, 'YES', 'NO'), 'car_park_basement': (BASEMENT, 'Y', 'N')}
+NO_CATEGORY = -1
+
+# Fields that change per request (live lot counts); everything else in a record is static and
+# is encoded once per store as a JSON fragment
+DYNAMIC_FIELDS = ('total_lots', 'available_lots')
+STATIC_SUMMARY_FIELDS = frozenset(('carpark_number', 'type', 'rates')) # Already in the fragment
+
+class CarparkStore:
+    """
+    Struct-of-arrays view of the combined HDB & URA carpark data, with the spatial index
+    built over its coordinate arrays.
+
+    Attributes:
+        ids (np.ndarray): Carpark numbers.
+        lat, lng (np.ndarray): float64 coordinates, NaN where unknown.
+        type_codes (np.ndarray): uint8 codes from TYPE_CODES.
+        total_lots, available_lots (np.ndarray): int32 lot counts, NO_AVAILABILITY if unknown.
+        addresses (list): Address strings.
+        rates (list): URA rate blocks per row, None for HDB carparks.
+        category_codes (dict): Column name -> int8 codes into categories[column], NO_CATEGORY if absent.
+        categories (dict): Column name -> list of the distinct values of that column.
+        flags (np.ndarray): uint8 bitmask of HAS_ATTRIBUTES, NIGHT_PARKING and BASEMENT.
+        gantry_height (np.ndarray): float32 gantry height in metres, 0 for no gantry, NaN if unknown.
+    """
+
+    def __init__(self, ids, lat, lng, type_codes, total_lots, available_lots, addresses, rates,
+                 category_codes=None, categories=None, flags=None, gantry_height=None):
+        n = len(ids)
+        self.ids = ids
+        self.lat = lat
+        self.lng = lng
+        self.type_codes = type_codes
+        self.total_lots = total_lots
+        self.available_lots = available_lots
+        self.addresses = addresses
+        self.rates = rates
+        self.category_codes = category_codes or {column: np.full(n, NO_CATEGORY, dtype=np.int8) for column in CATEGORY_COLUMNS}
+        self.categories = categories or {column: [] for column in CATEGORY_COLUMNS}
+        self.flags = flags if flags is not None else np.zeros(n, dtype=np.uint8)
+        self.gantry_height = gantry_height if gantry_height is not None else np.full(n, np.nan, dtype=np.float32)
+        self.row_of = {carpark_number: row for row, carpark_number in enumerate(ids.tolist())}
+        self._fragments = [None] * n # Encoded static fields per row, filled on first use
+        self.index = SpatialIndex(lat, lng)
+
+    @classmethod
+    def from_dict(cls, carpark_data: dict) -> 'CarparkStore':
+        """Builds a store from the dict-of-dicts format of combined_carpark_data.json."""
+        n = len(carpark_data)
+        lat = np.full(n, np.nan)
+        lng = np.full(n, np.nan)
+        type_codes = np.zeros(n, dtype=np.uint8)
+        total_lots = np.zeros(n, dtype=np.int32)
+        available_lots = np.full(n, NO_AVAILABILITY, dtype=np.int32)
+        addresses, rates = [], []
+        interned_rates = {} # Carparks with identical schedules share one rates object
+        category_codes = {column: np.full(n, NO_CATEGORY, dtype=np.int8) for column in CATEGORY_COLUMNS}
+        categories = {column: [] for column in CATEGORY_COLUMNS}
+        category_index = {column: {} for column in CATEGORY_COLUMNS}
+        flags = np.zeros(n, dtype=np.uint8)
+        gantry_height = np.full(n, np.nan, dtype=np.float32)
+
+        for row, carpark_info in enumerate(carpark_data.values()):
+            cp_lat, cp_lng = carpark_info['coordinates']
+            if cp_lat is not None and cp_lng is not None:
+                lat[row], lng[row] = cp_lat, cp_lng
+            type_codes[row] = TYPE_CODES[carpark_info['type']]
+            total_lots[row] = _to_lots(carpark_info.get('total_lots'), 0)
+            available_lots[row] = _to_lots(carpark_info.get('available_lots'), NO_AVAILABILITY)
+            addresses.append(sys.intern(carpark_info['address']))
+            carpark_rates = carpark_info.get('rates')
+            if carpark_rates is not None:
+                carpark_rates = interned_rates.setdefault(json.dumps(carpark_rates, sort_keys=True), carpark_rates)
+            rates.append(carpark_rates)
+
+            if 'car_park_type' not in carpark_info:
+                continue
+            flags[row] = HAS_ATTRIBUTES
+            for column in CATEGORY_COLUMNS:
+                value = carpark_info.get(column)
+                if value not in category_index[column]:
+                    category_index[column][value] = len(categories[column])
+                    categories[column].append(value)
+                category_codes[column][row] = category_index[column][value]
+            for column, (bit, yes, _) in FLAG_COLUMNS.items():
+                if carpark_info.get(column) == yes:
+                    flags[row] |= bit
+            if carpark_info.get('gantry_height') is not None:
+                gantry_height[row] = carpark_info['gantry_height']
+
+        ids = np.array(list(carpark_data.keys()), dtype=str)
+        return cls(ids, lat, lng, type_codes, total_lots, available_lots, addresses, rates,
+                   category_codes, categories, flags, gantry_height)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def record(self, row: int) -> dict:
+        """Rebuilds the carpark dictionary (as found in combined_carpark_data.json) for one row."""
+        lat, lng = self.lat[row], self.lng[row]
+        available_lots = int(self.available_lots[row])
+        carpark = {
+            'carpark_number': str(self.ids[row]),
+            'address': self.addresses[row],
+            'coordinates': [None if np.isnan(lat) else float(lat), None if np.isnan(lng) else float(lng)],
+            'type': TYPE_NAMES[int(self.type_codes[row])],
+            'total_lots': int(self.total_lots[row]),
+            'available_lots': 'N/A' if available_lots == NO_AVAILABILITY else available_lots,
+        }
+        if self.flags[row] & HAS_ATTRIBUTES:
+            for column in CATEGORY_COLUMNS:
+                code = int(self.category_codes[column][row])
+                carpark[column] = None if code == NO_CATEGORY else self.categories[column][code]
+            for column, (bit, yes, no) in FLAG_COLUMNS.items():
+                carpark[column] = yes if self.flags[row] & bit else no
+            gantry_height = self.gantry_height[row]
+            carpark['gantry_height'] = None if np.isnan(gantry_height) else round(float(gantry_height), 2)
+        if self.rates[row] is not None:
+            carpark['rates'] = self.rates[row]
+        return carpark
+
+    def summary(self, row: int) -> dict:
+        """
+        The fields of a record that searches read or overwrite per request: the carpark number,
+        type and rates (shared, not copied) for pricing, and the static lot counts. Serialise
+        summaries with encode_results, which fills in the rest of the record.
+        """
+        available_lots = int(self.available_lots[row])
+        return {
+            'carpark_number': str(self.ids[row]),
+            'type': TYPE_NAMES[int(self.type_codes[row])],
+            'rates': self.rates[row],
+            'total_lots': int(self.total_lots[row]),
+            'available_lots': 'N/A' if available_lots == NO_AVAILABILITY else available_lots,
+        }
+
+    def fragment(self, row: int) -> bytes:
+        """The record's static fields as an encoded JSON object without its closing brace."""
+        fragment = self._fragments[row]
+        if fragment is None:
+            record = self.record(row)
+            for field in DYNAMIC_FIELDS:
+                del record[field]
+            fragment = self._fragments[row] = dumps(record)[:-1]
+        return fragment
+
+    def encode_result(self, carpark: dict) -> bytes:
+        """JSON for one summary (see summary()): its static fragment plus the per-request fields."""
+        fragment = self.fragment(self.row_of[carpark['carpark_number']])
+        return splice(fragment, {field: value for field, value in carpark.items() if field not in STATIC_SUMMARY_FIELDS})
+
+    def encode_results(self, carparks: list) -> bytes:
+        """JSON array of summaries, each expanded to its full record."""
+        return encode_list(self.encode_result(carpark) for carpark in carparks)
+
+    def nearest(self, lat: float, lng: float, k: int, after: tuple = None, mask: np.ndarray = None) -> tuple:
+        """
+        (distances_in_meters, rows) of the k carparks nearest to a point, nearest first.
+        Pass after=(distance, row) of the previous page's last result to get the next page,
+        and a boolean mask over rows (see carpark_filters.py) to search only matching carparks.
+        """
+        return self.index.nearest(lat, lng, k, after, mask)
+
+    def within_radius(self, lat: float, lng: float, radius: float, mask: np.ndarray = None) -> tuple:
+        """(distances_in_meters, rows) of every (matching) carpark within radius metres, nearest first."""
+        return self.index.within_radius(lat, lng, radius, mask)
+
+    def distance_to_bounds(self, lat: float, lng: float) -> float:
+        """Lower bound in metres on the distance from a point to any carpark (see SpatialIndex.distance_to_bounds)."""
+        return self.index.distance_to_bounds(lat, lng)
+
+    def nearest_many(self, lats: np.ndarray, lngs: np.ndarray, k: int) -> tuple:
+        """
+        Batched k-nearest search for many points in one vectorized pass over all carparks.
+
+        Returns:
+            tuple: (distances, rows) arrays of shape (Q, min(k, N)), nearest first per query.
+        """
+        valid = np.flatnonzero(~np.isnan(self.lat))
+        distances = haversine(np.asarray(lats)[:, None], np.asarray(lngs)[:, None], self.lat[valid], self.lng[valid])
+        k = min(k, len(valid))
+        if k == 0:
+            return distances[:, :0], np.empty(distances[:, :0].shape, dtype=np.int64)
+        if k < len(valid):
+            candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(len(valid)), distances.shape)
+        candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+        order = np.argsort(candidate_distances, axis=1, kind='stable')
+        return np.take_along_axis(candidate_distances, order, axis=1), valid[np.take_along_axis(candidates, order, axis=1)]
+
+def _to_lots(value, default: int) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Cache of search query -> (lat, lng) so repeated postcodes and building names skip OneMap.
+# Entries live in an in-memory LRU with a TTL, optionally backed by SQLite so they survive
+# restarts, and concurrent lookups of the same query share a single upstream call.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600 # Postcodes and buildings rarely move
+
+def normalize_query(search_query: str) -> str:
+    """Cache key for a search query: case-folded with whitespace collapsed."""
+    return " ".join(search_query.casefold().split())
+
+class GeocodeCache:
+    """
+    LRU + TTL geocode cache with optional SQLite persistence and single-flight lookups.
+
+    Args:
+        max_entries (int): Maximum number of entries held in memory.
+        ttl_seconds (float): How long a geocoded result stays valid.
+        db_path (str): Optional SQLite file to persist results across restarts.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS, db_path: str = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> (lat, lng, expires_at)
+        self._inflight = {} # key -> asyncio.Task resolving to (lat, lng)
+        self._db = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            with self._db_lock, self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS geocode (key TEXT PRIMARY KEY, lat REAL NOT NULL, lng REAL NOT NULL, expires_at REAL NOT NULL)"
+                )
+
+    def get(self, search_query: str):
+        """Returns the cached (lat, lng) for a query from memory, or None."""
+        key = normalize_query(search_query)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        lat, lng, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return lat, lng
+
+    def put(self, search_query: str, lat: float, lng: float, expires_at: float = None):
+        """Stores a result in memory, evicting the least recently used entry if full."""
+        key = normalize_query(search_query)
+        self._entries[key] = (lat, lng, expires_at or time.time() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _db_get(self, key: str):
+        with self._db_lock:
+            row = self._db.execute("SELECT lat, lng, expires_at FROM geocode WHERE key = ?", (key,)).fetchone()
+        if row and row[2] > time.time():
+            return row
+        return None
+
+    def _db_put(self, key: str, lat: float, lng: float, expires_at: float):
+        with self._db_lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO geocode (key, lat, lng, expires_at) VALUES (?, ?, ?, ?)", (key, lat, lng, expires_at))
+
+    async def _load(self, key: str, search_query: str, fetcher):
+        if self._db is not None:
+            row = await asyncio.to_thread(self._db_get, key)
+            if row:
+                self.put(key, *row)
+                return row[0], row[1]
+
+        lat, lng = await fetcher(search_query)
+        expires_at = time.time() + self.ttl_seconds
+        self.put(key, lat, lng, expires_at)
+        if self._db is not None:
+            try:
+                await asyncio.to_thread(self._db_put, key, lat, lng, expires_at)
+            except sqlite3.Error as e:
+                logger.error(f"Failed to persist geocode result for '{key}': {e}")
+        return lat, lng
+
+    async def get_or_fetch(self, search_query: str, fetcher) -> tuple:
+        """
+        Resolves a query through the cache, calling fetcher(search_query) on a miss.
+
+        Concurrent calls for the same normalized query await one shared fetch; if it
+        raises, every waiter sees the same exception and nothing is cached.
+
+        Args:
+            search_query (str): Raw search query from the request.
+            fetcher: Async callable returning (lat, lng) for the query.
+
+        Returns:
+            tuple: (lat, lng)
+        """
+        cached = self.get(search_query)
+        if cached is not None:
+            return cached
+
+        key = normalize_query(search_query)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, search_query, fetcher))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import random
+from urllib.parse import urlsplit
+
+import httpx
+
+# Shared async HTTP client for every upstream call (OneMap, data.gov.sg, URA).
+# One pooled client per process keeps connections alive between requests, a semaphore per
+# host caps how many requests we have in flight to each upstream, and transient failures
+# are retried with jittered exponential backoff so the event loop is never blocked.
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0)
+PER_HOST_CONCURRENCY = 10
+MAX_RETRIES = 3
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_client = None
+_host_semaphores = {}
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the process-wide AsyncClient, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=TIMEOUT, limits=LIMITS)
+    return _client
+
+async def close_http_client():
+    """Closes the shared client and its pooled connections. Call on application shutdown."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def _host_semaphore(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc
+    if host not in _host_semaphores:
+        _host_semaphores[host] = asyncio.Semaphore(PER_HOST_CONCURRENCY)
+    return _host_semaphores[host]
+
+def _backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff: a random delay up to base * 2^attempt, capped."""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+async def fetch(method: str, url: str, **kwargs) -> httpx.Response:
+    """
+    Sends a request through the shared client, retrying transport errors and retryable
+    status codes (429/5xx) with jittered backoff.
+
+    Args:
+        method (str): HTTP method, e.g. "GET" or "POST".
+        url (str): Absolute URL of the upstream endpoint.
+        **kwargs: Passed through to httpx.AsyncClient.request (headers, params, json, ...).
+
+    Returns:
+        httpx.Response: A successful (2xx) response, or 304 Not Modified for a conditional request.
+
+    Raises:
+        httpx.HTTPError: If the request still fails after all retries.
+    """
+    client = get_http_client()
+    semaphore = _host_semaphore(url)
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            async with semaphore:
+                response = await client.request(method, url, **kwargs)
+            if response.status_code in RETRY_STATUS_CODES and attempt < MAX_RETRIES:
+                logger.warning(f"{method} {url} returned {response.status_code}, retrying (attempt {attempt + 1})")
+            elif response.status_code == 304: # Answer to a conditional request
+                return response
+            else:
+                response.raise_for_status()
+                return response
+        except httpx.TransportError as e:
+            if attempt >= MAX_RETRIES:
+                raise
+            logger.warning(f"{method} {url} failed: {e!r}, retrying (attempt {attempt + 1})")
+        await asyncio.sleep(_backoff_delay(attempt))
@@ -0,0 +1,37 @@
+import json
+
+# Fast JSON encoding for API responses.
+#
+# Uses orjson when it is installed (several times faster than the standard library and emits
+# UTF-8 bytes directly) and falls back to json otherwise; both produce compact output. Search
+# results are also spliced from pre-encoded fragments: the static part of each carpark is
+# encoded once per store (see CarparkStore.fragment) and only the per-request fields (lot
+# counts, distance, cost, score) are encoded per response.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps(value) -> bytes:
+    """Compact UTF-8 JSON for value."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def splice(fragment: bytes, fields: dict) -> bytes:
+    """
+    Completes an object fragment (an encoded object without its closing brace) with more fields.
+
+    Args:
+        fragment (bytes): e.g. b'{"carpark_number":"ACB","type":"HDB"'.
+        fields (dict): Fields to append; their keys must not already be in the fragment.
+    """
+    if not fields:
+        return fragment + b'}'
+    encoded = dumps(fields)
+    return fragment + (b',' if len(fragment) > 1 else b'') + encoded[1:]
+
+def encode_list(encoded_items) -> bytes:
+    """JSON array of already encoded items."""
+    return b'[' + b','.join(encoded_items) + b']'
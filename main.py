@@ -1,14 +1,30 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-import requests
-import math
+import httpx
 import logging
 import json
 import os
 import asyncio
+import base64
+import hmac
+import math
 from startup import load_HDB_carpark_data, update_realtime_availability_task, parse_ura_feature, load_URA_carpark_data
 from ura_availability import get_access_token, update_URA_availability
-from datetime import datetime
+from http_client import fetch, close_http_client
+from availability import availability_store
+from availability_backends import backend_from_env, sync_availability
+from geocode_cache import GeocodeCache, normalize_query
+from postcode_gazetteer import PostcodeGazetteer
+from carpark_store import CarparkStore, TYPE_CODES
+from carpark_snapshot import load_snapshot
+from carpark_filters import build_filter_mask
+from response_cache import ResponseCache, CachedResponse, quantize_location, etag_matches
+from json_encoding import dumps, encode_list
+from calc_rates import calc_cost_memoized, calc_cost_many, ura_tariff_id, retain_ura_tariffs
+from datetime import datetime, timedelta, timezone
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field, model_validator
+import numpy as np
 
 # Load environment variables from .env file
 from dotenv import load_dotenv
@@ -19,6 +35,20 @@ ONEMAP_PASSWORD = os.getenv('ONEMAP_PASSWORD')
 onemap_access_token = None
 onemap_token_expiry = 0
 
+# Geocoded search queries; set GEOCODE_CACHE_DB to a file path to keep them across restarts
+geocode_cache = GeocodeCache(
+    max_entries=int(os.getenv('GEOCODE_CACHE_SIZE', 10000)),
+    ttl_seconds=float(os.getenv('GEOCODE_CACHE_TTL', 7 * 24 * 3600)),
+    db_path=os.getenv('GEOCODE_CACHE_DB'),
+)
+
+# Encoded /find-carpark and /nearby responses, keyed by the search point rounded to a small
+# cell, the other parameters and the availability version; cleared whenever availability moves
+response_cache = ResponseCache(max_entries=int(os.getenv('RESPONSE_CACHE_SIZE', 2048)))
+RESPONSE_CACHE_PRECISION = int(os.getenv('RESPONSE_CACHE_PRECISION', 4)) # decimal places, about 11 m
+RESPONSE_MAX_AGE = int(os.getenv('RESPONSE_MAX_AGE', 30)) # seconds; availability is polled every minute
+availability_store.add_listener(response_cache.clear)
+
 # import method from prep_data.py to get carpark data
 # from prep_data import load_carpark_data
 
@@ -26,9 +56,26 @@ onemap_token_expiry = 0
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-carpark_data = {}
-real_time_data_hdb = {}
-real_time_data_ura = {}
+carpark_store = None
+postcode_gazetteer = None
+
+# Static carpark data written by the build (python startup.py). Workers watch these files and
+# swap in a rebuilt catalogue without restarting; POST /admin/reload does the same on demand.
+STATIC_SNAPSHOT_FILE = './carpark_snapshot.bin'
+STATIC_DATA_FILE = './combined_carpark_data.json'
+STATIC_DATA_WATCH_INTERVAL = float(os.getenv('STATIC_DATA_WATCH_INTERVAL', 30)) # seconds; 0 turns the watcher off
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN') # Required in X-Admin-Token by the admin endpoints, which are off without it
+static_data_signature = None
+_static_reload_lock = None # Created lazily so it binds to the running event loop
+
+SINGAPORE_TZ = timezone(timedelta(hours=8))
+# Default radius of /nearby, and default max_radius (the sort=cost|score shortlist) of /find-carpark
+DEFAULT_SEARCH_RADIUS_METERS = 2000
+# Parking intervals the tariffs are asked to price; anything else is rejected with a 400
+MIN_PARKING_YEAR, MAX_PARKING_YEAR = 2000, 2100
+MAX_PARKING_DURATION = timedelta(days=31)
+# Weights of the normalised distance, price and occupancy terms for sort=score (lower is better)
+SCORE_WEIGHTS = {'distance': 0.4, 'cost': 0.4, 'availability': 0.2}
 
 app = FastAPI(
     title="Singapore Carpark Finder API",
@@ -51,6 +98,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 async def get_onemap_token():
@@ -65,11 +113,10 @@ async def get_onemap_token():
     logger.info("Requesting new OneMap access token...")
     try:
         token_url = "https://www.onemap.gov.sg/api/auth/post/getToken" # Confirm this URL with OneMap docs
-        response = requests.post(token_url, json={
+        response = await fetch("POST", token_url, json={
             "email": ONEMAP_USERNAME,
             "password": ONEMAP_PASSWORD
         })
-        response.raise_for_status()
         token_data = response.json()
         print("\nToken Response Data:", token_data)
         
@@ -83,57 +130,42 @@ async def get_onemap_token():
             return onemap_access_token
         else:
             raise ValueError("Access token or expiry missing from OneMap response.")
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Failed to get OneMap access token: {e}")
         raise HTTPException(status_code=500, detail="Failed to authenticate with OneMap API.")
     except (ValueError, KeyError, TypeError) as e:
         logger.error(f"Error parsing OneMap token response: {e}")
         raise HTTPException(status_code=500, detail="Failed to parse OneMap token response.")
 
-def get_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """
-    Calculates the distance between two geographical points (latitude, longitude)
-    using the Haversine formula.
+def static_data_files_signature(snapshot_file=STATIC_SNAPSHOT_FILE, combined_data_file=STATIC_DATA_FILE) -> tuple:
+    """(mtime_ns, size) of each static data file (None if missing); changes whenever the build rewrites one."""
+    signature = []
+    for file_path in (snapshot_file, combined_data_file):
+        try:
+            stat = os.stat(file_path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
 
-    Args:
-        lat1 (float): Latitude of the first point.
-        lon1 (float): Longitude of the first point.
-        lat2 (float): Latitude of the second point.
-        lon2 (float): Longitude of the second point.
-
-    Returns:
-        float: The distance between the two points in meters.
-    """
-    R = 6371e3  # Earth's radius in meters
-    
-    # Convert latitudes and longitudes from degrees to radians
-    φ1 = math.radians(lat1)
-    φ2 = math.radians(lat2)
-    Δφ = math.radians(lat2 - lat1)  # Difference in latitudes
-    Δλ = math.radians(lon2 - lon1)  # Difference in longitudes
-
-    # Haversine formula calculation
-    a = math.sin(Δφ / 2) * math.sin(Δφ / 2) + \
-        math.cos(φ1) * math.cos(φ2) * \
-        math.sin(Δλ / 2) * math.sin(Δλ / 2)
-    
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-    d = R * c  # Distance in meters
-    return d
-    
-@app.on_event("startup")
-async def startup_event():
+def read_static_data(snapshot_file=STATIC_SNAPSHOT_FILE, combined_data_file=STATIC_DATA_FILE) -> CarparkStore:
     """
-    Loads static carpark data (HDB & URA) and starts the real-time availability background task.
-    This runs once when the FastAPI application starts.
+    Loads the combined HDB & URA carpark data into a new columnar carpark store, which also
+    builds the spatial index.
+
+    The compiled snapshot written by startup.py is memory-mapped when present; the JSON
+    file is only parsed as a fallback.
     """
-    global carpark_data
-    global real_time_data_hdb
-    global real_time_data_ura
-    
-    #load carpark data from combined_carpark_data.json and make it a hashmap
-    combined_data_file = './combined_carpark_data.json'
+    if os.path.exists(snapshot_file):
+        try:
+            store = load_snapshot(snapshot_file)
+            logger.info(f"Mapped {len(store)} carparks from {snapshot_file}")
+            return store
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Error loading snapshot {snapshot_file}, falling back to JSON: {e}")
+
+    #load carpark data from combined_carpark_data.json and convert it to column arrays
+    carpark_data = {}
     if os.path.exists(combined_data_file):
         with open(combined_data_file, 'r', encoding='utf-8') as f:
             try:
@@ -141,33 +173,203 @@ async def startup_event():
                 logger.info(f"Loaded {len(carpark_data)} carparks from {combined_data_file}")
             except json.JSONDecodeError as e:
                 logger.error(f"Error decoding JSON from {combined_data_file}: {e}")
-    
-    real_time_data_hdb = carpark_data.copy()
-    real_time_data_ura = carpark_data.copy()
-    # print(carpark_data)
 
-    # Start the background task to update real-time availability
-    asyncio.create_task(update_realtime_availability_task(real_time_data_hdb))
-    asyncio.create_task(update_URA_availability(real_time_data_ura))
+    store = CarparkStore.from_dict(carpark_data)
+    logger.info(f"Built spatial index over {store.index.size} carparks")
+    return store
 
+def prepare_store(store: CarparkStore) -> CarparkStore:
+    """Compiles a store's URA tariffs and encodes its result fragments ahead of its first requests."""
+    for row in np.flatnonzero(store.type_codes == TYPE_CODES['URA']).tolist():
+        ura_tariff_id(store.rates[row])
+    for row in range(len(store)):
+        store.fragment(row)
+    return store
 
-@app.get("/find-carpark")
-async def find_carpark(search_query: str = Query(..., min_length=1, max_length=100, description="Postcode or building name"), # CHANGE THIS
-    limit: int = Query(10, gt=0, le=50)):
-    # search_query = "London Bridge"
-    logger.info(f"Received request for search_query: {search_query}, limit: {limit}")
+def load_static_data(snapshot_file=STATIC_SNAPSHOT_FILE, combined_data_file=STATIC_DATA_FILE):
+    """Loads the static carpark data at startup; see reload_static_data for later updates."""
+    global carpark_store, static_data_signature
+
+    static_data_signature = static_data_files_signature(snapshot_file, combined_data_file)
+    carpark_store = read_static_data(snapshot_file, combined_data_file)
+
+async def reload_static_data(force: bool = False) -> bool:
+    """
+    Picks up a rebuilt catalogue without restarting the worker. If the static data files
+    changed since they were loaded (or force is set), a new store is read and prepared in a
+    worker thread and then swapped in with one assignment on the event loop. Requests read
+    carpark_store between awaits, so each sees either the old or the new store, never a mix.
+    Availability is keyed by carpark number and carries over; cached responses are dropped.
+
+    Returns:
+        bool: Whether a new store was swapped in.
+    """
+    global carpark_store, static_data_signature, _static_reload_lock
+
+    if _static_reload_lock is None:
+        _static_reload_lock = asyncio.Lock()
+    async with _static_reload_lock:
+        signature = static_data_files_signature(STATIC_SNAPSHOT_FILE, STATIC_DATA_FILE)
+        if not force and signature == static_data_signature:
+            return False
+        store = await asyncio.to_thread(lambda: prepare_store(read_static_data(STATIC_SNAPSHOT_FILE, STATIC_DATA_FILE)))
+        if len(store) == 0 and carpark_store is not None and len(carpark_store) > 0:
+            logger.error("Reloaded carpark data is empty; keeping the current data.")
+            return False
+        carpark_store = store
+        static_data_signature = signature
+        response_cache.clear()
+        # Let the previous catalogue's URA tariffs go (the new store's were compiled in prepare_store)
+        retain_ura_tariffs(store.rates)
+        logger.info(f"Reloaded static carpark data: {len(store)} carparks")
+        return True
+
+async def watch_static_data(interval: float):
+    """Reloads the static carpark data whenever the build rewrites it, checking every interval seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reload_static_data()
+        except Exception as e:
+            logger.error(f"Error reloading static carpark data: {e}")
+
+def apply_availability(carpark: dict, availability):
+    """
+    Overlays real-time lot counts from an availability snapshot onto a carpark record.
+    Carparks the feeds have not reported keep their static total_lots and 'N/A'.
+    """
+    lots = availability.lots.get(carpark['carpark_number'])
+    if lots:
+        total_lots, available_lots = lots
+        if total_lots is not None:
+            carpark['total_lots'] = total_lots
+        carpark['available_lots'] = available_lots
+
+def to_local_time(dt: datetime) -> datetime:
+    """Timezone-aware datetimes are converted to naive Singapore time, which the tariffs use."""
+    if dt.tzinfo is not None:
+        return dt.astimezone(SINGAPORE_TZ).replace(tzinfo=None)
+    return dt
 
+def parking_interval(start: datetime, end: datetime) -> tuple:
+    """
+    Validates a parking interval for pricing and converts it to naive Singapore time.
+
+    Raises:
+        HTTPException: 400 if end is not after start, either lies outside the supported
+            years, or the stay is longer than MAX_PARKING_DURATION.
+    """
+    # Checked before converting, so far-off dates cannot overflow the conversion or the tariffs
+    if not all(MIN_PARKING_YEAR <= dt.year <= MAX_PARKING_YEAR for dt in (start, end)):
+        raise HTTPException(status_code=400, detail=f"start and end must be between {MIN_PARKING_YEAR} and {MAX_PARKING_YEAR}.")
+    start, end = to_local_time(start), to_local_time(end)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start.")
+    if end - start > MAX_PARKING_DURATION:
+        raise HTTPException(status_code=400, detail=f"Parking can be priced for at most {MAX_PARKING_DURATION.days} days.")
+    return start, end
+
+def occupancy(carpark: dict) -> float:
+    """Fraction of lots taken (0 is empty, 1 is full), or 0.5 when there is no live count."""
+    total_lots, available_lots = carpark.get('total_lots'), carpark.get('available_lots')
+    if isinstance(total_lots, int) and isinstance(available_lots, int) and total_lots > 0:
+        return min(max(1 - available_lots / total_lots, 0.0), 1.0)
+    return 0.5
+
+def rank_carparks(carparks: list, sort: str, radius: float) -> list:
+    """
+    Orders priced carparks in place by cost, or by a weighted score of distance (relative to
+    the search radius), cost (relative to the dearest candidate) and occupancy.
+    """
+    if sort == 'cost':
+        carparks.sort(key=lambda carpark: (carpark['cost'], carpark['distance']))
+    elif sort == 'score':
+        max_cost = max(carpark['cost'] for carpark in carparks) or 1.0
+        for carpark in carparks:
+            carpark['score'] = round(
+                SCORE_WEIGHTS['distance'] * carpark['distance'] / radius
+                + SCORE_WEIGHTS['cost'] * carpark['cost'] / max_cost
+                + SCORE_WEIGHTS['availability'] * occupancy(carpark), 4)
+        carparks.sort(key=lambda carpark: (carpark['score'], carpark['distance']))
+    return carparks
+
+def encode_cursor(distance: float, carpark_number: str) -> str:
+    """Opaque page cursor: the distance and carpark number of the last result returned."""
+    payload = json.dumps([distance, carpark_number], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> tuple:
+    """(distance, row) to continue after, for carpark_store.nearest."""
+    try:
+        distance, carpark_number = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        distance = float(distance)
+        if not (math.isfinite(distance) and distance >= 0):
+            raise ValueError(f"bad cursor distance {distance}")
+        return distance, carpark_store.row_of[carpark_number]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid or expired cursor.")
+
+def next_cursor_headers(results: list, limit: int) -> dict:
+    """A full page may have more after it; point X-Next-Cursor at its last result."""
+    if len(results) == limit:
+        return {'X-Next-Cursor': encode_cursor(results[-1]['distance'], results[-1]['carpark_number'])}
+    return {}
+
+def cached_search_response(request: Request, cache_key: tuple, build) -> Response:
+    """
+    Serves a search from the response cache, calling build() -> (results, headers) on a miss.
+    Clients and CDNs revalidating with a matching If-None-Match get a 304 without a body.
+    """
+    entry = response_cache.get(cache_key)
+    if entry is None:
+        results, headers = build()
+        entry = response_cache.put(cache_key, CachedResponse(carpark_store.encode_results(results), headers))
+    headers = {'ETag': entry.etag, 'Cache-Control': f'public, max-age={RESPONSE_MAX_AGE}', **entry.headers}
+    if etag_matches(request.headers.get('if-none-match'), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type='application/json', headers=headers)
+
+def free_now_key(free_now: bool):
+    """free_now results change by the minute, so the minute is part of the cache key."""
+    return datetime.now(SINGAPORE_TZ).strftime('%Y-%m-%dT%H:%M') if free_now else None
+
+def search_mask(availability, min_available: Optional[int], min_gantry_height: Optional[float],
+                night_parking: bool, free_now: bool):
+    """Boolean mask over the carpark store for the search filters, or None if there are none."""
+    free_at = datetime.now(SINGAPORE_TZ).replace(tzinfo=None) if free_now else None
+    return build_filter_mask(carpark_store, availability, min_available, min_gantry_height, night_parking, free_at)
+
+def carpark_results(distances, rows, availability) -> list:
+    """
+    Carpark summaries for search results, each with its distance and the lot counts from one
+    availability snapshot (read it once per request so every result comes from the same version).
+    carpark_store.encode_results expands them to full records when the response is encoded.
+    """
+    results = []
+    for distance, row in zip(distances.tolist(), rows.tolist()):
+        carpark = carpark_store.summary(row)
+        apply_availability(carpark, availability)
+        carpark['distance'] = distance
+        results.append(carpark)
+    return results
+
+async def geocode_onemap(search_query: str) -> tuple:
+    """
+    Geocodes a postcode or building name with the OneMap search API.
+
+    Returns:
+        tuple: (latitude, longitude) of the first OneMap result.
+    """
     user_lat, user_lng = None, None
 
     # Get OneMap access token
     token = await get_onemap_token()
     headers = {"Authorization": f"Bearer {token}"} # Use the obtained token in the header
 
-    # 1. Get Postcode Coordinates from OneMap API
     try:
-        onemap_url = f"https://www.onemap.gov.sg/api/common/elastic/search?searchVal={search_query}&returnGeom=Y&getAddrDetails=Y&pageNum=1"
-        onemap_response = requests.get(onemap_url, headers=headers)
-        onemap_response.raise_for_status()
+        onemap_url = "https://www.onemap.gov.sg/api/common/elastic/search"
+        onemap_params = {"searchVal": search_query, "returnGeom": "Y", "getAddrDetails": "Y", "pageNum": 1}
+        onemap_response = await fetch("GET", onemap_url, params=onemap_params, headers=headers)
         onemap_data = onemap_response.json()
 
         if onemap_data and onemap_data.get('results'):
@@ -180,58 +382,299 @@ async def find_carpark(search_query: str = Query(..., min_length=1, max_length=1
         else:
             logger.warning(f"OneMap: No results found for {search_query}")
             raise HTTPException(status_code=404, detail="Location not found or invalid.")
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"OneMap API request failed: {e}")
         raise HTTPException(status_code=500, detail="Error connecting to OneMap API.")
     except (ValueError, KeyError, TypeError) as e:
         logger.error(f"Error processing OneMap data for {search_query}: {e}")
         raise HTTPException(status_code=500, detail="An internal error occurred processing location data.")
 
+    return user_lat, user_lng
+
+class CostBatchRequest(BaseModel):
+    carpark_numbers: List[str] = Field(..., min_length=1, max_length=2000)
+    start: datetime
+    end: datetime
+
+class CostBatchResponse(BaseModel):
+    start: datetime
+    end: datetime
+    costs: dict # carpark_number -> estimated cost in SGD
+    not_found: List[str]
+
+async def resolve_location(search_query: str) -> tuple:
+    """
+    (latitude, longitude) of a search query: 6-digit postcodes from the offline gazetteer,
+    anything else from the geocode cache or else the OneMap API.
+    """
+    coordinates = postcode_gazetteer.lookup(search_query) if postcode_gazetteer else None
+    if coordinates:
+        return coordinates
+    return await geocode_cache.get_or_fetch(search_query, geocode_onemap)
+
+class BatchLocation(BaseModel):
+    search_query: Optional[str] = Field(None, min_length=1, max_length=100, description="Postcode or building name")
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lng: Optional[float] = Field(None, ge=-180, le=180)
+
+    @model_validator(mode='after')
+    def check_location(self):
+        if self.search_query is None and (self.lat is None or self.lng is None):
+            raise ValueError("Give either search_query or both lat and lng.")
+        return self
+
+class FindCarparkBatchRequest(BaseModel):
+    locations: List[BatchLocation] = Field(..., min_length=1, max_length=200)
+    limit: int = Field(10, gt=0, le=50)
+
+@app.on_event("startup")
+async def startup_event():
+    """
+    Loads static carpark data (HDB & URA) and starts the real-time availability background task.
+    This runs once when the FastAPI application starts.
+    """
+    global postcode_gazetteer
+
+    load_static_data()
+    postcode_gazetteer = PostcodeGazetteer.load('./postcode_gazetteer.npy')
+
+    # Start the background tasks to update real-time availability. With a shared backend only
+    # the elected leader polls; the other workers follow the snapshots it publishes.
+    def start_pollers():
+        return [
+            asyncio.create_task(update_realtime_availability_task(availability_store)),
+            asyncio.create_task(update_URA_availability(availability_store)),
+        ]
+
+    availability_store.backend = backend_from_env()
+    asyncio.create_task(sync_availability(availability_store, start_pollers))
+
+    if STATIC_DATA_WATCH_INTERVAL > 0:
+        asyncio.create_task(watch_static_data(STATIC_DATA_WATCH_INTERVAL))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Closes the pooled upstream HTTP connections and the geocode cache.
+    """
+    await close_http_client()
+    geocode_cache.close()
+
+
+@app.get("/find-carpark")
+async def find_carpark(request: Request, search_query: str = Query(..., min_length=1, max_length=100, description="Postcode or building name"), # CHANGE THIS
+    limit: int = Query(10, gt=0, le=50),
+    start: Optional[datetime] = Query(None, description="Parking start time, e.g. 2025-07-07T08:00"),
+    end: Optional[datetime] = Query(None, description="Parking end time; prices each result with start"),
+    sort: Literal['distance', 'cost', 'score'] = Query('distance', description="cost and score need start and end"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page (sort=distance only)"),
+    max_radius: Optional[int] = Query(None, gt=0, le=20000, description=f"Only carparks within this many metres (for sort=cost|score, {DEFAULT_SEARCH_RADIUS_METERS} by default)"),
+    min_available: Optional[int] = Query(None, ge=1, description="Only carparks reporting at least this many free lots"),
+    min_gantry_height: Optional[float] = Query(None, gt=0, le=10, description="Vehicle height in metres the gantry must clear"),
+    night_parking: bool = Query(False, description="Only carparks that allow night parking"),
+    free_now: bool = Query(False, description="Only carparks where parking is free right now")):
+    # search_query = "London Bridge"
+    logger.info(f"Received request for search_query: {search_query}, limit: {limit}, sort: {sort}")
+
+    if (start is None) != (end is None):
+        raise HTTPException(status_code=400, detail="start and end must be given together.")
+    if start is not None:
+        start, end = parking_interval(start, end)
+    elif sort != 'distance':
+        raise HTTPException(status_code=400, detail=f"sort={sort} needs start and end.")
+    if cursor is not None and sort != 'distance':
+        raise HTTPException(status_code=400, detail="cursor is only supported with sort=distance.")
+
+    # 1. Get Postcode Coordinates, rounded to the response cache cell
+    user_lat, user_lng = quantize_location(*await resolve_location(search_query), RESPONSE_CACHE_PRECISION)
+
     # 2. Calculate Nearest Available Carparks
-    searchable_carparks = []
-    
-    if not carpark_data:
-        logger.warning("Global carpark_data is empty. Check startup loading.")
+    if carpark_store is None or len(carpark_store) == 0:
+        logger.warning("Carpark store is empty. Check startup loading.")
         raise HTTPException(status_code=500, detail="Carpark data not loaded or is empty.")
 
-    for cp_number, cp_info in carpark_data.items():
-        carpark = cp_info.copy() # Make a copy to avoid modifying the global dict during iteration
-        
-        # Determine if carpark should be included and its status
-        if carpark['type'] == 'HDB':
-            carpark['total_lots'] = real_time_data_hdb.get(cp_number, {}).get('total_lots', 0)
-            carpark['available_lots'] = real_time_data_hdb.get(cp_number, {}).get('available_lots', 'N/A')
-        elif carpark['type'] == 'URA':
-            carpark['total_lots'] = real_time_data_ura.get(cp_number, {}).get('total_lots', 0)
-            carpark['available_lots'] = real_time_data_ura.get(cp_number, {}).get('available_lots', 'N/A')
-
-        carpark_lat, carpark_lng = carpark['coordinates']
-        if carpark_lat is None or carpark_lng is None:
-            print(f"Carpark {cp_number} has invalid coordinates: {carpark['coordinates']}")
-            continue
-
-        # Calculate distance
-        distance = get_distance(user_lat, user_lng, carpark_lat, carpark_lng)
-        carpark['distance'] = distance
-        searchable_carparks.append(carpark)
+    # Read the availability snapshot once so filters and results come from the same version
+    availability = availability_store.snapshot
+
+    def search():
+        # Filters become one boolean mask, so non-matching carparks are skipped before ranking
+        mask = search_mask(availability, min_available, min_gantry_height, night_parking, free_now)
+
+        # One vectorized Haversine pass over the cells around the user, then a partial top-k;
+        # later pages resume the search after the cursor. Ranking by price needs every carpark
+        # within max_radius as the shortlist instead.
+        search_radius = max_radius if max_radius is not None else DEFAULT_SEARCH_RADIUS_METERS
+        if sort == 'distance':
+            after = decode_cursor(cursor) if cursor is not None else None
+            distances, rows = carpark_store.nearest(user_lat, user_lng, limit, after, mask)
+            if max_radius is not None:
+                within = distances <= max_radius
+                distances, rows = distances[within], rows[within]
+        else:
+            distances, rows = carpark_store.within_radius(user_lat, user_lng, search_radius, mask)
 
-    if not searchable_carparks:
-        # print(f"No suitable carparks found near postcode {postcode} (either no available HDB or no nearby URA).")
-        raise HTTPException(status_code=404, detail="No suitable carparks found near this postcode.")
+        if len(rows) == 0 and cursor is not None:
+            return [], {} # paged past the last carpark
+        if len(rows) == 0:
+            # print(f"No suitable carparks found near postcode {postcode} (either no available HDB or no nearby URA).")
+            raise HTTPException(status_code=404, detail="No suitable carparks found near this postcode.")
 
-    # 3. Return Nearest Carpark Details
-    searchable_carparks.sort(key=lambda cp: cp['distance'])
-    
-    top_n_carparks = searchable_carparks[:10]
-    
-    # print(f"Returning top {len(top_n_carparks)} nearest suitable carparks for {postcode}.")
-    print(top_n_carparks)
-    return top_n_carparks
+        # 3. Return Nearest Carpark Details
+        top_n_carparks = carpark_results(distances, rows, availability)
+        if start is not None:
+            # Carparks sharing a tariff are priced once per request
+            cost_memo = {}
+            for carpark in top_n_carparks:
+                carpark['cost'] = calc_cost_memoized(carpark, start, end, cost_memo)
+        top_n_carparks = rank_carparks(top_n_carparks, sort, search_radius)[:limit]
+
+        # print(f"Returning top {len(top_n_carparks)} nearest suitable carparks for {postcode}.")
+        return top_n_carparks, next_cursor_headers(top_n_carparks, limit) if sort == 'distance' else {}
+
+    cache_key = ('/find-carpark', user_lat, user_lng, availability.version, limit, start, end, sort, cursor,
+                 max_radius, min_available, min_gantry_height, night_parking, free_now_key(free_now))
+    return cached_search_response(request, cache_key, search)
+
+@app.get("/nearby")
+async def nearby_carparks(request: Request, lat: float = Query(..., ge=-90, le=90, description="Latitude, e.g. from the device's GPS"),
+    lng: float = Query(..., ge=-180, le=180, description="Longitude"),
+    radius: int = Query(DEFAULT_SEARCH_RADIUS_METERS, gt=0, le=20000, description="Only carparks within this many metres"),
+    limit: int = Query(10, gt=0, le=50),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    min_available: Optional[int] = Query(None, ge=1, description="Only carparks reporting at least this many free lots"),
+    min_gantry_height: Optional[float] = Query(None, gt=0, le=10, description="Vehicle height in metres the gantry must clear"),
+    night_parking: bool = Query(False, description="Only carparks that allow night parking"),
+    free_now: bool = Query(False, description="Only carparks where parking is free right now")):
+    """
+    Nearest carparks to a coordinate, within radius metres. No geocoding is needed, so this is
+    served entirely from memory and keeps working when OneMap is slow or down.
+    """
+    if carpark_store is None or len(carpark_store) == 0:
+        logger.warning("Carpark store is empty. Check startup loading.")
+        raise HTTPException(status_code=500, detail="Carpark data not loaded or is empty.")
+
+    # Points nowhere near the catalogue (the range checks allow anywhere on Earth) are turned away
+    # before any search or caching
+    if carpark_store.distance_to_bounds(lat, lng) > radius:
+        raise HTTPException(status_code=404, detail="No carparks found within the radius.")
+
+    lat, lng = quantize_location(lat, lng, RESPONSE_CACHE_PRECISION)
+    availability = availability_store.snapshot
+
+    def search():
+        # The k nearest, then drop those beyond the radius: bounded work however large the radius
+        mask = search_mask(availability, min_available, min_gantry_height, night_parking, free_now)
+        after = decode_cursor(cursor) if cursor is not None else None
+        distances, rows = carpark_store.nearest(lat, lng, limit, after, mask)
+        within = distances <= radius
+        if not within.any():
+            if cursor is not None:
+                return [], {} # paged past the last carpark in the radius
+            raise HTTPException(status_code=404, detail="No carparks found within the radius.")
+        results = carpark_results(distances[within], rows[within], availability)
+        return results, next_cursor_headers(results, limit)
+
+    cache_key = ('/nearby', lat, lng, availability.version, radius, limit, cursor,
+                 min_available, min_gantry_height, night_parking, free_now_key(free_now))
+    return cached_search_response(request, cache_key, search)
+
+@app.post("/find-carpark/batch")
+async def find_carpark_batch(request: FindCarparkBatchRequest):
+    """
+    Nearest carparks for many locations at once, e.g. the waypoints of a route.
+
+    Locations given as coordinates skip geocoding; distinct search queries are geocoded
+    concurrently, once each. All lookups then run in one vectorized pass over the carparks.
+    Each result is either {"lat", "lng", "carparks"} or {"error"} for a query that failed.
+    """
+    if carpark_store is None or len(carpark_store) == 0:
+        raise HTTPException(status_code=500, detail="Carpark data not loaded or is empty.")
+
+    queries = {}
+    for location in request.locations:
+        if location.lat is None or location.lng is None:
+            queries.setdefault(normalize_query(location.search_query), location.search_query)
+    resolved = await asyncio.gather(*(resolve_location(query) for query in queries.values()), return_exceptions=True)
+    coordinates_of = dict(zip(queries, resolved))
+
+    results, points = [], []
+    for location in request.locations:
+        result = {'search_query': location.search_query}
+        if location.lat is not None and location.lng is not None:
+            coordinates = (location.lat, location.lng)
+        else:
+            coordinates = coordinates_of[normalize_query(location.search_query)]
+        if isinstance(coordinates, HTTPException):
+            result['error'] = coordinates.detail
+        elif isinstance(coordinates, Exception):
+            logger.error(f"Error resolving {location.search_query}: {coordinates}")
+            result['error'] = "An internal error occurred processing location data."
+        else:
+            result['lat'], result['lng'] = coordinates
+            points.append((len(results), coordinates))
+        results.append(result)
+
+    if points:
+        lats = np.array([coordinates[0] for _, coordinates in points], dtype=np.float64)
+        lngs = np.array([coordinates[1] for _, coordinates in points], dtype=np.float64)
+        distances, rows = carpark_store.nearest_many(lats, lngs, request.limit)
+        availability = availability_store.snapshot
+        for (i, _), point_distances, point_rows in zip(points, distances, rows):
+            results[i]['carparks'] = carpark_results(point_distances, point_rows, availability)
+
+    # Carpark lists are spliced in pre-encoded, so only the per-request fields are serialised
+    encoded = []
+    for result in results:
+        carparks = result.pop('carparks', None)
+        body = dumps(result)
+        if carparks is not None:
+            body = body[:-1] + b',"carparks":' + carpark_store.encode_results(carparks) + b'}'
+        encoded.append(body)
+    return Response(content=encode_list(encoded), media_type='application/json')
+
+@app.post("/cost/batch", response_model=CostBatchResponse)
+async def cost_batch(request: CostBatchRequest):
+    """
+    Prices one parking interval across many carparks for side-by-side comparison.
+    Carparks sharing a tariff are priced once (see calc_cost_many).
+    """
+    start, end = parking_interval(request.start, request.end)
+    if carpark_store is None:
+        raise HTTPException(status_code=500, detail="Carpark data not loaded or is empty.")
+
+    carpark_numbers = list(dict.fromkeys(request.carpark_numbers))
+    found = [carpark_number for carpark_number in carpark_numbers if carpark_number in carpark_store.row_of]
+    carparks = [carpark_store.record(carpark_store.row_of[carpark_number]) for carpark_number in found]
+    costs = calc_cost_many(carparks, start, end)
+    return CostBatchResponse(
+        start=start,
+        end=end,
+        costs=dict(zip(found, costs.tolist())),
+        not_found=[carpark_number for carpark_number in carpark_numbers if carpark_number not in carpark_store.row_of],
+    )
+
+@app.post("/admin/reload")
+async def admin_reload(x_admin_token: Optional[str] = Header(None), force: bool = Query(False, description="Reload even if the files look unchanged")):
+    """
+    Reloads the static carpark data after a rebuild, without waiting for the file watcher.
+    Requests keep being served from the current data until the new store is swapped in.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them.")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        raise HTTPException(status_code=401, detail="Invalid admin token.")
+    reloaded = await reload_static_data(force)
+    return {"reloaded": reloaded, "carparks": len(carpark_store) if carpark_store is not None else 0}
 
 @app.get("/health")
 async def health_check():
     """
     Simple health check endpoint to keep the service awake.
     """
-    return {"status": "ok", "timestamp": datetime.now().isoformat()}
+    return {
+        "status": "ok",
+        "timestamp": datetime.now().isoformat(),
+        "availability_version": availability_store.version,
+    }
     
\ No newline at end of file
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import random
+import time
+
+# Adaptive polling schedule for the real-time availability feeds (data.gov.sg for HDB, URA).
+#
+# Instead of sleeping a fixed interval, each feed's poller learns how often its upstream
+# actually publishes from the change markers it sees (data.gov.sg's update_datetime, or a
+# digest of the payload where a feed has no timestamp), and polls again slightly less than
+# one period after the last change. Polls that find nothing new are retried quickly at first
+# and then less and less often, so a feed that goes quiet off-peak is not hammered; errors
+# back off exponentially. Validators from the last response (ETag, Last-Modified) are sent back so
+# upstreams that support conditional requests can answer 304 Not Modified.
+
+logger = logging.getLogger(__name__)
+
+PERIOD_SMOOTHING = 0.3 # Weight of the newest observed period in the running estimate
+# After a change the next poll comes at this fraction of the period, a little early. Each
+# observed period is at least the gap between polls, so polling exactly one period later
+# could never notice that the upstream sped up.
+PROBE_FRACTION = 0.75
+
+class AdaptivePoller:
+    """
+    Polling schedule and change detection for one upstream feed.
+
+    Args:
+        name (str): Feed name for logging.
+        interval (float): Initial estimate of the upstream update period, in seconds.
+        min_interval (float): Shortest delay between polls.
+        max_interval (float): Longest delay between polls while the feed is healthy.
+        max_backoff (float): Longest delay after repeated errors.
+        clock: Monotonic time source, replaceable in tests.
+    """
+
+    def __init__(self, name: str, interval: float, min_interval: float, max_interval: float,
+                 max_backoff: float = 900.0, clock=time.monotonic):
+        self.name = name
+        self.period = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.failures = 0 # Consecutive failed polls
+        self.misses = 0 # Consecutive polls that found nothing new
+        self.last_marker = None # Change marker of the last payload applied
+        self._last_upstream_time = None
+        self._last_change_at = None
+        self._validators = {}
+
+    def conditional_headers(self) -> dict:
+        """If-None-Match / If-Modified-Since headers from the last response's validators."""
+        headers = {}
+        if 'etag' in self._validators:
+            headers['If-None-Match'] = self._validators['etag']
+        if 'last-modified' in self._validators:
+            headers['If-Modified-Since'] = self._validators['last-modified']
+        return headers
+
+    def remember_validators(self, response):
+        """Keeps a response's ETag and Last-Modified for the next conditional request."""
+        for header in ('etag', 'last-modified'):
+            value = response.headers.get(header)
+            if value:
+                self._validators[header] = value
+
+    def is_new(self, marker, upstream_time=None) -> bool:
+        """
+        Whether a payload's change marker moved since the last one applied. When it did, the
+        upstream period estimate is updated from the time between the two changes: from the
+        upstream's own timestamps (datetime) if given, else from when the changes were seen.
+        """
+        if marker is None or marker == self.last_marker:
+            return False
+        now = self.clock()
+        if self.last_marker is not None:
+            if upstream_time is not None and self._last_upstream_time is not None:
+                observed = (upstream_time - self._last_upstream_time).total_seconds()
+            else:
+                observed = now - self._last_change_at
+            if observed > 0:
+                self.period += PERIOD_SMOOTHING * (observed - self.period)
+        self.last_marker = marker
+        self._last_upstream_time = upstream_time
+        self._last_change_at = now
+        return True
+
+    def record_poll(self, changed: bool):
+        self.failures = 0
+        self.misses = 0 if changed else self.misses + 1
+
+    def record_failure(self, error: Exception):
+        self.failures += 1
+        logger.warning(f"Polling {self.name} failed ({self.failures} in a row): {error}")
+
+    def next_delay(self) -> float:
+        """Seconds to wait before the next poll."""
+        if self.failures:
+            # Jittered exponential backoff from the normal interval
+            delay = min(self.max_backoff, max(self.min_interval, self.period) * 2 ** (self.failures - 1))
+            return random.uniform(delay / 2, delay)
+        if self.misses == 0:
+            # Just saw a change: the next one is due about one period later, so probe a bit early
+            return min(max(self.period * PROBE_FRACTION, self.min_interval), self.max_interval)
+        # Nothing new yet: retry soon, then less and less often while the feed stays quiet
+        return min(self.min_interval * 2 ** (self.misses - 1), self.max_interval)
+
+    async def run(self, poll_once):
+        """
+        Polls forever on this schedule. poll_once() does one poll and returns whether it found
+        new data; any exception it raises counts as a failed poll.
+        """
+        while True:
+            try:
+                self.record_poll(await poll_once())
+            except Exception as e:
+                self.record_failure(e)
+            await asyncio.sleep(self.next_delay())
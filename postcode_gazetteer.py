@@ -0,0 +1,87 @@
+import logging
+import os
+import numpy as np
+
+# Offline lookup table of Singapore 6-digit postcodes -> (lat, lng).
+# The table is a single NumPy file holding a structured array sorted by postcode, so it can be
+# memory-mapped (shared between workers) and searched with a binary search in microseconds.
+# It is built by prep_postcodes.py.
+
+logger = logging.getLogger(__name__)
+
+GAZETTEER_DTYPE = np.dtype([('postcode', '<u4'), ('lat', '<f8'), ('lng', '<f8')])
+
+def parse_postcode(search_query: str):
+    """Returns the query as an int if it is exactly a 6-digit postcode, else None."""
+    query = search_query.strip()
+    if len(query) == 6 and query.isascii() and query.isdigit():
+        return int(query)
+    return None
+
+def build_gazetteer(entries, file_path: str) -> int:
+    """
+    Writes a gazetteer file from (postcode, lat, lng) entries.
+    Invalid postcodes are skipped; for duplicates the last entry wins.
+
+    Returns:
+        int: Number of postcodes written.
+    """
+    latest = {}
+    for postcode, lat, lng in entries:
+        postcode = parse_postcode(str(postcode))
+        if postcode is None or lat is None or lng is None:
+            continue
+        latest[postcode] = (float(lat), float(lng))
+
+    table = np.empty(len(latest), dtype=GAZETTEER_DTYPE)
+    for i, postcode in enumerate(sorted(latest)):
+        table[i] = (postcode, *latest[postcode])
+
+    # Write to a temporary file first so running workers never map a half-written table
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, table)
+    os.replace(tmp_path, file_path)
+    return len(table)
+
+class PostcodeGazetteer:
+    """Memory-mapped postcode table answering lookups with a binary search."""
+
+    def __init__(self, table: np.ndarray):
+        self.table = table
+        self.postcodes = table['postcode']
+
+    @classmethod
+    def load(cls, file_path: str):
+        """Maps a gazetteer file into memory, or returns None if it is missing or unreadable."""
+        if not os.path.exists(file_path):
+            logger.info(f"No postcode gazetteer at {file_path}; all searches will use OneMap.")
+            return None
+        try:
+            table = np.load(file_path, mmap_mode='r')
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading postcode gazetteer {file_path}: {e}")
+            return None
+        if table.dtype != GAZETTEER_DTYPE:
+            logger.error(f"Postcode gazetteer {file_path} has unexpected dtype {table.dtype}")
+            return None
+        logger.info(f"Loaded {len(table)} postcodes from {file_path}")
+        return cls(table)
+
+    def __len__(self):
+        return len(self.table)
+
+    def lookup(self, search_query: str):
+        """
+        Resolves a 6-digit postcode locally.
+
+        Returns:
+            tuple: (lat, lng), or None if the query is not a known postcode.
+        """
+        postcode = parse_postcode(search_query)
+        if postcode is None:
+            return None
+        i = int(np.searchsorted(self.postcodes, postcode))
+        if i < len(self.postcodes) and self.postcodes[i] == postcode:
+            return float(self.table['lat'][i]), float(self.table['lng'][i])
+        return None
@@ -0,0 +1,54 @@
+# Builds postcode_gazetteer.npy, the offline postcode -> coordinate table used by main.py.
+# Run this whenever the postcode source data changes:
+#   python prep_postcodes.py [postcodes.csv] [geocode_cache.db]
+#
+# Sources, both optional:
+#   - A CSV export with OneMap's column names (POSTAL, LATITUDE, LONGITUDE), e.g. collected
+#     from the OneMap search API or a postcode dataset.
+#   - The SQLite geocode cache (GEOCODE_CACHE_DB), whose 6-digit keys are postcodes that
+#     OneMap has already resolved for our users.
+
+import csv
+import os
+import sqlite3
+import sys
+from postcode_gazetteer import build_gazetteer, parse_postcode
+
+def load_postcode_csv(file_path):
+    entries = []
+    try:
+        with open(file_path, mode='r', encoding='utf-8') as file:
+            reader = csv.DictReader(file)
+            for row in reader:
+                try:
+                    entries.append((row['POSTAL'], float(row['LATITUDE']), float(row['LONGITUDE'])))
+                except (KeyError, TypeError, ValueError):
+                    continue
+    except FileNotFoundError:
+        print(f"Error: The file {file_path} was not found.")
+    return entries
+
+def load_geocode_cache_postcodes(db_path):
+    entries = []
+    try:
+        with sqlite3.connect(db_path) as db:
+            for key, lat, lng in db.execute("SELECT key, lat, lng FROM geocode"):
+                if parse_postcode(key) is not None:
+                    entries.append((key, lat, lng))
+    except sqlite3.Error as e:
+        print(f"An error occurred while reading the geocode cache {db_path}: {e}")
+    return entries
+
+if __name__ == '__main__':
+    postcode_file = sys.argv[1] if len(sys.argv) > 1 else './postcodes.csv'
+    geocode_db = sys.argv[2] if len(sys.argv) > 2 else os.getenv('GEOCODE_CACHE_DB')
+
+    # Cached OneMap answers first so the curated CSV wins on conflicts
+    entries = []
+    if geocode_db and os.path.exists(geocode_db):
+        entries += load_geocode_cache_postcodes(geocode_db)
+    entries += load_postcode_csv(postcode_file)
+
+    output_file = './postcode_gazetteer.npy'
+    count = build_gazetteer(entries, output_file)
+    print(f"Wrote {count} postcodes to {output_file}")
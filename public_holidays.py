@@ -0,0 +1,56 @@
+import json
+import logging
+import os
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+# Singapore public holidays, used to price them at Sunday/PH rates.
+#
+# The calendar is bundled as sg_public_holidays.json (MOM publishes each year's dates in
+# advance); set PUBLIC_HOLIDAYS_FILE to use another copy, and call refresh_public_holidays()
+# after updating it. It is loaded once into one bitset per year, bit n set when day n of the
+# year is a holiday, so classifying a date is a dict lookup and a shift.
+
+logger = logging.getLogger(__name__)
+
+BUNDLED_HOLIDAYS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sg_public_holidays.json')
+
+_holiday_bits = {} # year -> int bitset over day of year (1-based)
+_holiday_dates = [] # sorted, for counting holidays in a range
+
+def set_public_holidays(dates):
+    """Replaces the calendar with the given dates (datetime.date objects)."""
+    global _holiday_bits, _holiday_dates
+    holiday_bits = {}
+    for holiday in dates:
+        holiday_bits[holiday.year] = holiday_bits.get(holiday.year, 0) | (1 << holiday.timetuple().tm_yday)
+    # Swap both tables in one go so readers never see a half-built calendar
+    _holiday_bits, _holiday_dates = holiday_bits, sorted(set(dates))
+
+def refresh_public_holidays(file_path: str = None) -> int:
+    """
+    (Re)loads the calendar from a JSON list of {"date": "YYYY-MM-DD", "holiday": name}.
+    Keeps the current calendar if the file cannot be read.
+
+    Returns:
+        int: The number of holidays loaded.
+    """
+    file_path = file_path or os.getenv('PUBLIC_HOLIDAYS_FILE') or BUNDLED_HOLIDAYS_FILE
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            dates = [date.fromisoformat(entry['date']) for entry in json.load(f)]
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.error(f"Could not load public holidays from {file_path}: {e}")
+        return len(_holiday_dates)
+    set_public_holidays(dates)
+    return len(dates)
+
+def is_public_holiday(day: date) -> bool:
+    """O(1): whether a date (or datetime) falls on a public holiday."""
+    return bool(_holiday_bits.get(day.year, 0) >> day.timetuple().tm_yday & 1)
+
+def public_holidays_between(first_date: date, last_date: date) -> list:
+    """Public holidays from first_date to last_date inclusive."""
+    return _holiday_dates[bisect_left(_holiday_dates, first_date):bisect_right(_holiday_dates, last_date)]
+
+refresh_public_holidays()
@@ -0,0 +1,70 @@
+import hashlib
+from collections import OrderedDict
+
+# Server-side cache of encoded search responses.
+#
+# Nearby searches (the same mall or MRT exit) within one availability version return the same
+# carparks, so responses are cached under the search point rounded to a small grid cell plus
+# every other parameter and the availability snapshot version. Each entry keeps its encoded
+# body and an ETag, so repeat clients can also revalidate with If-None-Match and get a 304.
+# The cache is cleared whenever a new availability snapshot is published.
+
+DEFAULT_PRECISION = 4 # Decimal places of lat/lng kept in the key; 4 is a cell of about 11 m
+
+def quantize_location(lat: float, lng: float, precision: int = DEFAULT_PRECISION) -> tuple:
+    """Rounds a point to the centre of its cache cell; searches run from that point."""
+    return round(lat, precision), round(lng, precision)
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header value matches etag (weak comparison, as for GET)."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag in (candidate[2:] if candidate.startswith('W/') else candidate for candidate in candidates)
+
+class CachedResponse:
+    """An encoded JSON response body with its ETag and extra headers (e.g. X-Next-Cursor)."""
+
+    __slots__ = ('body', 'etag', 'headers')
+
+    def __init__(self, body: bytes, headers: dict = None):
+        self.body = body
+        self.etag = make_etag(body)
+        self.headers = headers or {}
+
+class ResponseCache:
+    """
+    LRU cache of CachedResponse objects.
+
+    Args:
+        max_entries (int): Least recently used entries are evicted beyond this size; 0 disables caching.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry: CachedResponse) -> CachedResponse:
+        if self.max_entries <= 0:
+            return entry
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def clear(self, *_):
+        """Drops every entry; also usable directly as an availability publish listener."""
+        self._entries.clear()
@@ -0,0 +1,223 @@
+import math
+import numpy as np
+
+# Grid-based spatial index for nearest-carpark lookups.
+# Coordinates are projected onto a local equirectangular plane (metres) centred on Singapore,
+# which is accurate to well under a metre at this scale, then bucketed into square cells.
+# Queries only visit the cells around the search point instead of every carpark.
+
+EARTH_RADIUS_M = 6371e3
+REFERENCE_LAT = 1.35 # Latitude used for the local projection (centre of Singapore)
+DEFAULT_CELL_SIZE_M = 500.0
+PROJECTION_SLACK = 1.001 # Covers the tiny gap between planar and great-circle distances
+CURSOR_TOLERANCE_M = 1e-6 # Distances this close are treated as ties when resuming from a cursor
+
+def haversine(lat, lng, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """
+    Vectorized Haversine distance in metres between point(s) and arrays of coordinates.
+
+    lat/lng may be scalars or arrays that broadcast against lats/lngs, e.g. a column of
+    query points of shape (Q, 1) against carpark arrays of shape (N,) gives a (Q, N) matrix.
+    """
+    φ1 = np.radians(lat)
+    φ2 = np.radians(lats)
+    Δφ = φ2 - φ1
+    Δλ = np.radians(lngs) - np.radians(lng)
+    a = np.sin(Δφ / 2) ** 2 + np.cos(φ1) * np.cos(φ2) * np.sin(Δλ / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+def project(lat, lng):
+    """Projects WGS84 point(s) to local planar (x, y) coordinates in metres."""
+    x = EARTH_RADIUS_M * np.radians(lng) * math.cos(math.radians(REFERENCE_LAT))
+    y = EARTH_RADIUS_M * np.radians(lat)
+    return x, y
+
+class SpatialIndex:
+    """
+    Uniform grid over projected carpark coordinates.
+
+    The index stores row numbers into the caller's lat/lng arrays. Queries gather the rows
+    in the rings of cells around the search point, then rank them with one vectorized
+    Haversine pass and a partial sort, so the cost of a query depends on local carpark
+    density rather than on the size of the catalogue. Rows with NaN coordinates are skipped.
+    """
+
+    def __init__(self, lats: np.ndarray, lngs: np.ndarray, cell_size: float = DEFAULT_CELL_SIZE_M):
+        self.lats = lats
+        self.lngs = lngs
+        self.cell_size = cell_size
+        self.cells = {} # (cx, cy) -> np.ndarray of row numbers
+
+        rows = np.flatnonzero(~(np.isnan(lats) | np.isnan(lngs)))
+        self.rows = rows
+        self.size = len(rows)
+        if self.size == 0:
+            self.min_cell = self.max_cell = None
+            self.bounds = None
+            return
+        # (min_lat, min_lng, max_lat, max_lng) of the indexed carparks
+        self.bounds = (float(lats[rows].min()), float(lngs[rows].min()), float(lats[rows].max()), float(lngs[rows].max()))
+
+        x, y = project(lats[rows], lngs[rows])
+        cx = np.floor(x / cell_size).astype(np.int64)
+        cy = np.floor(y / cell_size).astype(np.int64)
+        order = np.lexsort((cy, cx))
+        cx, cy, rows = cx[order], cy[order], rows[order]
+        # Split the sorted rows wherever the cell changes
+        breaks = np.flatnonzero((np.diff(cx) != 0) | (np.diff(cy) != 0)) + 1
+        for start, end in zip(np.r_[0, breaks], np.r_[breaks, len(rows)]):
+            self.cells[(int(cx[start]), int(cy[start]))] = rows[start:end]
+        self.min_cell = (int(cx.min()), int(cy.min()))
+        self.max_cell = (int(cx.max()), int(cy.max()))
+
+    def _cell_of(self, lat: float, lng: float) -> tuple:
+        x, y = project(lat, lng)
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def _ring(self, center: tuple, r: int, mask: np.ndarray = None) -> list:
+        """
+        Row arrays of the occupied cells at Chebyshev distance exactly r from center, keeping
+        only rows where mask (a boolean array over all rows) is set, if given. Only the part of
+        the ring inside the occupied bounding box is visited, so a ring costs at most the box's
+        perimeter in cells however far the center is from the catalogue.
+        """
+        if self.min_cell is None:
+            return []
+        cx, cy = center
+        (min_x, min_y), (max_x, max_y) = self.min_cell, self.max_cell
+        if r == 0:
+            cells = [(cx, cy)]
+        else:
+            xs = range(max(cx - r, min_x), min(cx + r, max_x) + 1)
+            ys = range(max(cy - r + 1, min_y), min(cy + r - 1, max_y) + 1)
+            cells = []
+            for y in (cy - r, cy + r):
+                if min_y <= y <= max_y:
+                    cells.extend((x, y) for x in xs)
+            for x in (cx - r, cx + r):
+                if min_x <= x <= max_x:
+                    cells.extend((x, y) for y in ys)
+        rings = [self.cells[cell] for cell in cells if cell in self.cells]
+        if mask is not None and rings:
+            ring_rows = np.concatenate(rings)
+            rings = [ring_rows[mask[ring_rows]]]
+        return rings
+
+    def _min_ring(self, center: tuple) -> int:
+        """First ring radius that can hold an occupied cell (0 if center is inside the bounding box)."""
+        if self.min_cell is None:
+            return 0
+        return max(0, self.min_cell[0] - center[0], center[0] - self.max_cell[0],
+                   self.min_cell[1] - center[1], center[1] - self.max_cell[1])
+
+    def _max_ring(self, center: tuple) -> int:
+        """Smallest ring radius that covers every occupied cell."""
+        if self.min_cell is None:
+            return -1
+        return max(abs(center[0] - self.min_cell[0]), abs(center[0] - self.max_cell[0]),
+                   abs(center[1] - self.min_cell[1]), abs(center[1] - self.max_cell[1]))
+
+    def _rank(self, lat: float, lng: float, rows: list, k: int = None, after: tuple = None) -> tuple:
+        """
+        Ranks candidate rows by (distance, row), keeping the first k. With after=(distance, row),
+        only candidates ranked after that position are kept (distances within CURSOR_TOLERANCE_M
+        count as equal, so a cursor survives floating-point noise between calls).
+        """
+        if not rows:
+            return np.empty(0), np.empty(0, dtype=np.int64)
+        rows = np.concatenate(rows)
+        distances = haversine(lat, lng, self.lats[rows], self.lngs[rows])
+        if after is not None:
+            after_distance, after_row = after
+            keep = (distances > after_distance + CURSOR_TOLERANCE_M) | \
+                   ((distances >= after_distance - CURSOR_TOLERANCE_M) & (rows > after_row))
+            distances, rows = distances[keep], rows[keep]
+        if k is not None and k < len(distances):
+            # Partial selection; everything tied with the k-th distance stays in so the row
+            # tie-break below is applied consistently from one page to the next
+            kth_distance = np.partition(distances, k - 1)[k - 1]
+            candidates = np.flatnonzero(distances <= kth_distance)
+            distances, rows = distances[candidates], rows[candidates]
+        order = np.lexsort((rows, distances))[:k]
+        return distances[order], rows[order]
+
+    def nearest(self, lat: float, lng: float, k: int, after: tuple = None, mask: np.ndarray = None) -> tuple:
+        """
+        Finds the k carparks closest to a point.
+
+        Args:
+            lat (float): Latitude of the search point.
+            lng (float): Longitude of the search point.
+            k (int): Number of carparks to return.
+            after (tuple): Optional (distance, row) of the last result of a previous page;
+                results continue from there in (distance, row) order.
+            mask (np.ndarray): Optional boolean array over all rows; only rows where it is set
+                are considered. Filtered-out carparks are dropped before any distance is computed.
+
+        Returns:
+            tuple: (distances_in_meters, rows) arrays, nearest first.
+        """
+        center = self._cell_of(lat, lng)
+        max_ring = self._max_ring(center)
+        if k <= 0 or max_ring < 0:
+            return self._rank(lat, lng, [])
+
+        # Outside the occupied bounding box the local projection no longer bounds distances
+        # well and the rings up to the catalogue are mostly empty, so rank every row at once
+        if self._min_ring(center) > 0:
+            rows = self.rows if mask is None else self.rows[mask[self.rows]]
+            return self._rank(lat, lng, [rows], k, after)
+
+        # Rings lying wholly closer than the cursor only hold earlier pages: any point in ring r
+        # is at most (r + 1) cells away along each axis
+        r = 0
+        if after is not None:
+            r = max(0, int(after[0] // (self.cell_size * math.sqrt(2) * PROJECTION_SLACK)) - 1)
+
+        # Grow the search square until it holds at least k carparks (after the cursor)
+        rows, count = [], 0
+        while r <= max_ring:
+            ring = self._ring(center, r, mask)
+            rows.extend(ring)
+            count += sum(len(cell_rows) for cell_rows in ring)
+            if count >= k and (after is None or len(self._rank(lat, lng, rows, k, after)[1]) >= k):
+                break
+            r += 1
+        if r > max_ring:
+            return self._rank(lat, lng, rows, k, after)
+
+        # The k-th best candidate so far bounds the answer; every carpark within that distance
+        # lies within ceil(distance / cell_size) rings, so widen the square to cover it once
+        kth_distance = self._rank(lat, lng, rows, k, after)[0][-1]
+        last_ring = min(max_ring, int(math.ceil(kth_distance * PROJECTION_SLACK / self.cell_size)))
+        for extra in range(r + 1, last_ring + 1):
+            rows.extend(self._ring(center, extra, mask))
+        return self._rank(lat, lng, rows, k, after)
+
+    def distance_to_bounds(self, lat: float, lng: float) -> float:
+        """
+        Metres from a point to the bounding box of the indexed carparks (0 inside it, inf for an
+        empty index); never more than the distance to the nearest carpark, so callers can turn
+        away points that cannot have any carpark within their radius without searching.
+        """
+        if self.bounds is None:
+            return math.inf
+        min_lat, min_lng, max_lat, max_lng = self.bounds
+        nearest_lat, nearest_lng = min(max(lat, min_lat), max_lat), min(max(lng, min_lng), max_lng)
+        return float(haversine(lat, lng, nearest_lat, nearest_lng)) / PROJECTION_SLACK
+
+    def within_radius(self, lat: float, lng: float, radius: float, mask: np.ndarray = None) -> tuple:
+        """
+        Finds every carpark within radius metres of a point (among rows where mask is set, if given).
+
+        Returns:
+            tuple: (distances_in_meters, rows) arrays, nearest first.
+        """
+        center = self._cell_of(lat, lng)
+        last_ring = min(self._max_ring(center), int(math.ceil(radius * PROJECTION_SLACK / self.cell_size)))
+        rows = []
+        for r in range(self._min_ring(center), last_ring + 1):
+            rows.extend(self._ring(center, r, mask))
+        distances, rows = self._rank(lat, lng, rows)
+        keep = distances <= radius
+        return distances[keep], rows[keep]
@@ -1,39 +1,66 @@
-# Runs during application startup
-# Import HDB carpark data and URA carpark data and store both in a dictionary
-# Call realtime carpark availability API to get the latest carpark availability data
+# Builds the static carpark catalogue: imports HDB carpark data and URA carpark data, stores both
+# in a dictionary and writes combined_carpark_data.json plus the compiled snapshot.
+# Also holds the poller for the realtime carpark availability API.
+#
+# Importing this module has no side effects; run the build explicitly with
+#   python startup.py [--force]
+# Each source file is hashed and only the sources that changed since the last build are
+# reprocessed; the other carparks are carried over from the previous combined_carpark_data.json.
 
+import argparse
 import csv
+from datetime import datetime
+import hashlib
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-import requests
+import httpx
 import math
 import logging
 import json
 import os
+import numpy as np
 from bs4 import BeautifulSoup
 from pyproj import Transformer
 import asyncio
+from http_client import fetch
+from availability import availability_store
+from polling import AdaptivePoller
+from carpark_store import CarparkStore
+from carpark_snapshot import write_snapshot
 
 # Load environment variables from .env file
 from dotenv import load_dotenv
 load_dotenv()
 
-# A single dictionary to hold both HDB and URA carpark data
-data = {}
+logger = logging.getLogger(__name__)
+
+URA_SKIPPED_VEHICLE_CATEGORIES = ("Heavy Vehicle", "Motorcycle") # Only car carparks are listed
 
 svy21_to_wgs84_transformer = Transformer.from_crs("EPSG:3414", "EPSG:4326", always_xy=True)
+_wgs84_cache = {} # SVY21 (x, y) -> WGS84 (lat, lng); carparks rarely move between rebuilds
+
+def svy21_to_wgs84(points: list) -> list:
+    """
+    Projects SVY21 (x, y) points to WGS84 (lat, lng) with one vectorized pyproj call.
+    Points projected before, in this build or an earlier one, come from a cache.
+    """
+    missing = [point for point in dict.fromkeys(points) if point not in _wgs84_cache]
+    if missing:
+        xs, ys = np.array(missing, dtype=np.float64).T
+        lngs, lats = svy21_to_wgs84_transformer.transform(xs, ys)
+        _wgs84_cache.update(zip(missing, zip(lats.tolist(), lngs.tolist())))
+    return [_wgs84_cache[point] for point in points]
 
-def load_HDB_carpark_data(file_path, data):
-        
+def load_HDB_carpark_data(file_path, data, raise_errors=False):
+    # raise_errors: let read errors propagate instead of returning whatever was loaded (build mode)
     try:
         with open(file_path, mode='r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
+            rows = list(csv.DictReader(file))
+            # Project every carpark's coordinates in one go
+            coordinates = svy21_to_wgs84([(float(row['x_coord']), float(row['y_coord'])) for row in rows])
+            for row, (lat, lng) in zip(rows, coordinates):
                 carpark_number = row['car_park_no']
                 address = row['address']
-                x_coord = float(row['x_coord'])
-                y_coord = float(row['y_coord'])
-                lng, lat = svy21_to_wgs84_transformer.transform(x_coord, y_coord)
                 data[carpark_number] = {
                     'carpark_number': carpark_number,
                     'address': address,
@@ -41,44 +68,91 @@ def load_HDB_carpark_data(file_path, data):
                     'type': 'HDB',
                     'total_lots': 0,
                     'available_lots': 'N/A',
+                    # Facility attributes, used by the search filters
+                    'car_park_type': row['car_park_type'],
+                    'type_of_parking_system': row['type_of_parking_system'],
+                    'short_term_parking': row['short_term_parking'],
+                    'free_parking': row['free_parking'],
+                    'night_parking': row['night_parking'],
+                    'gantry_height': float(row['gantry_height']), # metres, 0 where there is no gantry
+                    'car_park_basement': row['car_park_basement'],
                 }
     except FileNotFoundError:
+        if raise_errors:
+            raise
         print(f"Error: The file {file_path} was not found.")
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"An error occurred while reading the file: {e}")
     return data
 
-async def update_realtime_availability_task(dictionary):
-    # This dictionary is different from data, dictionary is used to update real-time availability
-    # change variable names to indicate this is HDB carpark data
-    while True:
-        # print("Updating real-time carpark availability...")
+HDB_AVAILABILITY_URL = "https://api.data.gov.sg/v1/transport/carpark-availability"
+# data.gov.sg refreshes about once a minute; the poller adapts to the observed cadence
+hdb_availability_poller = AdaptivePoller("data.gov.sg carpark availability", interval=60, min_interval=15, max_interval=300)
+
+async def poll_realtime_availability(store=availability_store, poller=hdb_availability_poller) -> bool:
+    """
+    Polls HDB carpark availability from data.gov.sg once and publishes changes to the
+    availability store. Payloads whose latest update_datetime (or, without one, whose
+    content) has not moved since the last payload applied are skipped.
+
+    Returns:
+        bool: Whether the poll carried new data.
+    """
+    carpark_response = await fetch("GET", HDB_AVAILABILITY_URL, headers=poller.conditional_headers())
+    poller.remember_validators(carpark_response)
+    if carpark_response.status_code == 304:
+        return False
+    real_time_carpark_data = carpark_response.json()
+
+    if real_time_carpark_data and real_time_carpark_data.get('items') and real_time_carpark_data['items'][0].get('carpark_data'):
+        carpark_data = real_time_carpark_data['items'][0]['carpark_data']
+        latest_update = max((cp['update_datetime'] for cp in carpark_data if cp.get('update_datetime')), default=None)
         try:
-            carpark_api_url = "https://api.data.gov.sg/v1/transport/carpark-availability"
-            carpark_response = requests.get(carpark_api_url)
-            carpark_response.raise_for_status()
-            real_time_carpark_data = carpark_response.json()
-            
-            if real_time_carpark_data and real_time_carpark_data.get('items') and real_time_carpark_data['items'][0].get('carpark_data'):
-                for cp in real_time_carpark_data['items'][0]['carpark_data']:
-                    carpark_number = cp.get('carpark_number')
-                    carpark_info = cp.get('carpark_info')[0]
-                    # print(f"Processing carpark {carpark_number} with info: {carpark_info}")
-                    total_lots, available_lots = carpark_info.get('total_lots'), carpark_info.get('lots_available')
-                    # print(f"Processing carpark {carpark_number}: Total Lots = {total_lots}, Available Lots = {available_lots}")
-                    if carpark_number in dictionary:
-                        dictionary[carpark_number]['total_lots'] = int(total_lots) if total_lots else 0
-                        dictionary[carpark_number]['available_lots'] = int(available_lots) if available_lots else 'N/A'
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to fetch real-time carpark availability: {e}")
-        except Exception as e:
-            print(f"Error processing real-time availability data: {e}")
-        await asyncio.sleep(60)
-
-def parse_ura_feature(feature, data):
+            upstream_time = datetime.fromisoformat(latest_update) if latest_update else None
+        except ValueError:
+            upstream_time = None
+        marker = latest_update or hashlib.blake2b(carpark_response.content, digest_size=16).digest()
+        if marker == poller.last_marker:
+            return False
+
+        rows = {}
+        for cp in carpark_data:
+            carpark_number = cp.get('carpark_number')
+            carpark_info = cp.get('carpark_info')[0]
+            total_lots, available_lots = carpark_info.get('total_lots'), carpark_info.get('lots_available')
+            rows[carpark_number] = (int(total_lots) if total_lots else 0, int(available_lots) if available_lots else 'N/A')
+
+        # Only the carparks whose counts moved are copied into the next snapshot
+        await store.apply(rows)
+        # Recorded only once applied, so a payload that failed to parse is retried
+        return poller.is_new(marker, upstream_time)
+    return False
+
+async def update_realtime_availability_task(store=availability_store):
+    # Polls HDB carpark availability from data.gov.sg on the adaptive schedule, forever
+    await hdb_availability_poller.run(lambda: poll_realtime_availability(store))
+
+def parse_ura_coordinates(feature):
+    """SVY21 (x, y) of a URA rate item's first geometry, or None if it has none or it is malformed."""
+    geometries = feature.get('geometries')
+    if geometries and len(geometries) > 0 and geometries[0].get('coordinates'):
+        coords_str = geometries[0]['coordinates']
+        try:
+            x_coord, y_coord = map(float, coords_str.split(','))
+            return x_coord, y_coord
+        except ValueError:
+            logger.warning(f"URA rate item {feature.get('ppCode')}: Malformed coordinates '{coords_str}', skipping coord conversion.")
+    return None
+
+def parse_ura_feature(feature, data, coordinates_of=None):
     """
     Parses a single URA GeoJSON feature to extract carpark details.
     Returns a dictionary of extracted properties and coordinates.
+
+    coordinates_of maps ppCode -> (lat, lng) projected in advance for a whole file (see
+    load_URA_carpark_data); without it, the feature's own coordinates are projected.
     """
 
     # 1. Parse carpark number
@@ -89,22 +163,10 @@ def parse_ura_feature(feature, data):
         # print(f"URA feature missing PP_CODE in description, skipping: {props.get('Name')}")
         return None
     vehicleCat = feature.get('vehCat')
-    if vehicleCat == "Heavy Vehicle" or vehicleCat == "Motorcycle":
+    if vehicleCat in URA_SKIPPED_VEHICLE_CATEGORIES:
         return None # Skip heavy vehicle carparks and motorcycles for now
 
-    # 2. Extract Coordinates (from Polygon geometry)
-    # GeoJSON coordinates are [longitude, latitude, altitude] for a Point or first point of a Polygon
-    lat, lng = None, None
-    geometries = feature.get('geometries')
-    if geometries and len(geometries) > 0 and geometries[0].get('coordinates'):
-        coords_str = geometries[0]['coordinates']
-        try:
-            x_coord, y_coord = map(float, coords_str.split(','))
-            lng, lat = svy21_to_wgs84_transformer.transform(x_coord, y_coord)
-        except ValueError:
-            logger.warning(f"URA rate item {pp_code}: Malformed coordinates '{coords_str}', skipping coord conversion.")       
-    
-    # 3. Construct the carpark data dictionary
+    # 2. Construct the carpark data dictionary
     if carpark_number in data:
         # print(f"Updating existing URA carpark {carpark_number} with new rate data.")
         new_rate = {
@@ -131,6 +193,12 @@ def parse_ura_feature(feature, data):
         if 'total_lots' not in data[carpark_number]:
             data[carpark_number]['total_lots'] = feature.get('parkCapacity', 0)    
     else:
+        # 3. Extract Coordinates (from Polygon geometry), only needed for a carpark's first rate item
+        if coordinates_of is not None:
+            lat, lng = coordinates_of.get(carpark_number, (None, None))
+        else:
+            point = parse_ura_coordinates(feature)
+            lat, lng = svy21_to_wgs84([point])[0] if point else (None, None)
         data[carpark_number] = {
             'carpark_number': carpark_number,
             'address': feature.get('ppName', 'N/A'),
@@ -158,8 +226,9 @@ def parse_ura_feature(feature, data):
             }]
         }
 
-def load_URA_carpark_data(file_path, data):
+def load_URA_carpark_data(file_path, data, raise_errors=False):
     # ura_carparks = {}
+    # raise_errors: let read errors propagate instead of returning whatever was loaded (build mode)
     try:
         with open(file_path, mode='r', encoding='utf-8') as file:
             ura_data = json.load(file)
@@ -167,31 +236,134 @@ def load_URA_carpark_data(file_path, data):
             
             if ura_data.get('Status') == 'Success' and ura_data.get('Result'):
                 # print(ura_data['Result'][0])
+                # Every rate item repeats its carpark's geometry; project each carpark once,
+                # all in one vectorized call
+                points = {}
+                for item in ura_data['Result']:
+                    carpark_number = item.get('ppCode')
+                    if carpark_number and carpark_number not in points and item.get('vehCat') not in URA_SKIPPED_VEHICLE_CATEGORIES:
+                        points[carpark_number] = parse_ura_coordinates(item)
+                points = {carpark_number: point for carpark_number, point in points.items() if point}
+                coordinates_of = dict(zip(points, svy21_to_wgs84(list(points.values()))))
                 for item in ura_data['Result']:
-                    parse_ura_feature(item, data)
+                    parse_ura_feature(item, data, coordinates_of)
             else:
+                if raise_errors:
+                    raise ValueError(f"Provided file {file_path} is not a valid GeoJSON FeatureCollection.")
                 print(f"Provided file {file_path} is not a valid GeoJSON FeatureCollection.")
     except FileNotFoundError:
+        if raise_errors:
+            raise
         print(f"Error: The URA GeoJSON file {file_path} was not found.")
     except json.JSONDecodeError:
+        if raise_errors:
+            raise
         print(f"Error: The file {file_path} is not a valid JSON file.")
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"An error occurred while reading the URA GeoJSON file: {e}")
     return data
 
-# Load all the data, then save it as a json file
-prep_data_file = './HDBCarparkInformation.csv'
-data = load_HDB_carpark_data(prep_data_file, data)
-
-prep_data_file_ura = './carpark_rates.json'
-data = load_URA_carpark_data(prep_data_file_ura, data)
-
-# Check for None values in coordinates
-for carpark_number, carpark_info in data.items():
-    if carpark_info['coordinates'][0] is None or carpark_info['coordinates'][0] is None:
-        # del data[carpark_number]
-        print(f"Carpark {carpark_number} has invalid coordinates: {carpark_info['coordinates']}")
-# Save the combined data to a JSON file
-output_file = './combined_carpark_data.json'
-with open(output_file, 'w', encoding='utf-8') as f:
-    json.dump(data, f, ensure_ascii=False, indent=4)
+# Build sources and outputs
+HDB_SOURCE_FILE = './HDBCarparkInformation.csv'
+URA_SOURCE_FILE = './carpark_rates.json'
+COMBINED_DATA_FILE = './combined_carpark_data.json'
+SNAPSHOT_FILE = './carpark_snapshot.bin'
+BUILD_MANIFEST_FILE = './build_manifest.json' # Content hashes of the sources of the last build
+
+def file_digest(file_path):
+    """SHA-256 of a file's contents, or None if it does not exist."""
+    digest = hashlib.sha256()
+    try:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+def _read_json(file_path, default):
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return default
+
+def _write_json(file_path, value, **kwargs):
+    """Writes atomically, so API workers reloading the file never see it half written."""
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(value, f, ensure_ascii=False, **kwargs)
+    os.replace(tmp_path, file_path)
+
+def build_carpark_data(hdb_file=HDB_SOURCE_FILE, ura_file=URA_SOURCE_FILE, output_file=COMBINED_DATA_FILE,
+                       snapshot_file=SNAPSHOT_FILE, manifest_file=BUILD_MANIFEST_FILE, force=False) -> list:
+    """
+    Rebuilds combined_carpark_data.json and the snapshot from whichever sources changed.
+
+    A source is reprocessed when its content hash differs from the one recorded in the
+    manifest (or force is set); carparks from unchanged or missing sources are kept from the
+    previous output. Nothing is written when no source changed and both outputs exist.
+
+    Returns:
+        list: The sources that were reprocessed ('hdb', 'ura'); empty if already up to date.
+
+    Raises:
+        Exception: If a changed source cannot be read or yields no carparks. Nothing is
+            written then, so the outputs keep the last good build and the source is retried.
+    """
+    manifest = _read_json(manifest_file, {})
+    previous = _read_json(output_file, None)
+    if previous is None:
+        force = True
+    sources = {'hdb': (hdb_file, 'HDB', load_HDB_carpark_data), 'ura': (ura_file, 'URA', load_URA_carpark_data)}
+
+    parts, rebuilt = {}, []
+    for source, (file_path, carpark_type, load) in sources.items():
+        digest = file_digest(file_path)
+        if digest is None:
+            print(f"Error: Source file {file_path} was not found; keeping its carparks from the last build.")
+        elif force or digest != manifest.get(source):
+            parts[source] = load(file_path, {}, raise_errors=True)
+            if not parts[source]:
+                raise ValueError(f"{file_path} yielded no carparks; keeping the last build.")
+            manifest[source] = digest
+            rebuilt.append(source)
+            continue
+        parts[source] = {carpark_number: carpark_info for carpark_number, carpark_info in (previous or {}).items()
+                         if carpark_info.get('type') == carpark_type}
+
+    if not rebuilt and os.path.exists(snapshot_file):
+        return rebuilt
+
+    # HDB carparks first; a URA rate item for an existing carpark number adds nothing to it
+    data = dict(parts['hdb'])
+    for carpark_number, carpark_info in parts['ura'].items():
+        data.setdefault(carpark_number, carpark_info)
+
+    # Check for None values in coordinates
+    for carpark_number, carpark_info in data.items():
+        if carpark_info['coordinates'][0] is None or carpark_info['coordinates'][1] is None:
+            # del data[carpark_number]
+            print(f"Carpark {carpark_number} has invalid coordinates: {carpark_info['coordinates']}")
+
+    # Save the combined data to a JSON file, then compile the same data into the binary
+    # snapshot that the API workers memory-map at startup
+    if rebuilt:
+        _write_json(output_file, data, indent=4)
+    write_snapshot(CarparkStore.from_dict(data), snapshot_file)
+    # The manifest goes last, so an interrupted build is redone next time
+    _write_json(manifest_file, manifest, indent=4)
+    return rebuilt
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the combined carpark data and snapshot from the HDB and URA sources.")
+    parser.add_argument('--force', action='store_true', help="Reprocess every source even if unchanged")
+    args = parser.parse_args()
+    try:
+        rebuilt = build_carpark_data(force=args.force)
+    except Exception as e:
+        print(f"Build failed, outputs left unchanged: {e}")
+        raise SystemExit(1)
+    print(f"Rebuilt from {', '.join(rebuilt)}." if rebuilt else "Carpark data is up to date.")
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from availability import AvailabilityStore, AvailabilitySnapshot
+from availability_backends import FileBackend, sync_availability
+
+class TestAvailabilityStore(unittest.IsolatedAsyncioTestCase):
+
+    async def test_first_poll_changes_everything(self):
+        store = AvailabilityStore()
+        rows = {"ACB": (100, 10), "HG16": (50, 'N/A')}
+        self.assertEqual(await store.apply(rows, timestamp=1.0), 1)
+        self.assertEqual(dict(store.snapshot.lots), rows)
+        self.assertEqual(dict(store.snapshot.last_changed), {"ACB": 1.0, "HG16": 1.0})
+
+    async def test_only_changed_rows_are_applied(self):
+        store = AvailabilityStore()
+        await store.apply({"ACB": (100, 10), "HG16": (50, 5)}, timestamp=1.0)
+        self.assertEqual(store.snapshot.diff({"ACB": (100, 10), "HG16": (50, 4)}), {"HG16": (50, 4)})
+        self.assertEqual(await store.apply({"ACB": (100, 10), "HG16": (50, 4)}, timestamp=2.0), 2)
+        self.assertEqual(dict(store.snapshot.last_changed), {"ACB": 1.0, "HG16": 2.0})
+
+    async def test_unchanged_poll_keeps_snapshot(self):
+        store = AvailabilityStore()
+        await store.apply({"ACB": (100, 10)})
+        snapshot = store.snapshot
+        self.assertEqual(await store.apply({"ACB": (100, 10)}), 1)
+        self.assertIs(store.snapshot, snapshot)
+
+    async def test_old_snapshots_are_never_mutated(self):
+        store = AvailabilityStore()
+        await store.apply({"ACB": (100, 10)})
+        reader_view = store.snapshot
+        await store.apply({"ACB": (100, 9)})
+        self.assertEqual(reader_view.lots["ACB"], (100, 10))
+        self.assertEqual(store.snapshot.lots["ACB"], (100, 9))
+        with self.assertRaises(TypeError):
+            reader_view.lots["ACB"] = (0, 0)
+
+    async def test_concurrent_pollers_do_not_lose_updates(self):
+        store = AvailabilityStore()
+        await asyncio.gather(store.apply({"ACB": (100, 10)}), store.apply({"A0004": (None, 3)}))
+        self.assertEqual(dict(store.snapshot.lots), {"ACB": (100, 10), "A0004": (None, 3)})
+        self.assertEqual(store.version, 2)
+
+class TestFileBackend(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp.name, 'availability.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def test_single_leader(self):
+        first, second = FileBackend(self.file_path), FileBackend(self.file_path)
+        self.assertTrue(await first.acquire_leadership())
+        self.assertTrue(await first.acquire_leadership())
+        self.assertFalse(await second.acquire_leadership())
+
+    async def test_followers_load_published_snapshots(self):
+        leader = AvailabilityStore(FileBackend(self.file_path))
+        follower_backend = FileBackend(self.file_path)
+        self.assertIsNone(await follower_backend.load(0))
+
+        await leader.apply({"ACB": (100, 10), "A0004": (None, 'N/A')}, timestamp=1.0)
+        snapshot = await follower_backend.load(0)
+        self.assertEqual(snapshot.version, 1)
+        self.assertEqual(dict(snapshot.lots), {"ACB": (100, 10), "A0004": (None, 'N/A')})
+        # Unchanged file, or a version the follower already has, loads nothing
+        self.assertIsNone(await follower_backend.load(0))
+        self.assertIsNone(await FileBackend(self.file_path).load(1))
+
+class LeaseLosingBackend:
+    """Grants leadership for the first sync only, then reports the lease as taken over."""
+
+    def __init__(self):
+        self.grants = [True]
+        self.loads = 0
+
+    async def acquire_leadership(self) -> bool:
+        return self.grants.pop(0) if self.grants else False
+
+    async def publish(self, snapshot):
+        pass
+
+    async def load(self, known_version: int):
+        self.loads += 1
+        return None
+
+class TestSyncAvailability(unittest.IsolatedAsyncioTestCase):
+
+    async def test_pollers_stop_when_lease_is_lost(self):
+        backend = LeaseLosingBackend()
+        store = AvailabilityStore(backend)
+        pollers = []
+
+        def start_pollers():
+            pollers.append(asyncio.create_task(asyncio.sleep(3600)))
+            return pollers
+
+        sync = asyncio.create_task(sync_availability(store, start_pollers, interval=0.01))
+        await asyncio.sleep(0.1)
+        sync.cancel()
+        self.assertEqual(len(pollers), 1)
+        self.assertTrue(pollers[0].cancelled())
+        # Back to following: snapshots are loaded on every sync after the loss
+        self.assertGreater(backend.loads, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,7 @@ import datetime
 from datetime import datetime, date, time, timedelta
 import math
 import unittest # Import unittest for testing
-from calc_rates import calc_cost, calc_hdb_cost, get_day_type, parse_time_str_to_obj, special_rates_HDB
+from calc_rates import calc_cost, calc_hdb_cost, get_day_type, count_day_types, parse_time_str_to_obj, special_rates_HDB, compiled_HDB_tariffs, ura_tariff_id, get_tariff_id, calc_cost_memoized, calc_cost_many
 import json
 import os
 
@@ -200,6 +200,137 @@ class TestHDBParkingCost(unittest.TestCase):
         cost = calc_cost(self.combined_data["ACB"], start_dt, end_dt)
         self.assertEqual(cost, 13.60)
 
+    def test_multi_day_standard_carpark(self):
+        # Park 10:00 Monday to 10:00 Thursday (standard carpark, 0.02/min)
+        # Mon: 10:00-24:00 = 16.80, Tue and Wed: 28.80 each, Thu: 00:00-10:00 = 12.00
+        start_dt = datetime(self.MONDAY.year, self.MONDAY.month, self.MONDAY.day, 10, 0, 0)
+        end_dt = start_dt + timedelta(days=3)
+        cost = calc_cost(self.combined_data["Y79M"], start_dt, end_dt)
+        self.assertEqual(cost, 86.40)
+
+    def test_count_day_types(self):
+        # 30 days from Tuesday 1 July 2025: 4 whole weeks plus a Tuesday and a Wednesday
+        counts = count_day_types(date(2025, 7, 1), date(2025, 7, 30))
+        self.assertEqual(counts, {"weekday": 22, "saturday": 4, "sunday_ph": 4})
+        self.assertEqual(sum(count_day_types(date(2025, 7, 2), date(2025, 7, 1)).values()), 0)
+
+    # --- Gaps between special bands (BBB has no band from 17:00 to 18:59:59) ---
+
+    def test_bbb_weekday_gap_charged_default_rate(self):
+        # Park 17:30 to 18:30 (60 mins) on weekday, entirely in the gap
+        # 60 mins @ default 0.60/half-hour = 1.20
+        start_dt = datetime(self.MONDAY.year, self.MONDAY.month, self.MONDAY.day, 17, 30, 0)
+        end_dt = datetime(self.MONDAY.year, self.MONDAY.month, self.MONDAY.day, 18, 30, 0)
+        cost = calc_cost(self.combined_data["BBB"], start_dt, end_dt)
+        self.assertEqual(cost, 1.20)
+
+    def test_bbb_weekday_across_gap(self):
+        # Park 16:30 to 19:30 (3 hours) on weekday
+        # 16:30-17:00 (30 mins @ 1.20/half-hour) = 1.20
+        # 17:00-19:00 (120 mins gap @ default 0.60/half-hour) = 2.40
+        # 19:00-19:30 (30 mins @ 0.60/half-hour) = 0.60
+        # Total = 1.20 + 2.40 + 0.60 = 4.20
+        start_dt = datetime(self.MONDAY.year, self.MONDAY.month, self.MONDAY.day, 16, 30, 0)
+        end_dt = datetime(self.MONDAY.year, self.MONDAY.month, self.MONDAY.day, 19, 30, 0)
+        cost = calc_cost(self.combined_data["BBB"], start_dt, end_dt)
+        self.assertEqual(cost, 4.20)
+
+    def test_partial_minutes_within_a_band(self):
+        # Park 12:00:30 to 12:20:45 on weekday (HG16, 0.80 band): 20m15s is charged as 21 mins
+        start_dt = datetime(self.MONDAY.year, self.MONDAY.month, self.MONDAY.day, 12, 0, 30)
+        end_dt = datetime(self.MONDAY.year, self.MONDAY.month, self.MONDAY.day, 12, 20, 45)
+        cost = calc_cost(self.combined_data["HG16"], start_dt, end_dt)
+        self.assertEqual(cost, round(21 * 0.80 / 30, 2))
+
+    def test_compiled_tariffs_cover_whole_day(self):
+        for carpark, day_tariffs in compiled_HDB_tariffs.items():
+            for day, tariff in day_tariffs.items():
+                self.assertEqual(tariff.boundaries[0], 0)
+                self.assertEqual(tariff.boundaries, sorted(tariff.boundaries))
+                self.assertEqual(len(tariff.boundaries), len(tariff.rates_per_minute))
+
+class TestURAParkingCost(unittest.TestCase):
+
+    MONDAY = date(2025, 7, 7)
+
+    def setUp(self):
+        with open('combined_carpark_data.json', 'r') as f:
+            self.combined_data = json.load(f)
+
+    def at(self, hour, minute, days=0):
+        return datetime.combine(self.MONDAY + timedelta(days=days), time(hour, minute))
+
+    def test_parse_dotted_time(self):
+        self.assertEqual(parse_time_str_to_obj("10.30 PM"), time(22, 30))
+        self.assertEqual(parse_time_str_to_obj("07:00 AM"), time(7, 0))
+
+    def test_free_then_charged_block(self):
+        # A0004: 07:00-08:30 free, 08:30-17:00 $0.60 per 30 mins -> 08:30-09:00 is one unit
+        self.assertEqual(calc_cost(self.combined_data["A0004"], self.at(8, 0), self.at(9, 0)), 0.60)
+
+    def test_partial_unit_rounds_up(self):
+        # 45 mins at $0.60 per 30 mins = 2 units
+        self.assertEqual(calc_cost(self.combined_data["A0004"], self.at(10, 0), self.at(10, 45)), 1.20)
+
+    def test_cross_block(self):
+        # 16:30-17:00 in the day block, 17:00-17:30 in the evening block
+        self.assertEqual(calc_cost(self.combined_data["A0004"], self.at(16, 30), self.at(17, 30)), 1.20)
+
+    def test_overnight_free_block(self):
+        # 21:00-22:00 charged (2 units), 22:00-07:00 and 07:00-08:00 free
+        self.assertEqual(calc_cost(self.combined_data["A0004"], self.at(21, 0), self.at(8, 0, days=1)), 1.20)
+
+    def test_overnight_cheaper_alternative_applies(self):
+        # A0007 overnight: $0.70 per 30 mins or $5.60 per 510 mins, across midnight
+        carpark = self.combined_data["A0007"]
+        self.assertEqual(calc_cost(carpark, self.at(23, 0), self.at(6, 0, days=1)), 5.60)
+        self.assertEqual(calc_cost(carpark, self.at(22, 30), self.at(23, 0)), 0.70)
+
+    def test_multi_week_stay(self):
+        # A0007's blocks start and end at 07:00, so back-to-back weeks from 07:00 add up
+        carpark = self.combined_data["A0007"]
+        one_week = calc_cost(carpark, self.at(7, 0), self.at(7, 0, days=7))
+        self.assertEqual(calc_cost(carpark, self.at(7, 0), self.at(7, 0, days=14)), round(2 * one_week, 2))
+
+    def test_identical_schedules_share_a_tariff(self):
+        ura = [carpark for carpark in self.combined_data.values() if carpark['type'] == 'URA']
+        tariff_ids = {ura_tariff_id(carpark['rates']) for carpark in ura}
+        self.assertLess(len(tariff_ids), len(ura))
+        self.assertEqual(ura_tariff_id(json.loads(json.dumps(ura[0]['rates']))), ura_tariff_id(ura[0]['rates']))
+
+class TestMemoizedPricing(unittest.TestCase):
+
+    def setUp(self):
+        with open('combined_carpark_data.json', 'r') as f:
+            self.combined_data = json.load(f)
+
+    def test_default_hdb_carparks_share_a_price(self):
+        start_dt, end_dt = datetime(2025, 7, 7, 9, 0), datetime(2025, 7, 7, 11, 10)
+        default_hdb = [carpark for number, carpark in self.combined_data.items()
+                       if carpark['type'] == 'HDB' and number not in compiled_HDB_tariffs][:50]
+        self.assertEqual({get_tariff_id(carpark) for carpark in default_hdb}, {"HDB"})
+        memo = {}
+        for carpark in default_hdb + [self.combined_data["HG16"], self.combined_data["A0004"]]:
+            self.assertEqual(calc_cost_memoized(carpark, start_dt, end_dt, memo), calc_cost(carpark, start_dt, end_dt))
+        self.assertEqual(len(memo), 3)
+
+    def test_calc_cost_many_matches_calc_cost(self):
+        carparks = list(self.combined_data.values())
+        intervals = [
+            (datetime(2025, 7, 7, 8, 0), datetime(2025, 7, 7, 18, 30)),   # weekday, whole minutes
+            (datetime(2025, 7, 5, 22, 10), datetime(2025, 7, 6, 9, 45)),  # Saturday night into Sunday
+            (datetime(2025, 7, 7, 12, 0, 30), datetime(2025, 7, 7, 12, 20, 45)), # sub-minute
+            (datetime(2025, 7, 7, 9, 0), datetime(2025, 7, 7, 9, 10)),    # grace period
+            (datetime(2025, 7, 7, 8, 0), datetime(2025, 7, 9, 10, 0)),    # multi-day
+            (datetime(2025, 7, 4, 19, 25), datetime(2025, 7, 8, 6, 40)),  # over a weekend
+        ]
+        for start_dt, end_dt in intervals:
+            expected = [calc_cost(carpark, start_dt, end_dt) for carpark in carparks]
+            costs = calc_cost_many(carparks, start_dt, end_dt)
+            self.assertEqual(len(costs), len(carparks))
+            for cost, expected_cost in zip(costs.tolist(), expected):
+                self.assertEqual(cost, expected_cost)
+
 # This block runs the tests when the script is executed
 if __name__ == '__main__':
     print("Running HDB Parking Cost Tests...")
@@ -0,0 +1,66 @@
+import json
+import unittest
+from datetime import datetime
+from availability import AvailabilitySnapshot
+from carpark_store import CarparkStore
+from carpark_filters import build_filter_mask, parse_free_parking_window
+
+class TestCarparkFilters(unittest.TestCase):
+
+    def setUp(self):
+        with open('combined_carpark_data.json', 'r') as f:
+            self.combined_data = json.load(f)
+        self.store = CarparkStore.from_dict(self.combined_data)
+
+    def matching(self, mask):
+        return set(self.store.ids[mask].tolist())
+
+    def test_no_filters(self):
+        self.assertIsNone(build_filter_mask(self.store))
+
+    def test_parse_free_parking_window(self):
+        self.assertEqual(parse_free_parking_window('SUN & PH FR 7AM-10.30PM'), (7 * 3600, 22 * 3600 + 30 * 60))
+        self.assertEqual(parse_free_parking_window('SUN & PH FR 1PM-10.30PM'), (13 * 3600, 22 * 3600 + 30 * 60))
+        self.assertIsNone(parse_free_parking_window('NO'))
+
+    def test_gantry_height(self):
+        matching = self.matching(build_filter_mask(self.store, min_gantry_height=1.8))
+        self.assertIn("ACB", matching) # 1.8 m gantry
+        self.assertNotIn("A0004", matching) # URA: height unknown
+        matching = self.matching(build_filter_mask(self.store, min_gantry_height=2.0))
+        self.assertNotIn("ACB", matching)
+        for carpark_number in matching:
+            gantry_height = self.combined_data[carpark_number]['gantry_height']
+            self.assertTrue(gantry_height == 0 or gantry_height >= 2.0)
+
+    def test_min_available_uses_snapshot(self):
+        snapshot = AvailabilitySnapshot(1, {"ACB": (100, 5), "HG16": (10, 'N/A'), "BBB": (20, 0)}, {}, 0)
+        self.assertEqual(self.matching(build_filter_mask(self.store, snapshot, min_available=1)), {"ACB"})
+        self.assertEqual(self.matching(build_filter_mask(self.store, snapshot, min_available=6)), set())
+
+    def test_night_parking(self):
+        matching = self.matching(build_filter_mask(self.store, night_parking=True))
+        for carpark_number, carpark in self.combined_data.items():
+            if carpark['type'] == 'HDB':
+                self.assertEqual(carpark_number in matching, carpark['night_parking'] == 'YES')
+
+    def test_free_now(self):
+        # HDB free parking applies on Sundays (and public holidays) within the window only
+        sunday_noon = self.matching(build_filter_mask(self.store, free_at=datetime(2025, 7, 6, 12, 0)))
+        monday_noon = self.matching(build_filter_mask(self.store, free_at=datetime(2025, 7, 7, 12, 0)))
+        christmas_noon = self.matching(build_filter_mask(self.store, free_at=datetime(2025, 12, 25, 12, 0)))
+        self.assertIn("ACM", sunday_noon) # SUN & PH FR 7AM-10.30PM
+        self.assertIn("ACM", christmas_noon)
+        self.assertNotIn("ACM", monday_noon)
+        self.assertNotIn("ACB", sunday_noon) # no free parking
+        # A0004 is free 07:00-08:30 on weekdays and charged from 08:30
+        self.assertIn("A0004", self.matching(build_filter_mask(self.store, free_at=datetime(2025, 7, 7, 8, 0))))
+        self.assertNotIn("A0004", monday_noon)
+
+    def test_filters_combine(self):
+        snapshot = AvailabilitySnapshot(1, {"ACB": (100, 5), "ACM": (100, 5)}, {}, 0)
+        mask = build_filter_mask(self.store, snapshot, min_available=1, min_gantry_height=2.0)
+        self.assertEqual(self.matching(mask), {"ACM"})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+from carpark_store import CarparkStore
+from carpark_snapshot import write_snapshot, load_snapshot
+
+class TestCarparkSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        with open('combined_carpark_data.json', 'r') as f:
+            self.combined_data = json.load(f)
+        self.store = CarparkStore.from_dict(self.combined_data)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.snapshot_file = os.path.join(self.tmp.name, 'carpark_snapshot.bin')
+        write_snapshot(self.store, self.snapshot_file)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip_records(self):
+        loaded = load_snapshot(self.snapshot_file)
+        self.assertEqual(len(loaded), len(self.combined_data))
+        for row, carpark_number in enumerate(self.combined_data):
+            self.assertEqual(loaded.record(row), self.combined_data[carpark_number])
+
+    def test_round_trip_search(self):
+        loaded = load_snapshot(self.snapshot_file)
+        for lat, lng in [(1.3010, 103.8541), (1.4491, 103.8200)]:
+            expected_distances, expected_rows = self.store.nearest(lat, lng, 10)
+            distances, rows = loaded.nearest(lat, lng, 10)
+            np.testing.assert_array_equal(rows, expected_rows)
+            np.testing.assert_allclose(distances, expected_distances)
+
+    def test_columns_are_memory_mapped(self):
+        loaded = load_snapshot(self.snapshot_file)
+        self.assertFalse(loaded.lat.flags.writeable)
+        self.assertFalse(loaded.lat.flags.owndata)
+
+    def test_rejects_other_files(self):
+        other_file = os.path.join(self.tmp.name, 'other.bin')
+        with open(other_file, 'wb') as f:
+            f.write(b'{"not": "a snapshot"}')
+        with self.assertRaises(ValueError):
+            load_snapshot(other_file)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from geocode_cache import GeocodeCache, normalize_query
+
+class TestGeocodeCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.calls = []
+
+    async def fetcher(self, search_query):
+        self.calls.append(search_query)
+        await asyncio.sleep(0.01)
+        if search_query == "nowhere":
+            raise LookupError("not found")
+        return 1.3, 103.8
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query("  Bishan   MRT "), "bishan mrt")
+        self.assertEqual(normalize_query("Bishan MRT"), normalize_query("BISHAN mrt"))
+
+    async def test_repeated_queries_hit_cache(self):
+        cache = GeocodeCache()
+        self.assertEqual(await cache.get_or_fetch("Bishan MRT", self.fetcher), (1.3, 103.8))
+        self.assertEqual(await cache.get_or_fetch("bishan  mrt", self.fetcher), (1.3, 103.8))
+        self.assertEqual(len(self.calls), 1)
+
+    async def test_concurrent_queries_share_one_fetch(self):
+        cache = GeocodeCache()
+        results = await asyncio.gather(*[cache.get_or_fetch("560123", self.fetcher) for _ in range(20)])
+        self.assertEqual(set(results), {(1.3, 103.8)})
+        self.assertEqual(len(self.calls), 1)
+
+    async def test_failures_are_shared_and_not_cached(self):
+        cache = GeocodeCache()
+        results = await asyncio.gather(*[cache.get_or_fetch("nowhere", self.fetcher) for _ in range(3)], return_exceptions=True)
+        self.assertTrue(all(isinstance(r, LookupError) for r in results))
+        self.assertEqual(len(self.calls), 1)
+        with self.assertRaises(LookupError):
+            await cache.get_or_fetch("nowhere", self.fetcher)
+        self.assertEqual(len(self.calls), 2)
+
+    async def test_lru_eviction_and_ttl(self):
+        cache = GeocodeCache(max_entries=2)
+        cache.put("a", 1.0, 1.0)
+        cache.put("b", 2.0, 2.0)
+        cache.get("a")
+        cache.put("c", 3.0, 3.0)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), (1.0, 1.0))
+        cache.put("d", 4.0, 4.0, expires_at=1)
+        self.assertIsNone(cache.get("d"))
+
+    async def test_sqlite_backing_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "geocode.db")
+            cache = GeocodeCache(db_path=db_path)
+            await cache.get_or_fetch("Bishan MRT", self.fetcher)
+            cache.close()
+
+            restarted = GeocodeCache(db_path=db_path)
+            self.assertEqual(await restarted.get_or_fetch("Bishan MRT", self.fetcher), (1.3, 103.8))
+            self.assertEqual(len(self.calls), 1)
+            restarted.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+from unittest import mock
+import httpx
+import http_client
+
+URL = "https://api.example.com/feed"
+
+class TestFetch(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.requests = []
+        self.responses = []
+        self.backoffs = []
+        http_client._host_semaphores.clear() # Semaphores bind to the event loop of each test
+
+        def handler(request):
+            self.requests.append(request)
+            response = self.responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return httpx.Response(response, request=request)
+
+        def backoff_delay(attempt):
+            self.backoffs.append(attempt)
+            return 0
+
+        http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        patcher = mock.patch("http_client._backoff_delay", side_effect=backoff_delay)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self):
+        await http_client.close_http_client()
+        http_client._host_semaphores.clear()
+
+    async def test_retries_server_errors(self):
+        self.responses = [503, 200]
+        response = await http_client.fetch("GET", URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(self.backoffs, [0])
+
+    async def test_gives_up_after_max_retries(self):
+        self.responses = [502] * (http_client.MAX_RETRIES + 1)
+        with self.assertRaises(httpx.HTTPStatusError) as raised:
+            await http_client.fetch("GET", URL)
+        self.assertEqual(raised.exception.response.status_code, 502)
+        self.assertEqual(len(self.requests), http_client.MAX_RETRIES + 1)
+        self.assertEqual(self.backoffs, list(range(http_client.MAX_RETRIES)))
+
+    async def test_client_errors_are_not_retried(self):
+        self.responses = [404]
+        with self.assertRaises(httpx.HTTPStatusError):
+            await http_client.fetch("GET", URL)
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.backoffs, [])
+
+    async def test_not_modified_is_returned(self):
+        self.responses = [304]
+        response = await http_client.fetch("GET", URL, headers={"If-None-Match": '"v1"'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.requests[0].headers["if-none-match"], '"v1"')
+        self.assertEqual(len(self.requests), 1)
+
+    async def test_retries_transport_errors(self):
+        self.responses = [httpx.ConnectError("connection refused"), httpx.ReadTimeout("timed out"), 200]
+        response = await http_client.fetch("POST", URL, json={"a": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.requests), 3)
+
+        self.responses = [httpx.ConnectError("connection refused")] * (http_client.MAX_RETRIES + 1)
+        with self.assertRaises(httpx.ConnectError):
+            await http_client.fetch("GET", URL)
+
+    async def test_requests_per_host_are_capped(self):
+        in_flight, peak = 0, 0
+
+        async def handler(request):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return httpx.Response(200, request=request)
+
+        await http_client.close_http_client()
+        http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with mock.patch("http_client.PER_HOST_CONCURRENCY", 2):
+            await asyncio.gather(*(http_client.fetch("GET", URL) for _ in range(6)),
+                                 *(http_client.fetch("GET", "https://other.example.com/") for _ in range(6)))
+        self.assertEqual(peak, 4) # Two per host
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,395 @@
+import asyncio
+import base64
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+import numpy as np
+import main
+import calc_rates
+from datetime import datetime
+from carpark_store import CarparkStore
+from geocode_cache import GeocodeCache
+
+ALBERT_CENTRE = (1.30101, 103.85412)
+
+def forge_cursor(distance, carpark_number) -> str:
+    return base64.urlsafe_b64encode(json.dumps([distance, carpark_number]).encode()).decode().rstrip('=')
+
+class APITestCase(unittest.TestCase):
+    """Runs the endpoints against the bundled catalogue, with OneMap stubbed and no background tasks."""
+
+    @classmethod
+    def setUpClass(cls):
+        with open('combined_carpark_data.json', 'r') as f:
+            cls.store = CarparkStore.from_dict(json.load(f))
+
+    def setUp(self):
+        self.geocoded = []
+        self.locations = {'albert centre': ALBERT_CENTRE, 'kent ridge': (1.2966, 103.7764), 'abc': (1.3521, 103.8198)}
+
+        async def geocode_onemap(search_query):
+            self.geocoded.append(search_query)
+            coordinates = self.locations.get(search_query.strip().lower())
+            if coordinates is None:
+                raise HTTPException(status_code=404, detail="Location not found.")
+            return coordinates
+
+        self.saved = (main.carpark_store, main.postcode_gazetteer, main.geocode_cache, main.geocode_onemap)
+        main.carpark_store, main.postcode_gazetteer = self.store, None
+        main.geocode_cache = GeocodeCache()
+        main.geocode_onemap = geocode_onemap
+        main.response_cache.clear()
+        self.client = TestClient(main.app) # Not entered, so the startup pollers never run
+
+    def tearDown(self):
+        main.carpark_store, main.postcode_gazetteer, main.geocode_cache, main.geocode_onemap = self.saved
+        main.response_cache.clear()
+
+class TestFindCarpark(APITestCase):
+
+    def test_rejects_forged_cursors(self):
+        for distance in ("nan", "inf", 1e400, -5):
+            response = self.client.get("/find-carpark", params={"search_query": "Albert Centre", "cursor": forge_cursor(distance, "ACB")})
+            self.assertEqual(response.status_code, 400, distance)
+            self.assertEqual(response.json()["detail"], "Invalid or expired cursor.")
+
+    def test_rejects_unpriceable_intervals(self):
+        for start, end in (("0001-01-01T00:10:00", "0001-01-03T10:00:00"),
+                           ("9999-12-30T00:00:00", "9999-12-31T23:00:00"),
+                           ("0001-01-01T00:10:00+09:00", "2025-07-07T10:00:00"),
+                           ("2025-07-07T08:00:00", "2025-09-07T08:00:00")):
+            response = self.client.get("/find-carpark", params={"search_query": "Albert Centre", "sort": "cost", "start": start, "end": end})
+            self.assertEqual(response.status_code, 400, (start, end))
+            response = self.client.post("/cost/batch", json={"carpark_numbers": ["ACB"], "start": start, "end": end})
+            self.assertEqual(response.status_code, 400, (start, end))
+        # A month-long stay is still priced
+        response = self.client.post("/cost/batch", json={"carpark_numbers": ["ACB"], "start": "2025-07-01T08:00:00", "end": "2025-07-31T08:00:00"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_max_radius_limits_every_sort(self):
+        for params in ({"sort": "distance"}, {"sort": "cost", "start": "2025-07-07T08:00", "end": "2025-07-07T10:00"}):
+            response = self.client.get("/find-carpark", params={"search_query": "Albert Centre", "max_radius": 300, "limit": 50, **params})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.json())
+            self.assertTrue(all(carpark['distance'] <= 300 for carpark in response.json()))
+        # Without max_radius, cost ranking shortlists the default radius
+        response = self.client.get("/find-carpark", params={"search_query": "Albert Centre", "sort": "cost", "limit": 50,
+                                                             "start": "2025-07-07T08:00", "end": "2025-07-07T10:00"})
+        distances = [carpark['distance'] for carpark in response.json()]
+        self.assertTrue(max(distances) > 300 and max(distances) <= main.DEFAULT_SEARCH_RADIUS_METERS)
+
+class TestSortedSearch(APITestCase):
+    START, END = "2025-07-05T18:00:00", "2025-07-05T23:30:00" # Saturday evening: some carparks are free
+
+    def search(self, **params):
+        return self.client.get("/find-carpark", params={"search_query": "Albert Centre", **params})
+
+    def shortlist(self):
+        """(carpark_number, distance, cost) of every carpark within the default radius, as priced by calc_cost."""
+        lat, lng = main.quantize_location(*ALBERT_CENTRE, main.RESPONSE_CACHE_PRECISION)
+        distances, rows = self.store.within_radius(lat, lng, main.DEFAULT_SEARCH_RADIUS_METERS)
+        start, end = datetime.fromisoformat(self.START), datetime.fromisoformat(self.END)
+        return [(str(self.store.ids[row]), distance, calc_rates.calc_cost(self.store.record(row), start, end))
+                for distance, row in zip(distances.tolist(), rows.tolist())]
+
+    def test_sort_by_cost(self):
+        response = self.search(sort="cost", start=self.START, end=self.END, limit=20)
+        self.assertEqual(response.status_code, 200)
+        expected = sorted(self.shortlist(), key=lambda carpark: (carpark[2], carpark[1]))[:20]
+        self.assertEqual([(carpark['carpark_number'], carpark['cost']) for carpark in response.json()],
+                         [(carpark_number, cost) for carpark_number, _, cost in expected])
+        self.assertEqual(response.json()[0]['cost'], 0.0)
+        self.assertNotIn('X-Next-Cursor', response.headers)
+
+    def test_sort_by_score(self):
+        response = self.search(sort="score", start=self.START, end=self.END, limit=20)
+        self.assertEqual(response.status_code, 200)
+        shortlist = self.shortlist()
+        max_cost = max(cost for _, _, cost in shortlist)
+        # No live availability in these tests, so every carpark has the neutral occupancy of 0.5
+        scores = {carpark_number: round(main.SCORE_WEIGHTS['distance'] * distance / main.DEFAULT_SEARCH_RADIUS_METERS
+                                        + main.SCORE_WEIGHTS['cost'] * cost / max_cost
+                                        + main.SCORE_WEIGHTS['availability'] * 0.5, 4)
+                  for carpark_number, distance, cost in shortlist}
+        expected = sorted(shortlist, key=lambda carpark: (scores[carpark[0]], carpark[1]))[:20]
+        self.assertEqual([(carpark['carpark_number'], carpark['score']) for carpark in response.json()],
+                         [(carpark_number, scores[carpark_number]) for carpark_number, _, _ in expected])
+
+    def test_score_prefers_free_lots(self):
+        carparks = [{'distance': 100.0, 'cost': 2.0, 'total_lots': 100, 'available_lots': 90},
+                    {'distance': 100.0, 'cost': 2.0, 'total_lots': 100, 'available_lots': 5},
+                    {'distance': 100.0, 'cost': 2.0, 'total_lots': 'N/A', 'available_lots': 'N/A'}]
+        ranked = main.rank_carparks([dict(carpark) for carpark in carparks], 'score', 1000)
+        self.assertEqual([carpark['available_lots'] for carpark in ranked], [90, 'N/A', 5])
+
+    def test_interval_errors(self):
+        cases = [({"start": self.START}, "start and end must be given together."),
+                 ({"end": self.END}, "start and end must be given together."),
+                 ({"sort": "cost"}, "sort=cost needs start and end."),
+                 ({"sort": "score"}, "sort=score needs start and end."),
+                 ({"sort": "cost", "start": self.END, "end": self.START}, "end must be after start."),
+                 ({"sort": "score", "start": self.START, "end": self.END, "cursor": forge_cursor(10.0, "ACB")},
+                  "cursor is only supported with sort=distance.")]
+        for params, detail in cases:
+            response = self.search(**params)
+            self.assertEqual((response.status_code, response.json()["detail"]), (400, detail), params)
+
+class TestNearby(APITestCase):
+
+    def nearby(self, **params):
+        return self.client.get("/nearby", params={"lat": ALBERT_CENTRE[0], "lng": ALBERT_CENTRE[1], **params})
+
+    def within(self, radius):
+        # Searches run from the point rounded to its response cache cell
+        distances, rows = self.store.within_radius(*main.quantize_location(*ALBERT_CENTRE, main.RESPONSE_CACHE_PRECISION), radius)
+        return distances, [str(carpark_number) for carpark_number in self.store.ids[rows]]
+
+    def test_radius_cut(self):
+        response = self.nearby(radius=300, limit=50)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([carpark['carpark_number'] for carpark in response.json()], self.within(300)[1])
+        self.assertNotIn('X-Next-Cursor', response.headers) # fewer than limit: nothing after it
+
+    def test_radius_is_honoured(self):
+        default = self.nearby(limit=50).json()
+        response = self.nearby(radius=100, limit=50)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([carpark['carpark_number'] for carpark in response.json()], self.within(100)[1])
+        self.assertTrue(max(carpark['distance'] for carpark in default) > 100)
+
+    def test_nothing_within_radius(self):
+        response = self.client.get("/nearby", params={"lat": 1.5, "lng": 104.2, "radius": 100})
+        self.assertEqual(response.status_code, 404)
+
+    def test_far_away_points_are_turned_away(self):
+        for lat, lng in ((40.0, -3.0), (-89.0, 179.0), (1.3, 104.5)):
+            response = self.client.get("/nearby", params={"lat": lat, "lng": lng, "radius": 20000})
+            self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(main.response_cache), 0)
+
+    def test_pages_follow_cursor_until_empty(self):
+        expected = self.within(500)[1]
+        seen, cursor = [], None
+        while True:
+            params = {"radius": 500, "limit": 4}
+            if cursor:
+                params["cursor"] = cursor
+            response = self.nearby(**params)
+            self.assertEqual(response.status_code, 200)
+            page = [carpark['carpark_number'] for carpark in response.json()]
+            seen.extend(page)
+            cursor = response.headers.get('X-Next-Cursor')
+            if not cursor:
+                break
+            self.assertEqual(len(page), 4)
+        self.assertEqual(seen, expected)
+
+    def test_cursor_past_the_radius_gives_empty_page(self):
+        distances, carpark_numbers = self.within(300)
+        response = self.nearby(radius=300, cursor=forge_cursor(float(distances[-1]), carpark_numbers[-1]))
+        self.assertEqual((response.status_code, response.json()), (200, []))
+        self.assertNotIn('X-Next-Cursor', response.headers)
+
+class TestResponseCaching(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        snapshot = main.availability_store.snapshot
+        self.addCleanup(setattr, main.availability_store, '_snapshot', snapshot)
+
+    def search(self, headers=None):
+        return self.client.get("/find-carpark", params={"search_query": "Albert Centre", "limit": 5}, headers=headers)
+
+    def test_repeat_requests_are_served_from_the_cache(self):
+        with mock.patch('main.carpark_results', wraps=main.carpark_results) as carpark_results:
+            first, second = self.search(), self.search()
+        self.assertEqual(carpark_results.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first.headers['ETag'], second.headers['ETag'])
+        self.assertEqual(first.headers['Cache-Control'], f'public, max-age={main.RESPONSE_MAX_AGE}')
+        self.assertEqual(len(main.response_cache), 1)
+
+    def test_matching_if_none_match_gets_304(self):
+        etag = self.search().headers['ETag']
+        for if_none_match in (etag, f'"other", {etag}', '*'):
+            response = self.search({'If-None-Match': if_none_match})
+            self.assertEqual(response.status_code, 304, if_none_match)
+            self.assertEqual(response.content, b'')
+            self.assertEqual(response.headers['ETag'], etag)
+            self.assertIn('Cache-Control', response.headers)
+        response = self.search({'If-None-Match': '"stale"'})
+        self.assertEqual((response.status_code, response.headers['ETag']), (200, etag))
+
+    def test_new_availability_version_gets_a_fresh_entry(self):
+        first = self.search()
+        carpark_number = first.json()[0]['carpark_number']
+        current = main.availability_store.snapshot
+        # Swapped in without publishing, so only the version in the cache key tells the entries apart
+        main.availability_store._snapshot = current.with_changes({carpark_number: (500, 123)}, 0.0)
+        second = self.search({'If-None-Match': first.headers['ETag']})
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second.headers['ETag'], first.headers['ETag'])
+        self.assertEqual(second.json()[0]['available_lots'], 123)
+        self.assertEqual(len(main.response_cache), 2)
+        # Publishing a snapshot drops every cached response
+        main.availability_store.publish(main.availability_store.snapshot.with_changes({carpark_number: (500, 7)}, 0.0))
+        self.assertEqual(len(main.response_cache), 0)
+        self.assertEqual(self.search().json()[0]['available_lots'], 7)
+
+class TestFindCarparkBatch(APITestCase):
+
+    def batch(self, locations, limit=3):
+        return self.client.post("/find-carpark/batch", json={"locations": locations, "limit": limit})
+
+    def expected_carparks(self, lat, lng, limit=3):
+        distances, rows = self.store.nearest_many(np.array([lat]), np.array([lng]), limit)
+        return json.loads(self.store.encode_results(main.carpark_results(distances[0], rows[0], main.availability_store.snapshot)))
+
+    def test_normalized_queries_are_geocoded_once(self):
+        response = self.batch([{"search_query": "abc"}, {"search_query": "ABC "}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.geocoded), 1)
+        first, second = response.json()
+        self.assertEqual((first['lat'], first['lng']), (1.3521, 103.8198))
+        self.assertEqual(first['carparks'], second['carparks'])
+        self.assertEqual(second['search_query'], "ABC ")
+
+    def test_mixed_coordinates_queries_and_errors(self):
+        response = self.batch([
+            {"lat": ALBERT_CENTRE[0], "lng": ALBERT_CENTRE[1]},
+            {"search_query": "Nowhere"},
+            {"search_query": "Kent Ridge"},
+        ])
+        self.assertEqual(response.status_code, 200)
+        by_coordinates, failed, by_query = response.json()
+        self.assertEqual(sorted(self.geocoded), ["Kent Ridge", "Nowhere"]) # coordinates skip geocoding
+        self.assertEqual(failed, {"search_query": "Nowhere", "error": "Location not found."})
+        # The spliced response parses to the same carparks as encode_results
+        self.assertEqual(by_coordinates, {"search_query": None, "lat": ALBERT_CENTRE[0], "lng": ALBERT_CENTRE[1],
+                                          "carparks": self.expected_carparks(*ALBERT_CENTRE)})
+        self.assertEqual(by_query['carparks'], self.expected_carparks(1.2966, 103.7764))
+
+    def test_invalid_locations(self):
+        self.assertEqual(self.batch([{"lat": 1.3}]).status_code, 422)
+        self.assertEqual(self.batch([]).status_code, 422)
+        self.assertEqual(self.batch([{"search_query": ""}]).status_code, 422)
+
+class TestCostBatch(APITestCase):
+
+    def cost_batch(self, carpark_numbers, start="2025-07-07T08:00:00", end="2025-07-07T10:30:00"):
+        return self.client.post("/cost/batch", json={"carpark_numbers": carpark_numbers, "start": start, "end": end})
+
+    def test_costs_match_calc_cost(self):
+        carpark_numbers = ["ACB", "HG16", "A0004", "BE3"]
+        for start, end in (("2025-07-07T08:00:00", "2025-07-07T10:30:00"), ("2025-07-05T22:00:00", "2025-07-08T07:15:00")):
+            response = self.cost_batch(carpark_numbers, start, end)
+            self.assertEqual(response.status_code, 200)
+            expected = {carpark_number: calc_rates.calc_cost(self.store.record(self.store.row_of[carpark_number]),
+                                                             datetime.fromisoformat(start), datetime.fromisoformat(end))
+                        for carpark_number in carpark_numbers}
+            self.assertEqual(response.json()["costs"], expected)
+
+    def test_unknown_and_duplicate_numbers(self):
+        response = self.cost_batch(["ACB", "NOPE", "ACB", "A0004", "NOPE", "ZZZ"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()["costs"]), ["ACB", "A0004"])
+        self.assertEqual(response.json()["not_found"], ["NOPE", "ZZZ"])
+
+    def test_timezone_aware_times_are_converted_to_sgt(self):
+        response = self.cost_batch(["ACB"], "2025-07-07T00:00:00Z", "2025-07-07T02:30:00Z")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()["start"], response.json()["end"]), ("2025-07-07T08:00:00", "2025-07-07T10:30:00"))
+        self.assertEqual(response.json()["costs"], self.cost_batch(["ACB"]).json()["costs"])
+
+    def test_end_must_be_after_start(self):
+        for end in ("2025-07-07T08:00:00", "2025-07-07T07:00:00"):
+            response = self.cost_batch(["ACB"], "2025-07-07T08:00:00", end)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()["detail"], "end must be after start.")
+
+class TestStaticDataReload(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        with open('combined_carpark_data.json', 'r') as f:
+            combined_data = json.load(f)
+        # Every URA carpark plus a few HDB ones keeps the files small
+        self.data = {carpark_number: carpark_info for i, (carpark_number, carpark_info) in enumerate(combined_data.items())
+                     if carpark_info['type'] == 'URA' or i < 20}
+        self.saved_static = (main.STATIC_SNAPSHOT_FILE, main.STATIC_DATA_FILE, main.static_data_signature, main.ADMIN_TOKEN)
+        main.STATIC_SNAPSHOT_FILE = os.path.join(self.tmp.name, 'carpark_snapshot.bin') # never written
+        main.STATIC_DATA_FILE = os.path.join(self.tmp.name, 'combined_carpark_data.json')
+        self.write_data(self.data)
+        main.load_static_data(main.STATIC_SNAPSHOT_FILE, main.STATIC_DATA_FILE)
+        main.ADMIN_TOKEN = 'secret'
+
+    def tearDown(self):
+        main.STATIC_SNAPSHOT_FILE, main.STATIC_DATA_FILE, main.static_data_signature, main.ADMIN_TOKEN = self.saved_static
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def write_data(self, data):
+        with open(main.STATIC_DATA_FILE, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+    def reload(self, **headers):
+        return self.client.post("/admin/reload", headers=headers)
+
+    def test_admin_auth(self):
+        main.ADMIN_TOKEN = None
+        self.assertEqual(self.reload(**{'X-Admin-Token': 'secret'}).status_code, 403)
+        main.ADMIN_TOKEN = 'secret'
+        self.assertEqual(self.reload().status_code, 401)
+        self.assertEqual(self.reload(**{'X-Admin-Token': 'wrong'}).status_code, 401)
+        self.assertEqual(self.reload(**{'X-Admin-Token': 'é'.encode('utf-8')}).status_code, 401)
+        self.assertEqual(self.reload(**{'X-Admin-Token': 'secret'}).json(), {'reloaded': False, 'carparks': len(self.data)})
+
+    def test_swaps_in_changed_data(self):
+        old_store, version = main.carpark_store, main.availability_store.version
+        main.response_cache.put('cached', main.CachedResponse(b'[]'))
+        removed = next(iter(self.data))
+        del self.data[removed]
+        self.write_data(self.data)
+        self.assertEqual(self.reload(**{'X-Admin-Token': 'secret'}).json(), {'reloaded': True, 'carparks': len(self.data)})
+        self.assertIsNot(main.carpark_store, old_store)
+        self.assertNotIn(removed, main.carpark_store.row_of)
+        self.assertEqual(len(main.response_cache), 0)
+        self.assertEqual(main.availability_store.version, version)
+        # Unchanged files are not reloaded again unless forced
+        self.assertFalse(asyncio.run(main.reload_static_data()))
+        self.assertTrue(asyncio.run(main.reload_static_data(force=True)))
+
+    def test_empty_rebuild_is_rejected(self):
+        old_store = main.carpark_store
+        self.write_data({})
+        self.assertFalse(asyncio.run(main.reload_static_data()))
+        self.assertIs(main.carpark_store, old_store)
+
+    def test_old_tariffs_are_released(self):
+        asyncio.run(main.reload_static_data(force=True))
+        ura_tariff_ids = {calc_rates.ura_tariff_id(rates) for rates in main.carpark_store.rates if rates is not None}
+        self.write_data({carpark_number: carpark_info for carpark_number, carpark_info in self.data.items() if carpark_info['type'] == 'HDB'})
+        self.assertTrue(asyncio.run(main.reload_static_data()))
+        self.assertFalse(ura_tariff_ids & set(calc_rates.ura_tariffs))
+
+    def test_watcher_picks_up_rebuilds(self):
+        async def watch():
+            watcher = asyncio.create_task(main.watch_static_data(0.01))
+            await asyncio.sleep(0.05)
+            self.write_data(dict(list(self.data.items())[:10]))
+            for _ in range(200):
+                await asyncio.sleep(0.01)
+                if len(main.carpark_store) == 10:
+                    break
+            watcher.cancel()
+
+        asyncio.run(watch())
+        self.assertEqual(len(main.carpark_store), 10)
+
+if __name__ == '__main__':
+    unittest.main()
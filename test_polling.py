@@ -0,0 +1,134 @@
+import unittest
+from datetime import datetime, timedelta
+import httpx
+import startup
+from availability import AvailabilityStore
+from polling import AdaptivePoller, PROBE_FRACTION
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestAdaptivePoller(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.poller = AdaptivePoller("test feed", interval=60, min_interval=15, max_interval=300, max_backoff=600, clock=self.clock)
+
+    def test_unchanged_marker_is_not_new(self):
+        self.assertTrue(self.poller.is_new("a"))
+        self.assertFalse(self.poller.is_new("a"))
+        self.assertFalse(self.poller.is_new(None))
+        self.assertTrue(self.poller.is_new("b"))
+
+    def test_period_follows_upstream_timestamps(self):
+        start = datetime(2025, 7, 7, 8, 0)
+        for minute in range(20):
+            upstream_time = start + timedelta(minutes=2 * minute)
+            self.poller.is_new(upstream_time.isoformat(), upstream_time)
+        self.assertAlmostEqual(self.poller.period, 120, delta=1)
+        self.poller.record_poll(True)
+        self.assertAlmostEqual(self.poller.next_delay(), 120 * PROBE_FRACTION, delta=1)
+
+    def test_period_from_observed_changes_without_timestamps(self):
+        for i in range(20):
+            self.clock.now = 30.0 * i
+            self.poller.is_new(i)
+        self.assertAlmostEqual(self.poller.period, 30, delta=1)
+
+    def test_quiet_feed_is_polled_less_often(self):
+        self.poller.is_new("a")
+        delays = []
+        for _ in range(7):
+            self.poller.record_poll(False)
+            delays.append(self.poller.next_delay())
+        self.assertEqual(delays, [15, 30, 60, 120, 240, 300, 300])
+        self.poller.record_poll(True)
+        self.assertEqual(self.poller.next_delay(), 60 * PROBE_FRACTION)
+
+    def simulate(self, cadence_at, until):
+        """Polls a simulated feed that publishes every cadence_at(t) seconds; returns the poll times."""
+        start, published, polls = datetime(2025, 7, 7, 8, 0), 0.0, []
+        while self.clock.now < until:
+            while published + cadence_at(published) <= self.clock.now:
+                published += cadence_at(published)
+            upstream_time = start + timedelta(seconds=published)
+            self.poller.record_poll(self.poller.is_new(upstream_time.isoformat(), upstream_time))
+            polls.append(self.clock.now)
+            self.clock.now += self.poller.next_delay()
+        return polls
+
+    def test_period_shrinks_when_upstream_speeds_up(self):
+        self.simulate(lambda t: 60, until=1800)
+        self.assertAlmostEqual(self.poller.period, 60, delta=5)
+        polls = self.simulate(lambda t: 60 if t < 1800 else 30, until=3600)
+        self.assertAlmostEqual(self.poller.period, 30, delta=3)
+        # Polls keep up with the faster feed
+        late_polls = [t for t in polls if t >= 3000]
+        self.assertGreaterEqual(len(late_polls), 600 / 30)
+
+    def test_errors_back_off_exponentially(self):
+        limits = []
+        for _ in range(6):
+            self.poller.record_failure(RuntimeError("upstream down"))
+            delay = self.poller.next_delay()
+            limits.append(min(600, 60 * 2 ** (self.poller.failures - 1)))
+            self.assertLessEqual(delay, limits[-1])
+            self.assertGreaterEqual(delay, limits[-1] / 2)
+        self.assertEqual(limits[-1], 600)
+        self.poller.record_poll(False)
+        self.assertEqual(self.poller.failures, 0)
+
+    def test_conditional_headers(self):
+        self.assertEqual(self.poller.conditional_headers(), {})
+        self.poller.remember_validators(httpx.Response(200, headers={'ETag': '"v1"', 'Last-Modified': 'Mon, 07 Jul 2025 08:00:00 GMT'}))
+        self.assertEqual(self.poller.conditional_headers(), {'If-None-Match': '"v1"', 'If-Modified-Since': 'Mon, 07 Jul 2025 08:00:00 GMT'})
+
+class TestRealtimeAvailabilityPoll(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.payload = {'items': [{'carpark_data': [
+            {'carpark_number': 'ACB', 'update_datetime': '2025-07-07T08:00:27', 'carpark_info': [{'total_lots': '100', 'lots_available': '40'}]},
+        ]}]}
+        self.saved_fetch = startup.fetch
+
+        async def fetch(method, url, headers=None, **kwargs):
+            return httpx.Response(200, json=self.payload)
+
+        startup.fetch = fetch
+        self.store = AvailabilityStore()
+        self.poller = AdaptivePoller("test feed", interval=60, min_interval=15, max_interval=300)
+
+    async def asyncTearDown(self):
+        startup.fetch = self.saved_fetch
+
+    async def poll(self):
+        return await startup.poll_realtime_availability(self.store, self.poller)
+
+    async def test_unchanged_update_time_is_skipped(self):
+        self.assertTrue(await self.poll())
+        self.assertFalse(await self.poll())
+        self.assertEqual(self.store.version, 1)
+
+    async def test_failed_payload_is_retried(self):
+        self.payload['items'][0]['carpark_data'][0]['carpark_info'] = []
+        with self.assertRaises(IndexError):
+            await self.poll()
+        self.payload['items'][0]['carpark_data'][0]['carpark_info'] = [{'total_lots': '100', 'lots_available': '40'}]
+        self.assertTrue(await self.poll())
+        self.assertEqual(dict(self.store.snapshot.lots), {'ACB': (100, 40)})
+
+    async def test_payload_without_update_time_uses_content(self):
+        del self.payload['items'][0]['carpark_data'][0]['update_datetime']
+        self.assertTrue(await self.poll())
+        self.assertFalse(await self.poll())
+        self.payload['items'][0]['carpark_data'][0]['carpark_info'][0]['lots_available'] = '39'
+        self.assertTrue(await self.poll())
+        self.assertEqual(self.store.snapshot.lots['ACB'], (100, 39))
+
+if __name__ == '__main__':
+    unittest.main()
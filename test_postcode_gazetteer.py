@@ -0,0 +1,115 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import main
+from geocode_cache import GeocodeCache
+from postcode_gazetteer import PostcodeGazetteer, build_gazetteer, parse_postcode
+from prep_postcodes import load_geocode_cache_postcodes, load_postcode_csv
+
+class TestPostcodeGazetteer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp.name, "postcodes.npy")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parse_postcode(self):
+        self.assertEqual(parse_postcode("560123"), 560123)
+        self.assertEqual(parse_postcode("018956"), 18956) # Leading zeros are part of the postcode
+        self.assertEqual(parse_postcode(" 560123\n"), 560123)
+        for query in ("56012", "5601234", "560 123", "S560123", "５６０１２３", "٥٦٠١٢٣", "", "Bishan MRT"):
+            self.assertIsNone(parse_postcode(query), query)
+
+    def test_build_deduplicates_and_sorts(self):
+        entries = [
+            ("560123", 1.0, 103.0),
+            ("018956", 1.28, 103.85),
+            ("560123", 1.37, 103.85), # Last entry wins
+            ("12345", 1.0, 103.0), # Not a postcode
+            ("310456", None, 103.0), # No coordinates
+        ]
+        self.assertEqual(build_gazetteer(entries, self.file_path), 2)
+        gazetteer = PostcodeGazetteer.load(self.file_path)
+        self.assertEqual(gazetteer.postcodes.tolist(), [18956, 560123])
+        self.assertEqual(gazetteer.lookup("560123"), (1.37, 103.85))
+
+    def test_lookup_hits_and_misses(self):
+        build_gazetteer([("018956", 1.28, 103.85), ("560123", 1.37, 103.85), ("820001", 1.40, 103.90)], self.file_path)
+        gazetteer = PostcodeGazetteer.load(self.file_path)
+        self.assertEqual(len(gazetteer), 3)
+        self.assertEqual(gazetteer.lookup(" 018956 "), (1.28, 103.85))
+        self.assertEqual(gazetteer.lookup("820001"), (1.40, 103.90))
+        for query in ("000001", "560124", "999999", "Bishan MRT"):
+            self.assertIsNone(gazetteer.lookup(query), query)
+
+    def test_build_replaces_file_atomically(self):
+        build_gazetteer([("560123", 1.37, 103.85)], self.file_path)
+        with mock.patch("postcode_gazetteer.np.save", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                build_gazetteer([("018956", 1.28, 103.85)], self.file_path)
+        # A failed build leaves the previous table in place
+        self.assertEqual(PostcodeGazetteer.load(self.file_path).lookup("560123"), (1.37, 103.85))
+        build_gazetteer([("018956", 1.28, 103.85)], self.file_path)
+        self.assertEqual(os.listdir(self.tmp.name), ["postcodes.npy"])
+        self.assertIsNone(PostcodeGazetteer.load(self.file_path).lookup("560123"))
+
+    def test_load_rejects_missing_and_bad_files(self):
+        self.assertIsNone(PostcodeGazetteer.load(self.file_path))
+        np.save(self.file_path, np.zeros(3, dtype=[('postcode', '<u4'), ('lat', '<f4'), ('lng', '<f4')]))
+        self.assertIsNone(PostcodeGazetteer.load(self.file_path))
+        with open(self.file_path, "wb") as f:
+            f.write(b"not a numpy file")
+        self.assertIsNone(PostcodeGazetteer.load(self.file_path))
+
+    def test_prep_sources(self):
+        csv_path = os.path.join(self.tmp.name, "postcodes.csv")
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.write("POSTAL,LATITUDE,LONGITUDE\n018956,1.28,103.85\n560123,NIL,103.85\n")
+        self.assertEqual(load_postcode_csv(csv_path), [("018956", 1.28, 103.85)])
+        self.assertEqual(load_postcode_csv(os.path.join(self.tmp.name, "missing.csv")), [])
+
+        db_path = os.path.join(self.tmp.name, "geocode.db")
+        cache = GeocodeCache(db_path=db_path)
+        cache._db_put("560123", 1.37, 103.85, 1e12)
+        cache._db_put("bishan mrt", 1.35, 103.85, 1e12)
+        cache.close()
+        self.assertEqual(load_geocode_cache_postcodes(db_path), [("560123", 1.37, 103.85)])
+
+class TestResolveLocation(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        file_path = os.path.join(self.tmp.name, "postcodes.npy")
+        build_gazetteer([("560123", 1.37, 103.85)], file_path)
+        self.geocoded = []
+
+        async def geocode_onemap(search_query):
+            self.geocoded.append(search_query)
+            return 1.0, 104.0
+
+        self.saved = (main.postcode_gazetteer, main.geocode_cache, main.geocode_onemap)
+        main.postcode_gazetteer = PostcodeGazetteer.load(file_path)
+        main.geocode_cache = GeocodeCache()
+        main.geocode_onemap = geocode_onemap
+
+    def tearDown(self):
+        main.postcode_gazetteer, main.geocode_cache, main.geocode_onemap = self.saved
+        self.tmp.cleanup()
+
+    async def test_gazetteer_is_checked_before_the_geocode_cache(self):
+        main.geocode_cache.put("560123", 9.0, 9.0) # A stale cached answer is not used
+        self.assertEqual(await main.resolve_location("560123"), (1.37, 103.85))
+        self.assertEqual(self.geocoded, [])
+
+    async def test_other_queries_fall_back_to_onemap(self):
+        results = await asyncio.gather(main.resolve_location("560124"), main.resolve_location("Bishan MRT"))
+        self.assertEqual(results, [(1.0, 104.0), (1.0, 104.0)])
+        self.assertEqual(sorted(self.geocoded), ["560124", "Bishan MRT"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+from public_holidays import is_public_holiday, public_holidays_between, refresh_public_holidays
+from calc_rates import calc_cost, calc_cost_many, count_day_types, get_day_type
+
+class TestPublicHolidays(unittest.TestCase):
+
+    def tearDown(self):
+        refresh_public_holidays()
+
+    def test_bundled_calendar(self):
+        self.assertTrue(is_public_holiday(date(2025, 12, 25)))
+        self.assertTrue(is_public_holiday(datetime(2026, 8, 10, 9, 30))) # National Day in lieu
+        self.assertFalse(is_public_holiday(date(2025, 12, 24)))
+        self.assertFalse(is_public_holiday(date(1999, 1, 1))) # year not in the calendar
+        self.assertEqual(public_holidays_between(date(2025, 1, 1), date(2025, 1, 31)),
+                         [date(2025, 1, 1), date(2025, 1, 29), date(2025, 1, 30)])
+
+    def test_holidays_priced_as_sundays(self):
+        self.assertEqual(get_day_type(datetime(2025, 8, 9, 10, 0)), "sunday_ph") # Saturday holiday
+        self.assertEqual(get_day_type(datetime(2025, 12, 25, 10, 0)), "sunday_ph")
+        with open('combined_carpark_data.json', 'r') as f:
+            combined_data = json.load(f)
+        carparks = [combined_data["ACB"], combined_data["A0007"]]
+        christmas = (datetime(2025, 12, 25, 10, 0), datetime(2025, 12, 25, 13, 0))
+        sunday = (datetime(2025, 7, 6, 10, 0), datetime(2025, 7, 6, 13, 0))
+        for carpark in carparks:
+            self.assertEqual(calc_cost(carpark, *christmas), calc_cost(carpark, *sunday))
+        self.assertEqual(calc_cost_many(carparks, *christmas).tolist(), [calc_cost(carpark, *sunday) for carpark in carparks])
+
+    def test_count_day_types_moves_holidays(self):
+        # January 2025: 23 weekdays, 4 Saturdays, 4 Sundays; 3 holidays fall on weekdays
+        self.assertEqual(count_day_types(date(2025, 1, 1), date(2025, 1, 31)),
+                         {"weekday": 20, "saturday": 4, "sunday_ph": 7})
+
+    def test_refresh_from_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file_path = os.path.join(tmp, 'holidays.json')
+            with open(file_path, 'w') as f:
+                json.dump([{"date": "2030-02-04", "holiday": "Test"}], f)
+            self.assertEqual(refresh_public_holidays(file_path), 1)
+            self.assertTrue(is_public_holiday(date(2030, 2, 4)))
+            self.assertFalse(is_public_holiday(date(2025, 12, 25)))
+            # An unreadable file keeps the current calendar
+            refresh_public_holidays(os.path.join(tmp, 'missing.json'))
+            self.assertTrue(is_public_holiday(date(2030, 2, 4)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import asyncio
+import unittest
+from availability import AvailabilityStore
+from json_encoding import dumps
+from response_cache import ResponseCache, CachedResponse, quantize_location, etag_matches
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_entries=2)
+        cache.put('a', CachedResponse(dumps([1])))
+        cache.put('b', CachedResponse(dumps([2])))
+        cache.get('a') # 'b' is now the least recently used
+        cache.put('c', CachedResponse(dumps([3])))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c').body, b'[3]')
+
+    def test_disabled(self):
+        cache = ResponseCache(max_entries=0)
+        entry = cache.put('a', CachedResponse(dumps([1])))
+        self.assertEqual(entry.body, b'[1]')
+        self.assertEqual(len(cache), 0)
+
+    def test_etag(self):
+        entry = CachedResponse(dumps([{'carpark_number': 'ACB'}]), {'X-Next-Cursor': 'abc'})
+        self.assertEqual(entry.etag, CachedResponse(dumps([{'carpark_number': 'ACB'}])).etag)
+        self.assertNotEqual(entry.etag, CachedResponse(dumps([])).etag)
+        self.assertTrue(etag_matches(entry.etag, entry.etag))
+        self.assertTrue(etag_matches(f'"other", W/{entry.etag}', entry.etag))
+        self.assertTrue(etag_matches('*', entry.etag))
+        self.assertFalse(etag_matches('"other"', entry.etag))
+        self.assertFalse(etag_matches(None, entry.etag))
+
+    def test_quantize_location(self):
+        self.assertEqual(quantize_location(1.300012, 103.854149), (1.3, 103.8541))
+        self.assertEqual(quantize_location(1.300012, 103.854149, 2), (1.3, 103.85))
+
+    def test_cleared_on_availability_publish(self):
+        cache = ResponseCache()
+        store = AvailabilityStore()
+        store.add_listener(cache.clear)
+        cache.put('a', CachedResponse(dumps([1])))
+        asyncio.run(store.apply({'ACB': (100, 42)}))
+        self.assertEqual(len(cache), 0)
+        # An unchanged poll publishes nothing, so the cache survives it
+        cache.put('a', CachedResponse(dumps([1])))
+        asyncio.run(store.apply({'ACB': (100, 42)}))
+        self.assertEqual(len(cache), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import math
+import unittest
+import json
+import numpy as np
+from carpark_store import CarparkStore
+from spatial_index import EARTH_RADIUS_M
+
+def get_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Scalar Haversine distance in metres; the brute-force reference for the vectorized search."""
+    R = EARTH_RADIUS_M  # Earth's radius in meters
+
+    # Convert latitudes and longitudes from degrees to radians
+    φ1 = math.radians(lat1)
+    φ2 = math.radians(lat2)
+    Δφ = math.radians(lat2 - lat1)  # Difference in latitudes
+    Δλ = math.radians(lon2 - lon1)  # Difference in longitudes
+
+    # Haversine formula calculation
+    a = math.sin(Δφ / 2) * math.sin(Δφ / 2) + \
+        math.cos(φ1) * math.cos(φ2) * \
+        math.sin(Δλ / 2) * math.sin(Δλ / 2)
+
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    d = R * c  # Distance in meters
+    return d
+
+class TestSpatialIndex(unittest.TestCase):
+    # A few search points around Singapore, plus one far outside the catalogue
+    SEARCH_POINTS = [
+        (1.3010, 103.8541),  # Albert Centre
+        (1.3521, 103.8198),  # Centre of Singapore
+        (1.4491, 103.8200),  # Sembawang
+        (1.2966, 103.7764),  # Kent Ridge
+        (1.5000, 104.2000),  # Off the east coast
+    ]
+
+    def setUp(self):
+        with open('combined_carpark_data.json', 'r') as f:
+            self.combined_data = json.load(f)
+        self.store = CarparkStore.from_dict(self.combined_data)
+
+    def brute_force(self, lat, lng):
+        results = []
+        for carpark_number, carpark_info in self.combined_data.items():
+            cp_lat, cp_lng = carpark_info['coordinates']
+            if cp_lat is None or cp_lng is None:
+                continue
+            results.append((get_distance(lat, lng, cp_lat, cp_lng), carpark_number))
+        results.sort()
+        return results
+
+    def assertMatches(self, result, expected):
+        distances, rows = result
+        self.assertEqual([str(cp) for cp in self.store.ids[rows]], [cp for _, cp in expected])
+        np.testing.assert_allclose(distances, [d for d, _ in expected], atol=1e-6)
+
+    def test_skips_carparks_without_coordinates(self):
+        valid = [cp for cp in self.combined_data.values() if cp['coordinates'][0] is not None]
+        self.assertEqual(self.store.index.size, len(valid))
+
+    def test_record_round_trip(self):
+        for carpark_number in ("ACB", "HG16", "A0004"):
+            row = self.store.row_of[carpark_number]
+            self.assertEqual(self.store.record(row), self.combined_data[carpark_number])
+
+    def test_encoded_results_match_records(self):
+        carparks = []
+        for carpark_number in ("ACB", "HG16", "A0004"):
+            carpark = self.store.summary(self.store.row_of[carpark_number])
+            carpark['available_lots'] = 42
+            carpark['distance'] = 12.5
+            carparks.append(carpark)
+        for carpark_number, encoded in zip(("ACB", "HG16", "A0004"), json.loads(self.store.encode_results(carparks))):
+            expected = dict(self.combined_data[carpark_number], available_lots=42, distance=12.5)
+            self.assertEqual(encoded, expected)
+        self.assertEqual(json.loads(self.store.encode_results([])), [])
+
+    def test_nearest_matches_brute_force(self):
+        for lat, lng in self.SEARCH_POINTS:
+            for k in (1, 10, 50):
+                self.assertMatches(self.store.nearest(lat, lng, k), self.brute_force(lat, lng)[:k])
+
+    def test_search_far_outside_catalogue(self):
+        # Madrid, the South China Sea: thousands of cells from the nearest occupied one
+        for lat, lng in ((40.0, -3.0), (5.0, 105.0), (10.0, 110.0)):
+            expected = self.brute_force(lat, lng)
+            self.assertMatches(self.store.nearest(lat, lng, 10), expected[:10])
+            distances, rows = self.store.nearest(lat, lng, 10)
+            self.assertMatches(self.store.nearest(lat, lng, 10, (distances[-1], rows[-1])), expected[10:20])
+            self.assertEqual(len(self.store.within_radius(lat, lng, 20000)[1]), 0)
+
+    def test_distance_to_bounds_is_a_lower_bound(self):
+        self.assertEqual(self.store.distance_to_bounds(*self.SEARCH_POINTS[1]), 0)
+        for lat, lng in self.SEARCH_POINTS + [(40.0, -3.0), (1.3, 104.5), (-89.0, 179.0)]:
+            bound = self.store.distance_to_bounds(lat, lng)
+            self.assertLessEqual(bound, self.brute_force(lat, lng)[0][0])
+        self.assertGreater(self.store.distance_to_bounds(1.3, 104.5), 20000)
+
+    def test_nearest_more_than_catalogue(self):
+        lat, lng = self.SEARCH_POINTS[0]
+        self.assertEqual(len(self.store.nearest(lat, lng, 10000)[1]), self.store.index.size)
+
+    def test_pages_continue_from_cursor(self):
+        for lat, lng in self.SEARCH_POINTS:
+            expected_distances, expected_rows = self.store.nearest(lat, lng, 60)
+            pages, after = [], None
+            for _ in range(6):
+                distances, rows = self.store.nearest(lat, lng, 10, after)
+                pages.extend(rows.tolist())
+                after = (distances[-1], rows[-1])
+            self.assertEqual(pages, expected_rows.tolist())
+
+    def test_cursor_past_the_end(self):
+        lat, lng = self.SEARCH_POINTS[0]
+        distances, rows = self.store.nearest(lat, lng, 10000)
+        self.assertEqual(len(self.store.nearest(lat, lng, 10, (distances[-5], rows[-5]))[1]), 4)
+
+    def test_masked_search_matches_brute_force(self):
+        # Every third carpark only
+        mask = np.zeros(len(self.store), dtype=bool)
+        mask[::3] = True
+        allowed = set(self.store.ids[mask].tolist())
+        for lat, lng in self.SEARCH_POINTS:
+            expected = [r for r in self.brute_force(lat, lng) if r[1] in allowed]
+            self.assertMatches(self.store.nearest(lat, lng, 10, mask=mask), expected[:10])
+            self.assertMatches(self.store.within_radius(lat, lng, 1000, mask=mask), [r for r in expected if r[0] <= 1000])
+
+    def test_within_radius_matches_brute_force(self):
+        for lat, lng in self.SEARCH_POINTS:
+            for radius in (0, 300, 1000, 5000):
+                expected = [r for r in self.brute_force(lat, lng) if r[0] <= radius]
+                self.assertMatches(self.store.within_radius(lat, lng, radius), expected)
+
+    def test_nearest_many_matches_single_queries(self):
+        lats = np.array([lat for lat, _ in self.SEARCH_POINTS])
+        lngs = np.array([lng for _, lng in self.SEARCH_POINTS])
+        distances, rows = self.store.nearest_many(lats, lngs, 10)
+        self.assertEqual(rows.shape, (len(self.SEARCH_POINTS), 10))
+        for i, (lat, lng) in enumerate(self.SEARCH_POINTS):
+            self.assertMatches((distances[i], rows[i]), self.brute_force(lat, lng)[:10])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+import startup
+from carpark_snapshot import load_snapshot
+from startup import build_carpark_data, load_URA_carpark_data, svy21_to_wgs84
+
+URA_RATE_ITEM = {
+    'ppCode': 'A0004', 'ppName': 'ALIWAL STREET', 'vehCat': 'Car', 'parkCapacity': 69,
+    'startTime': '08.30 AM', 'endTime': '05.00 PM',
+    'weekdayMin': '30 mins', 'weekdayRate': '$0.50', 'satdayMin': '30 mins', 'satdayRate': '$0.50',
+    'sunPHMin': '30 mins', 'sunPHRate': '$0.50',
+    'geometries': [{'coordinates': '31045.6165,31694.0055'}],
+}
+
+class TestBuildCarparkData(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.paths = {name: os.path.join(self.tmp.name, file_name) for name, file_name in (
+            ('hdb_file', 'hdb.csv'), ('ura_file', 'ura.json'), ('output_file', 'combined.json'),
+            ('snapshot_file', 'snapshot.bin'), ('manifest_file', 'manifest.json'))}
+        with open('HDBCarparkInformation.csv', 'r', encoding='utf-8') as f:
+            hdb_lines = f.readlines()[:4]
+        with open(self.paths['hdb_file'], 'w', encoding='utf-8') as f:
+            f.writelines(hdb_lines)
+        self.write_ura([URA_RATE_ITEM, dict(URA_RATE_ITEM, startTime='05.00 PM', endTime='10.00 PM')])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_ura(self, items):
+        with open(self.paths['ura_file'], 'w', encoding='utf-8') as f:
+            json.dump({'Status': 'Success', 'Result': items}, f)
+
+    def build(self, **kwargs):
+        return build_carpark_data(**self.paths, **kwargs)
+
+    def combined(self):
+        with open(self.paths['output_file'], 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_builds_outputs(self):
+        self.assertEqual(self.build(), ['hdb', 'ura'])
+        data = self.combined()
+        self.assertEqual(list(data), ['ACB', 'ACM', 'AH1', 'A0004'])
+        self.assertEqual(len(data['A0004']['rates']), 2)
+        self.assertAlmostEqual(data['ACB']['coordinates'][0], 1.30106, places=4)
+        self.assertAlmostEqual(data['A0004']['coordinates'][1], 103.8607, places=3)
+        self.assertEqual(len(load_snapshot(self.paths['snapshot_file'])), 4)
+
+    def test_skips_unchanged_sources(self):
+        self.build()
+        mtime = os.stat(self.paths['output_file']).st_mtime_ns
+        self.assertEqual(self.build(), [])
+        self.assertEqual(os.stat(self.paths['output_file']).st_mtime_ns, mtime)
+        self.assertEqual(self.build(force=True), ['hdb', 'ura'])
+
+    def test_reprocesses_only_changed_source(self):
+        self.build()
+        self.write_ura([URA_RATE_ITEM])
+        self.assertEqual(self.build(), ['ura'])
+        data = self.combined()
+        self.assertEqual(list(data), ['ACB', 'ACM', 'AH1', 'A0004'])
+        self.assertEqual(len(data['A0004']['rates']), 1)
+
+    def test_keeps_carparks_of_missing_source(self):
+        self.build()
+        os.remove(self.paths['ura_file'])
+        os.remove(self.paths['snapshot_file'])
+        self.assertEqual(self.build(), [])
+        self.assertIn('A0004', self.combined())
+        self.assertEqual(len(load_snapshot(self.paths['snapshot_file'])), 4)
+
+    def test_failed_source_is_not_recorded(self):
+        self.build()
+        with open(self.paths['output_file'], 'rb') as f:
+            output = f.read()
+        with open(self.paths['hdb_file'], 'a', encoding='utf-8') as f:
+            f.write("BAD1,BLK 1,30000,31000,SURFACE CAR PARK,ELECTRONIC PARKING,WHOLE DAY,NO,YES,0,,N\n")
+        with self.assertRaises(ValueError):
+            self.build()
+        with open(self.paths['output_file'], 'rb') as f:
+            self.assertEqual(f.read(), output)
+        # Still out of date, so the next build tries the source again
+        with self.assertRaises(ValueError):
+            self.build()
+
+    def test_empty_source_is_rejected(self):
+        self.build()
+        self.write_ura([])
+        with self.assertRaises(ValueError):
+            self.build()
+        self.assertIn('A0004', self.combined())
+
+class TestSvy21Projection(unittest.TestCase):
+    POINTS = [(30314.7936, 31490.4942), (33758.4143, 33695.5198), (31045.6165, 31694.0055), (19874.2, 45012.7)]
+
+    def setUp(self):
+        patcher = mock.patch.dict(startup._wgs84_cache, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.transformer = mock.Mock(wraps=startup.svy21_to_wgs84_transformer)
+        patcher = mock.patch('startup.svy21_to_wgs84_transformer', self.transformer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def projected_points(self):
+        """Points passed to each vectorized transform call."""
+        return [list(zip(xs.tolist(), ys.tolist())) for (xs, ys), _ in self.transformer.transform.call_args_list]
+
+    def test_matches_per_point_transform(self):
+        for (lat, lng), (x, y) in zip(svy21_to_wgs84(self.POINTS), self.POINTS):
+            expected_lng, expected_lat = startup.svy21_to_wgs84_transformer.transform(x, y)
+            self.assertAlmostEqual(lat, expected_lat, places=9)
+            self.assertAlmostEqual(lng, expected_lng, places=9)
+
+    def test_repeated_points_hit_the_cache(self):
+        first = svy21_to_wgs84(self.POINTS[:2] + self.POINTS[:1])
+        self.assertEqual(self.projected_points(), [self.POINTS[:2]]) # Duplicates are projected once
+        self.assertEqual(svy21_to_wgs84(self.POINTS[:2]), first[:2])
+        self.assertEqual(self.transformer.transform.call_count, 1)
+        svy21_to_wgs84(self.POINTS) # Only the new points are projected
+        self.assertEqual(self.projected_points()[1], self.POINTS[2:])
+
+    def test_ura_carpark_is_projected_once(self):
+        items = [URA_RATE_ITEM, dict(URA_RATE_ITEM, startTime='05.00 PM', endTime='10.00 PM'),
+                 dict(URA_RATE_ITEM, vehCat='Motorcycle', geometries=[{'coordinates': '1.0,2.0'}]),
+                 dict(URA_RATE_ITEM, ppCode='B0001', geometries=[{'coordinates': '19874.2,45012.7'}]),
+                 dict(URA_RATE_ITEM, ppCode='B0001', startTime='05.00 PM', endTime='10.00 PM')]
+        with tempfile.TemporaryDirectory() as tmp:
+            file_path = os.path.join(tmp, 'ura.json')
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump({'Status': 'Success', 'Result': items}, f)
+            data = load_URA_carpark_data(file_path, {}, raise_errors=True)
+        self.assertEqual(self.projected_points(), [[(31045.6165, 31694.0055), (19874.2, 45012.7)]])
+        self.assertEqual((len(data['A0004']['rates']), len(data['B0001']['rates'])), (2, 2))
+        self.assertEqual(data['A0004']['coordinates'], startup._wgs84_cache[(31045.6165, 31694.0055)])
+        self.assertEqual(data['B0001']['coordinates'], startup._wgs84_cache[(19874.2, 45012.7)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,14 @@
-import requests
+import httpx
 import time
 import os
 from dotenv import load_dotenv
 import json
 import asyncio
+import hashlib
 from fastapi import HTTPException
+from http_client import fetch
+from availability import availability_store
+from polling import AdaptivePoller
 
 load_dotenv()
 URA_ACCESS_KEY = os.getenv('URA_ACCESS_KEY')
@@ -32,10 +36,9 @@ async def get_access_token():
             "Origin": "https://eservice.ura.gov.sg"
             }
 
-        response = requests.get(token_url, headers=headers, timeout=10)
+        response = await fetch("GET", token_url, headers=headers)
         print(f"URA Token API Response Status: {response.status_code}")
         print(f"URA Token API Raw Response Text: '{response.text}'")
-        response.raise_for_status()
 
         token_data = response.json()
             
@@ -49,7 +52,7 @@ async def get_access_token():
             return URA_TOKEN
         else:
             raise ValueError(f"URA access token response indicates failure: {token_data}")
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Failed to get URA access token: {e}")
         raise HTTPException(status_code=500, detail="Failed to authenticate with URA API.")
     except (ValueError, KeyError, TypeError, json.JSONDecodeError) as e: # Add JSONDecodeError to catch specific parsing issues
@@ -57,45 +60,65 @@ async def get_access_token():
         raise HTTPException(status_code=500, detail="Failed to parse URA token response.")
 
 
-async def update_URA_availability(dictionary):
-    
-    while True:
-        print("Requesting Real-Time URA carpark availability data...")
-        try:
-            global URA_ACCESS_KEY, URA_TOKEN
-            URA_TOKEN = await get_access_token()
-            url = "https://eservice.ura.gov.sg/uraDataService/invokeUraDS/v1?service=Car_Park_Availability"
-                
-            headers = {
-                "AccessKey": URA_ACCESS_KEY,
-                "Token": URA_TOKEN,
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36", # Mimic a common browser
-                "Accept": "application/json, text/plain, */*",
-                "Accept-Language": "en-US,en;q=0.9",
-                "Referer": "https://eservice.ura.gov.sg/maps/",
-                "Origin": "https://eservice.ura.gov.sg"
-                }
-
-            response = requests.get(url, headers=headers, timeout=10)
-            print(f"URA Token API Response Status: {response.status_code}")
-            # print(f"URA Token API Raw Response Text: '{response.text}'") # Keep for debugging
-            response.raise_for_status()
-
-            token_data = response.json()
-                
-            if token_data and token_data.get('Status') == 'Success' and token_data.get('Result'):
-                print("Successfully obtained URA carpark availability data.")
-                result = token_data['Result']
-                for carpark in result:
-                    carpark_number = carpark.get('carparkNo')
-                    if carpark_number and carpark_number in dictionary:
-                        dictionary[carpark_number]['available_lots'] = carpark.get('lotsAvailable', 'N/A')
-            else:
-                raise ValueError(f"URA access token response indicates failure: {token_data}")
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to get URA access token: {e}")
-            raise HTTPException(status_code=500, detail="Failed to authenticate with URA API.")
-        except (ValueError, KeyError, TypeError, json.JSONDecodeError) as e: # Add JSONDecodeError to catch specific parsing issues
-            print(f"Error parsing URA token response: {e}")
-            raise HTTPException(status_code=500, detail="Failed to parse URA token response.")
-        await asyncio.sleep(300)
+URA_AVAILABILITY_URL = "https://eservice.ura.gov.sg/uraDataService/invokeUraDS/v1?service=Car_Park_Availability"
+# URA publishes every few minutes and its payload carries no timestamp, so a digest of the
+# payload is the change marker
+ura_availability_poller = AdaptivePoller("URA carpark availability", interval=300, min_interval=60, max_interval=900)
+
+async def poll_URA_availability(store=availability_store, poller=ura_availability_poller) -> bool:
+    """
+    Polls URA carpark availability once and publishes changes to the availability store.
+    A payload identical to the last one applied is not parsed again.
+
+    Returns:
+        bool: Whether the poll carried new data.
+    """
+    global URA_ACCESS_KEY, URA_TOKEN
+    print("Requesting Real-Time URA carpark availability data...")
+    URA_TOKEN = await get_access_token()
+
+    headers = {
+        "AccessKey": URA_ACCESS_KEY,
+        "Token": URA_TOKEN,
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36", # Mimic a common browser
+        "Accept": "application/json, text/plain, */*",
+        "Accept-Language": "en-US,en;q=0.9",
+        "Referer": "https://eservice.ura.gov.sg/maps/",
+        "Origin": "https://eservice.ura.gov.sg",
+        **poller.conditional_headers(),
+        }
+
+    response = await fetch("GET", URA_AVAILABILITY_URL, headers=headers)
+    print(f"URA Token API Response Status: {response.status_code}")
+    # print(f"URA Token API Raw Response Text: '{response.text}'") # Keep for debugging
+    poller.remember_validators(response)
+    digest = hashlib.blake2b(response.content, digest_size=16).digest()
+    if response.status_code == 304 or digest == poller.last_marker:
+        return False
+
+    token_data = response.json()
+
+    if token_data and token_data.get('Status') == 'Success' and token_data.get('Result'):
+        print("Successfully obtained URA carpark availability data.")
+        result = token_data['Result']
+        rows = {}
+        for carpark in result:
+            carpark_number = carpark.get('carparkNo')
+            # The feed has one entry per lot type; only car lots (C) are relevant
+            if carpark.get('lotType', 'C') != 'C':
+                continue
+            if carpark_number:
+                lots_available = str(carpark.get('lotsAvailable', ''))
+                available_lots = int(lots_available) if lots_available.isdigit() else 'N/A'
+                # URA only reports availability; total_lots stays the static capacity
+                rows[carpark_number] = (None, available_lots)
+
+        # Only the carparks whose counts moved are copied into the next snapshot
+        await store.apply(rows)
+        return poller.is_new(digest)
+    raise ValueError(f"URA access token response indicates failure: {token_data}")
+
+async def update_URA_availability(store=availability_store):
+    # Polls URA carpark availability on the adaptive schedule, forever. Errors (including
+    # token failures) back off and retry instead of stopping the poller.
+    await ura_availability_poller.run(lambda: poll_URA_availability(store))